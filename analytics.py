@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from appointments import COMPLETED, NO_SHOW
+from archive import TABLES as ARCHIVED_TABLES
+
+# Columnar snapshot of the clinical tables, for cross-hospital reporting.
+#
+# Admin-wide questions (appointments per hospital per day, no-show rates,
+# condition prevalence) aggregate every row of the big tables. Instead of scanning
+# the live database for them, Snapshot.export() copies the rows changed since the
+# last export into Parquet files next to the database, and the reports run as
+# vectorized Arrow aggregates over the snapshot held in memory.
+#
+# Changes are found through updated_at (indexed since migration 14): each export
+# selects the rows updated after the highest updated_at exported so far (the
+# watermark). Timestamps are taken before the write commits, so a row stamped
+# shortly before the previous export started may have committed after it; rows
+# stamped within OVERLAP of that start are selected again. A row exported twice
+# is resolved by keeping its latest copy, by primary key. Every export that finds
+# rows appends one part file per table; beyond MAX_PARTS they are merged into one. Rows are never
+# deleted from these tables by the app except by archive.py, which moves settled
+# appointments out of the live table: the snapshot keeps the copies it exported,
+# and Snapshot.export(full=True), which rebuilds from scratch, reads them back
+# from the archive.
+#
+# The manifest (parts and watermark per table) is replaced atomically after the
+# parts are written, so a crash mid-export leaves the previous snapshot intact.
+
+EXPORT_INTERVAL = 300
+EXPORT_BATCH = 50_000
+OVERLAP = timedelta(seconds=60)
+MAX_PARTS = 16
+MANIFEST = "manifest.json"
+
+_TIMESTAMP = pa.timestamp("us")
+
+# table -> (primary key, SELECT of the rows changed after ?, Arrow schema)
+TABLES = {
+    "appointments": ("id", "SELECT id, patient_id, hospital_id, appointment_date, duration, status, updated_at FROM appointments WHERE updated_at > ? ORDER BY updated_at", pa.schema([
+        ("id", pa.int64()), ("patient_id", pa.string()), ("hospital_id", pa.string()), ("appointment_date", _TIMESTAMP),
+        ("duration", pa.int64()), ("status", pa.string()), ("updated_at", pa.string()),
+    ])),
+    "hospitals": ("id", "SELECT id, name, status, capacity, updated_at FROM hospitals WHERE updated_at > ? ORDER BY updated_at", pa.schema([
+        ("id", pa.string()), ("name", pa.string()), ("status", pa.string()), ("capacity", pa.int64()), ("updated_at", pa.string()),
+    ])),
+    "medical_history": ("id", "SELECT id, patient_id, hospital_id, blood_type, chronic_conditions, updated_at FROM medical_history WHERE updated_at > ? ORDER BY updated_at", pa.schema([
+        ("id", pa.int64()), ("patient_id", pa.string()), ("hospital_id", pa.string()), ("blood_type", pa.string()),
+        ("chronic_conditions", pa.string()), ("updated_at", pa.string()),
+    ])),
+}
+
+
+def snapshot_dir_for(db_file):
+    # The snapshot lives next to the database it was exported from
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "analytics")
+
+
+def plan_queries():
+    """The export statements, for the query-plan check in queries.py."""
+    return {f"ANALYTICS_EXPORT_{name.upper()}": sql for name, (_, sql, _) in TABLES.items()}
+
+
+def _batch(rows, schema):
+    columns = []
+    for values, field in zip(zip(*rows), schema):
+        if field.type == _TIMESTAMP:
+            # Stored as ISO-8601 text; parsed here once instead of in every report
+            columns.append(pc.cast(pa.array(values, pa.string()), _TIMESTAMP))
+        else:
+            columns.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _latest(table, key):
+    # The last copy of each row: parts are read, and batches written, in export order
+    position = pa.array(np.arange(len(table)))
+    last = table.append_column("_position", position).group_by(key, use_threads=False).aggregate([("_position", "max")])["_position_max"]
+    return table.take(last.sort())
+
+
+class Snapshot:
+    """The exported tables, reloaded after each export and refreshed every `interval` seconds."""
+
+    def __init__(self, db, directory, interval=EXPORT_INTERVAL, archive=None):
+        self.db = db
+        self.directory = directory
+        self.archive = archive
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._results = {}
+        self.stats = {"exports": 0, "rows_exported": 0, "last_export_s": None, "last_error": None}
+        self.manifest = self._read_manifest()
+        self.tables = self._load()
+        self._closed = threading.Event()
+        if interval:
+            threading.Thread(target=self._run, name="analytics-export", daemon=True).start()
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "exported_at": None, "tables": {}}
+
+    def _load(self):
+        tables = {}
+        for name, (key, _, schema) in TABLES.items():
+            parts = self.manifest["tables"].get(name, {}).get("parts", [])
+            if parts:
+                tables[name] = _latest(pa.concat_tables(pq.read_table(os.path.join(self.directory, part)) for part in parts), key)
+            else:
+                tables[name] = schema.empty_table()
+        return tables
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                self.export()
+            except Exception as e:  # keep exporting on the next round
+                self.stats["last_error"] = repr(e)
+            self._closed.wait(self.interval)
+
+    def export(self, full=False):
+        """Append the rows changed since the last export; returns rows exported per table."""
+        with self._export_lock:
+            started = time.perf_counter()
+            # exported_at is when the export started, before it read any rows
+            manifest = {"version": self.manifest["version"] + 1, "exported_at": datetime.now().isoformat(), "tables": {}}
+            previous = self.manifest["exported_at"]
+            tables, exported = dict(self.tables), {}
+            for name, (key, sql, schema) in TABLES.items():
+                entry = dict(self.manifest["tables"].get(name, {"watermark": None, "parts": []}))
+                if full:
+                    entry = {"watermark": None, "parts": []}
+                    tables[name] = schema.empty_table()
+                since = entry["watermark"] or ""
+                if since and previous:
+                    since = min(since, (datetime.fromisoformat(previous) - OVERLAP).isoformat())
+                part = f"{name}-{manifest['version']:08d}.parquet"
+                rows, watermark = self._export_table(sql, schema, since, os.path.join(self.directory, part))
+                exported[name] = len(rows) if rows is not None else 0
+                if rows is not None:
+                    entry["parts"] = entry["parts"] + [part]
+                    entry["watermark"] = max(watermark, entry["watermark"] or "")
+                    tables[name] = _latest(pa.concat_tables([tables[name], rows]), key)
+                if full and self.archive is not None:
+                    # Read after the live rows: a row archived in between is read twice, not missed
+                    archived = self._archived(name, schema)
+                    if archived is not None:
+                        entry["parts"] = entry["parts"] + [self._compact(f"{name}-archived", archived, manifest["version"])]
+                        tables[name] = _latest(pa.concat_tables([tables[name], archived]), key)
+                if len(entry["parts"]) > MAX_PARTS:
+                    entry["parts"] = [self._compact(name, tables[name], manifest["version"])]
+                manifest["tables"][name] = entry
+            self._write_manifest(manifest)
+            obsolete = {part for entry in self.manifest["tables"].values() for part in entry["parts"]} - {part for entry in manifest["tables"].values() for part in entry["parts"]}
+            with self._lock:
+                self.manifest, self.tables, self._results = manifest, tables, {}
+            for part in obsolete:
+                os.remove(os.path.join(self.directory, part))
+            self.stats["exports"] += 1
+            self.stats["rows_exported"] += sum(exported.values())
+            self.stats["last_export_s"] = time.perf_counter() - started
+            return exported
+
+    def _export_table(self, sql, schema, since, path):
+        # One read transaction per table; writers are not blocked in WAL mode
+        batches, watermark = [], None
+        with self.db.read() as conn:
+            cursor = conn.execute(sql, (since,))
+            writer = None
+            try:
+                while True:
+                    rows = cursor.fetchmany(EXPORT_BATCH)
+                    if not rows:
+                        break
+                    batch = _batch(rows, schema)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, schema)
+                    writer.write_table(batch)
+                    batches.append(batch)
+                    watermark = rows[-1][-1]
+            finally:
+                if writer is not None:
+                    writer.close()
+        return (pa.concat_tables(batches) if batches else None), watermark
+
+    def _archived(self, name, schema):
+        with self.db.read() as conn:
+            archived = self.archive.table(conn, name, schema.names) if name in ARCHIVED_TABLES else None
+        if archived is None or archived.num_rows == 0:
+            return None
+        # Archived as stored in the database, timestamps as text
+        return pa.Table.from_arrays([pc.cast(archived[field.name], field.type) for field in schema], schema=schema)
+
+    def _compact(self, name, table, version):
+        part = f"{name}-{version:08d}-base.parquet"
+        pq.write_table(table, os.path.join(self.directory, part))
+        return part
+
+    def _write_manifest(self, manifest):
+        temporary = os.path.join(self.directory, f"{MANIFEST}.tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temporary, os.path.join(self.directory, MANIFEST))
+
+    def query(self, report, *args):
+        """report(tables, *args), computed once per snapshot version."""
+        with self._lock:
+            tables, results = self.tables, self._results
+        key = (report.__name__, args)
+        if key not in results:
+            results[key] = report(tables, *args)
+        return results[key]
+
+    def close(self):
+        self._closed.set()
+
+
+# Reports: Arrow tables in, small pandas frames out for the charts
+
+def _hospital_names(tables, counts):
+    names = tables["hospitals"].select(["id", "name"])
+    return counts.join(names, "hospital_id", "id").to_pandas()
+
+
+def appointments_per_day(tables, start, end):
+    """Appointments per hospital and day with start <= appointment_date < end."""
+    appointments = tables["appointments"]
+    date = appointments["appointment_date"]
+    appointments = appointments.filter(pc.and_(pc.greater_equal(date, pa.scalar(start, _TIMESTAMP)), pc.less(date, pa.scalar(end, _TIMESTAMP))))
+    days = pa.table({"hospital_id": appointments["hospital_id"], "day": pc.cast(appointments["appointment_date"], pa.date32())})
+    counts = days.group_by(["hospital_id", "day"], use_threads=False).aggregate([([], "count_all")])
+    return _hospital_names(tables, counts).rename(columns={"count_all": "appointments"})
+
+
+def no_show_rates(tables, start, end):
+    """Share of attended-or-missed appointments that were missed, per hospital."""
+    appointments = tables["appointments"]
+    date, status = appointments["appointment_date"], appointments["status"]
+    settled = pc.and_(pc.is_in(status, pa.array([COMPLETED, NO_SHOW])),
+                      pc.and_(pc.greater_equal(date, pa.scalar(start, _TIMESTAMP)), pc.less(date, pa.scalar(end, _TIMESTAMP))))
+    appointments = appointments.filter(settled)
+    missed = pa.table({"hospital_id": appointments["hospital_id"], "missed": pc.cast(pc.equal(appointments["status"], NO_SHOW), pa.int64())})
+    counts = missed.group_by("hospital_id", use_threads=False).aggregate([("missed", "sum"), ([], "count_all")])
+    frame = _hospital_names(tables, counts)
+    frame["no_show_rate"] = frame["missed_sum"] / frame["count_all"]
+    return frame.rename(columns={"count_all": "appointments", "missed_sum": "no_shows"})
+
+
+def condition_prevalence(tables):
+    """Patients with each chronic condition, and their share of patients with a history."""
+    history = tables["medical_history"]
+    conditions = pc.split_pattern(pc.fill_null(history["chronic_conditions"], ""), ",")
+    pairs = pa.table({"patient_id": pc.take(history["patient_id"], pc.list_parent_indices(conditions)), "condition": pc.utf8_trim_whitespace(pc.list_flatten(conditions))})
+    pairs = pairs.filter(pc.not_equal(pairs["condition"], ""))
+    counts = pairs.group_by("condition", use_threads=False).aggregate([("patient_id", "count_distinct")]).to_pandas()
+    patients = pc.count_distinct(history["patient_id"]).as_py()
+    counts["share"] = counts["patient_id_count_distinct"] / max(patients, 1)
+    return counts.rename(columns={"patient_id_count_distinct": "patients"}).sort_values("patients", ascending=False)
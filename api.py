@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlparse
+
+import queries
+from changefeed import COLUMNS
+
+# Headless read API for the mobile app and partner portals.
+#
+#   GET /patients/<id>                          the patient
+#   GET /patients/<id>/{history,vitals,appointments,reports}?limit=&after=
+#
+# Requests carry "Authorization: Bearer <token>" (python api.py --issue-token USER).
+# A patient token reads its own records, a hospital token (approved hospitals
+# only) the records it holds for patients it has seen, an admin token everything;
+# anything else is 404, so ids cannot be probed.
+#
+# Lists are newest first with keyset pagination: "next" is an opaque cursor for
+# ?after=, so deep pages cost the same as the first. Every 200 carries an ETag
+# built from the rows' updated_at; the collection's ETag comes from one aggregate
+# (count, max(updated_at), max(id)) over the patient's rows, checked before the
+# page is read, so a client revalidating with If-None-Match gets 304 for the cost
+# of that aggregate. Rows of these tables are only inserted, except appointments,
+# whose every update stamps updated_at, and rows moved to the archive (archive.py),
+# which change the count. Lists hold the live rows only.
+#
+# The server is a small HTTP/1.1 loop on asyncio (GET and HEAD, keep-alive);
+# SQLite calls run on a thread pool the size of the read connection pool, so a
+# slow query does not stall other connections.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+READ_WORKERS = 8
+KEEP_ALIVE_TIMEOUT = 15
+MAX_HEADER_BYTES = 16_384
+CACHE_CONTROL = "private, no-cache"
+
+# resource -> (table, ordering column); rows come out newest first by (ordering column, id)
+RESOURCES = {
+    "history": ("medical_history", "uploaded_at"),
+    "vitals": ("vital_signs", "recorded_date"),
+    "appointments": ("appointments", "appointment_date"),
+    "reports": ("reports", "upload_date"),
+}
+
+# The profile is looked up separately: joined to it with LEFT JOINs, the planner
+# may scan patients when sqlite_stat1 predates the table's growth (migration 5)
+TOKEN_USER = "SELECT u.id, u.role FROM api_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = ?"
+HOSPITAL_BY_USER = "SELECT id, status FROM hospitals WHERE user_id = ?"
+PATIENT = f"SELECT {', '.join(COLUMNS['patients'])} FROM patients WHERE id = ?"
+# A hospital may read a patient it holds a history or an appointment for; kept in
+# hospital_patients (migration 13), which archiving appointments leaves alone
+HOSPITAL_SEES_PATIENT = "SELECT 1 FROM hospital_patients WHERE hospital_id = ? AND patient_id = ?"
+USER_ID_BY_USERNAME = "SELECT id FROM users WHERE username = ?"
+INSERT_TOKEN = "INSERT INTO api_tokens (token_hash, user_id, created_at) VALUES (?, ?, ?)"
+DELETE_TOKENS = "DELETE FROM api_tokens WHERE user_id = ?"
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+def _filters(scoped):
+    return "patient_id = ?" + (" AND hospital_id = ?" if scoped else "")
+
+
+def page_query(resource, scoped, after):
+    """A page of rows; after is None (first page), "value" or "null" (the cursor's ordering value).
+
+    Rows with no ordering value come last; a cursor among the dated rows continues
+    into them through the second, also indexed, branch of a UNION ALL.
+    """
+    table, order = RESOURCES[resource]
+    select = f"SELECT {', '.join(COLUMNS[table])} FROM {table} WHERE {_filters(scoped)}"
+    if after == "value":
+        select = f"{select} AND ({order}, id) < (?, ?) UNION ALL {select} AND {order} IS NULL"
+    elif after == "null":
+        select = f"{select} AND {order} IS NULL AND id < ?"
+    return f"{select} ORDER BY {order} DESC, id DESC LIMIT ?"
+
+
+def version_query(resource, scoped):
+    table, _ = RESOURCES[resource]
+    return f"SELECT count(*), max(updated_at), max(id) FROM {table} WHERE {_filters(scoped)}"
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    statements = {"API_TOKEN_USER": TOKEN_USER, "API_HOSPITAL_BY_USER": HOSPITAL_BY_USER, "API_PATIENT": PATIENT, "API_HOSPITAL_SEES_PATIENT": HOSPITAL_SEES_PATIENT}
+    for resource in RESOURCES:
+        for scoped in (False, True):
+            name = f"API_{resource.upper()}{'_HOSPITAL' if scoped else ''}"
+            statements[name + "_VERSION"] = version_query(resource, scoped)
+            for after in (None, "value", "null"):
+                statements[f"{name}_PAGE_AFTER_{after}".upper()] = page_query(resource, scoped, after)
+    return statements
+
+
+def token_hash(token):
+    # Tokens are 256 random bits, so a fast hash is enough (unlike passwords)
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_token(db, username):
+    """Create a token for `username`; returns it (only its hash is stored)."""
+    token = secrets.token_urlsafe(32)
+    with db.write() as conn:
+        row = conn.execute(USER_ID_BY_USERNAME, (username,)).fetchone()
+        if row is None:
+            raise ValueError(f"no user named {username!r}")
+        conn.execute(INSERT_TOKEN, (token_hash(token), row[0], datetime.now().isoformat()))
+    return token
+
+
+def revoke_tokens(db, username):
+    with db.write() as conn:
+        row = conn.execute(USER_ID_BY_USERNAME, (username,)).fetchone()
+        if row is None:
+            raise ValueError(f"no user named {username!r}")
+        return conn.execute(DELETE_TOKENS, (row[0],)).rowcount
+
+
+def _etag(*parts):
+    return '"' + hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20] + '"'
+
+
+def _encode_cursor(order_value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([order_value, row_id]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        order_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ApiError(400, "invalid cursor") from None
+    return order_value, row_id
+
+
+def authenticate(conn, headers):
+    """(role, own patient id, hospital id) of the request's bearer token; ApiError 401 otherwise."""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    row = conn.execute(TOKEN_USER, (token_hash(token.strip()),)).fetchone() if scheme.lower() == "bearer" and token.strip() else None
+    if row is None:
+        raise ApiError(401, "a valid bearer token is required", [("WWW-Authenticate", "Bearer")])
+    user_id, role = row
+    if role == "patient":
+        row = conn.execute(queries.PATIENT_ID_BY_USER, (user_id,)).fetchone()
+        return role, row[0] if row else None, None
+    if role == "hospital":
+        row = conn.execute(HOSPITAL_BY_USER, (user_id,)).fetchone()
+        if row is None or row[1] != "approved":
+            raise ApiError(401, "hospital is not approved", [("WWW-Authenticate", "Bearer")])
+        return role, None, row[0]
+    return role, None, None
+
+
+def _scope(conn, principal, patient_id):
+    """The hospital filter for this principal's view of the patient (None: all rows); 404 if not visible."""
+    role, own_patient_id, hospital_id = principal
+    if role == "admin":
+        return None
+    if role == "patient" and patient_id == own_patient_id:
+        return None
+    if role == "hospital" and conn.execute(HOSPITAL_SEES_PATIENT, (hospital_id, patient_id)).fetchone():
+        return hospital_id
+    raise ApiError(404, "not found")
+
+
+def _limit(query):
+    try:
+        limit = int(query.get("limit", [DEFAULT_LIMIT])[0])
+    except ValueError:
+        raise ApiError(400, "limit must be an integer") from None
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def handle(db, method, target, headers):
+    """One request -> (status, [(header, value)], body bytes). Runs on the thread pool."""
+    if method not in ("GET", "HEAD"):
+        raise ApiError(405, "only GET and HEAD are supported", [("Allow", "GET, HEAD")])
+    url = urlparse(target)
+    # Split before decoding, so an id may contain an encoded "/"
+    parts = [unquote(part) for part in url.path.strip("/").split("/")]
+    if parts[0] != "patients" or len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] not in RESOURCES):
+        raise ApiError(404, "not found")
+    query = parse_qs(url.query)
+    patient_id = parts[1]
+    with db.read() as conn:
+        principal = authenticate(conn, headers)
+        hospital_id = _scope(conn, principal, patient_id)
+        params = [patient_id] + ([hospital_id] if hospital_id else [])
+        if len(parts) == 2:
+            row = conn.execute(PATIENT, (patient_id,)).fetchone()
+            if row is None:
+                raise ApiError(404, "not found")
+            body = dict(zip(COLUMNS["patients"], row))
+            etag = _etag(url.path, body["updated_at"] or body["created_at"])
+            if etag in headers.get("if-none-match", ""):
+                return 304, [("ETag", etag), ("Cache-Control", CACHE_CONTROL)], b""
+        else:
+            resource = parts[2]
+            table, order = RESOURCES[resource]
+            limit = _limit(query)
+            after = query.get("after", [None])[0]
+            etag = _etag(url.path, url.query, hospital_id, *conn.execute(version_query(resource, bool(hospital_id)), params).fetchone())
+            if etag in headers.get("if-none-match", ""):
+                return 304, [("ETag", etag), ("Cache-Control", CACHE_CONTROL)], b""
+            if after is None:
+                sql, page_params = page_query(resource, bool(hospital_id), None), params
+            else:
+                order_value, row_id = _decode_cursor(after)
+                if order_value is None:
+                    sql, page_params = page_query(resource, bool(hospital_id), "null"), params + [row_id]
+                else:
+                    sql, page_params = page_query(resource, bool(hospital_id), "value"), params + [order_value, row_id] + params
+            rows = conn.execute(sql, page_params + [limit + 1]).fetchall()
+            items = [dict(zip(COLUMNS[table], row)) for row in rows[:limit]]
+            body = {"items": items, "next": _encode_cursor(items[-1][order], items[-1]["id"]) if len(rows) > limit else None}
+    return 200, [("ETag", etag), ("Cache-Control", CACHE_CONTROL)], json.dumps(body).encode()
+
+
+def _respond(db, method, target, headers):
+    try:
+        return handle(db, method, target, headers)
+    except ApiError as e:
+        return e.status, e.headers, json.dumps({"error": str(e)}).encode()
+    except sqlite3.Error as e:
+        return 500, [], json.dumps({"error": str(e)}).encode()
+    except Exception as e:  # answer rather than drop the connection
+        return 500, [], json.dumps({"error": f"internal error: {type(e).__name__}"}).encode()
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 front end for handle()."""
+
+    def __init__(self, db, workers=READ_WORKERS):
+        self.db = db
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="api-read")
+        self.stats = {"requests": 0, "not_modified": 0, "errors": 0}
+
+    async def _client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    return
+                request_line, *lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ")
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    return
+                headers = {}
+                for line in lines:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                # No request bodies are accepted; close rather than read past one
+                keep_alive = keep_alive and "content-length" not in headers and "transfer-encoding" not in headers
+                status, reply_headers, body = await loop.run_in_executor(self.executor, _respond, self.db, method, target, headers)
+                self.stats["requests"] += 1
+                self.stats["not_modified"] += status == 304
+                self.stats["errors"] += status >= 400
+                lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+                if status != 304:
+                    lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+                lines += [f"{name}: {value}" for name, value in reply_headers]
+                lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body if method != "HEAD" else b""))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8767, ready=None):
+        server = await asyncio.start_server(self._client, host, port, limit=MAX_HEADER_BYTES)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+if __name__ == "__main__":
+    # python api.py [--db data/trackmyhealth.db] [--port 8767]
+    # python api.py --issue-token USERNAME | --revoke-tokens USERNAME
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Headless read API")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--issue-token", metavar="USERNAME")
+    parser.add_argument("--revoke-tokens", metavar="USERNAME")
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    try:
+        if args.issue_token:
+            print(issue_token(db, args.issue_token))
+        elif args.revoke_tokens:
+            print(f"Revoked {revoke_tokens(db, args.revoke_tokens)} token(s)")
+        else:
+            api = ApiServer(db)
+            print(f"Serving the read API on http://{args.host}:{args.port}/patients")
+            try:
+                asyncio.run(api.serve(args.host, args.port))
+            except KeyboardInterrupt:
+                pass
+            finally:
+                api.close()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
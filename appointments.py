@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+# Appointment lifecycle. Status changes only happen through explicit actions,
+# each allowed from a fixed set of states:
+#
+#   Scheduled -> Checked-in -> Completed
+#   Scheduled / Checked-in -> Cancelled
+#   Scheduled -> No-show
+
+SCHEDULED = "Scheduled"
+CHECKED_IN = "Checked-in"
+COMPLETED = "Completed"
+CANCELLED = "Cancelled"
+NO_SHOW = "No-show"
+STATUSES = [SCHEDULED, CHECKED_IN, COMPLETED, CANCELLED, NO_SHOW]
+
+# action label -> (states it applies to, resulting state)
+ACTIONS = {
+    "Check In": ((SCHEDULED,), CHECKED_IN),
+    "Complete": ((CHECKED_IN,), COMPLETED),
+    "Cancel": ((SCHEDULED, CHECKED_IN), CANCELLED),
+    "Mark No-show": ((SCHEDULED,), NO_SHOW),
+}
+
+
+def transition_query(count, action):
+    sources = ACTIONS[action][0]
+    ids = ", ".join("?" for _ in range(count))
+    states = ", ".join("?" for _ in sources)
+    return f"UPDATE appointments SET status = ?, updated_at = ? WHERE hospital_id = ? AND id IN ({ids}) AND status IN ({states}) RETURNING id"
+
+
+def transition(conn, hospital_id, appointment_ids, action):
+    """Apply `action` to every eligible appointment in one statement.
+
+    Must run inside a write transaction. Returns (changed ids, skipped ids); an
+    appointment is skipped if it belongs to another hospital or its current
+    status does not allow the action.
+    """
+    appointment_ids = [int(i) for i in appointment_ids]
+    if not appointment_ids:
+        return [], []
+    sources, target = ACTIONS[action]
+    params = [target, datetime.now().isoformat(), hospital_id] + appointment_ids + list(sources)
+    changed = sorted(row[0] for row in conn.execute(transition_query(len(appointment_ids), action), params))
+    skipped = sorted(set(appointment_ids) - set(changed))
+    return changed, skipped
+
+
+CLOSE_OUT_DAY = "UPDATE appointments SET status = CASE status WHEN ? THEN ? ELSE ? END, updated_at = ? WHERE hospital_id = ? AND appointment_date >= ? AND appointment_date < ? AND status IN (?, ?)"
+
+
+def close_out_day(conn, hospital_id, day):
+    """End-of-day closeout: checked-in visits complete, remaining scheduled ones are no-shows."""
+    start = datetime.combine(day, datetime.min.time())
+    params = [CHECKED_IN, COMPLETED, NO_SHOW, datetime.now().isoformat(), hospital_id, start.isoformat(), (start + timedelta(days=1)).isoformat(), SCHEDULED, CHECKED_IN]
+    return conn.execute(CLOSE_OUT_DAY, params).rowcount
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    return {"APPOINTMENT_TRANSITION": transition_query(3, "Cancel"), "APPOINTMENT_CLOSE_OUT_DAY": CLOSE_OUT_DAY}
@@ -0,0 +1,337 @@
+import argparse
+import os
+import tempfile
+from datetime import datetime
+
+from appointments import CANCELLED, COMPLETED, NO_SHOW
+from migrations import APPOINTMENT_COUNTERS
+
+# Tiered storage for the tables that only grow: vital_signs and appointments.
+#
+# Pages, dashboards and the API work on the last few months, yet the live tables
+# and every index on them hold each reading and visit ever recorded. move() takes
+# the rows dated before the horizon (the start of the month ARCHIVE_AFTER_MONTHS
+# back) out of the live tables into zstd-compressed Parquet files, partitioned by
+# the month of the row's date: archive/<table>/<YYYY-MM>/part-<first id>-<rows>.parquet.
+# Each file is sorted by patient_id, so one patient's rows are found in a row
+# group or two by their min/max statistics. Some old rows stay live:
+#   - appointments that are not settled (still scheduled or checked in);
+#   - each patient's latest vital signs reading, which the dashboards score.
+#
+# A batch, up to ARCHIVE_BATCH rows of one month, moves in one write transaction:
+# its rows are read, written to a part file (fsynced, then renamed into place),
+# the part recorded in archive_parts and the rows deleted. A row is thus either
+# live or in a recorded part, and a reader that looks up the parts in the same
+# read transaction as the live rows sees every row exactly once. Batches are kept
+# small so the app's writers wait little; once a table is done, compact() merges
+# each month it added to into a single part, so a read opens one file per month.
+# A crash after a rename but before the commit, like a part compact() replaced,
+# leaves a file no part names; remove_orphans() deletes those before each run.
+#
+# Deleting the rows changes nothing else the app shows:
+#   - the appointment counters (migration 12) are credited with the batch before
+#     the delete triggers take it off, so dashboards and attendance still count
+#     archived visits;
+#   - vital_rollups ignore deletes, so long-range charts keep the archived months;
+#   - the change feed records the rows as 'archive' rather than 'delete'.
+#
+# Reads merge the archive in only when a range reaches an archived month: parts()
+# is one indexed lookup, and pyarrow is imported the first time a part is read.
+
+ARCHIVE_AFTER_MONTHS = 6
+# Rows per write transaction: about half a second of the write lock with a
+# million vital signs, well within the app's busy timeout (db.py)
+ARCHIVE_BATCH = 2_000
+# Small row groups: a patient's lookup decodes only the group or two holding them
+ROW_GROUP_ROWS = 2048
+COMPRESSION = "zstd"
+SETTLED = [COMPLETED, CANCELLED, NO_SHOW]
+
+# table -> (date column, date index, condition for an old row to move, column -> Arrow type);
+# the columns start with id, patient_id, hospital_id and the date
+TABLES = {
+    "vital_signs": ("recorded_date", "idx_vital_signs_date",
+                    "EXISTS (SELECT 1 FROM vital_signs AS n INDEXED BY idx_vital_signs_patient_date WHERE n.patient_id = t.patient_id AND n.recorded_date > t.recorded_date)", {
+        "id": "int64", "patient_id": "string", "hospital_id": "string", "recorded_date": "string", "temperature": "float64", "blood_pressure": "string",
+        "pulse": "int64", "respiratory_rate": "int64", "oxygen_saturation": "float64", "weight": "float64", "height": "float64", "bmi": "float64",
+        "recorded_by": "string", "notes": "string", "created_at": "string", "updated_at": "string",
+    }),
+    "appointments": ("appointment_date", "idx_appointments_date", f"t.status IN ({', '.join(repr(status) for status in SETTLED)})", {
+        "id": "int64", "patient_id": "string", "hospital_id": "string", "appointment_date": "string", "duration": "int64", "status": "string",
+        "reason": "string", "notes": "string", "created_at": "string", "updated_at": "string",
+    }),
+}
+
+# A batch is the next rows in (date, id) order; the same range then selects them
+# again for the counters and the delete, within the same transaction
+BATCH_AFTER = "t.{date} < ? AND (t.{date}, t.id) > (?, ?) AND {condition}"
+BATCH_RANGE = BATCH_AFTER + " AND (t.{date}, t.id) <= (?, ?)"
+SELECT_BATCH = "SELECT {columns} FROM {table} AS t INDEXED BY {index} WHERE " + BATCH_AFTER + " ORDER BY t.{date}, t.id LIMIT ?"
+DELETE_BATCH = "DELETE FROM {table} AS t INDEXED BY {index} WHERE " + BATCH_RANGE
+CREDIT_COUNTER = "INSERT INTO {counter} ({columns}, n) SELECT {values}, COUNT(*) FROM appointments AS t INDEXED BY idx_appointments_date WHERE {range} AND {counted} GROUP BY 1, 2, 3 ON CONFLICT DO UPDATE SET n = n + excluded.n"
+LAST_CHANGE = "SELECT coalesce(max(seq), 0) FROM change_log"
+MARK_ARCHIVED = "UPDATE change_log SET operation = 'archive' WHERE seq > ?"
+INSERT_PART = "INSERT INTO archive_parts (table_name, month, path, rows, archived_at) VALUES (?, ?, ?, ?, ?)"
+PARTS_IN_RANGE = "SELECT path FROM archive_parts WHERE table_name = ? AND month >= ? AND month <= ? ORDER BY month, id"
+MONTH_PARTS = "SELECT id, path FROM archive_parts WHERE table_name = ? AND month = ? ORDER BY id"
+# The parts compact() merged: ids only grow, so a part added meanwhile is kept
+DELETE_MONTH_PARTS = "DELETE FROM archive_parts WHERE table_name = ? AND month = ? AND id <= ?"
+# Every part, to tell orphaned files apart (not in the plan check)
+ALL_PARTS = "SELECT path FROM archive_parts"
+
+
+def _statements(table):
+    date, index, condition, types = TABLES[table]
+    where = {"date": date, "condition": condition}
+    select = SELECT_BATCH.format(columns=", ".join(f"t.{c}" for c in types), table=table, index=index, **where)
+    delete = DELETE_BATCH.format(table=table, index=index, **where)
+    credits = []
+    if table == "appointments":
+        credits = [CREDIT_COUNTER.format(counter=counter, columns=columns, values=values.format(row="t"), counted=counted.format(row="t"), range=BATCH_RANGE.format(**where))
+                   for counter, columns, values, counted in APPOINTMENT_COUNTERS]
+    return select, delete, credits
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    statements = {"ARCHIVE_PARTS_IN_RANGE": PARTS_IN_RANGE, "ARCHIVE_MONTH_PARTS": MONTH_PARTS, "ARCHIVE_DELETE_MONTH_PARTS": DELETE_MONTH_PARTS,
+                  "ARCHIVE_MARK_ARCHIVED": MARK_ARCHIVED}
+    for table in TABLES:
+        select, delete, credits = _statements(table)
+        statements[f"ARCHIVE_SELECT_{table.upper()}"] = select
+        statements[f"ARCHIVE_DELETE_{table.upper()}"] = delete
+        for i, credit in enumerate(credits):
+            statements[f"ARCHIVE_CREDIT_{table.upper()}_{i}"] = credit
+    return statements
+
+
+def _schema(table):
+    import pyarrow as pa
+
+    return pa.schema([(column, getattr(pa, kind)()) for column, kind in TABLES[table][3].items()])
+
+
+def _may_hold(statistics, value):
+    # Row group pruning on patient_id (column 1), by its min/max statistics
+    return statistics is None or not statistics.has_min_max or statistics.min <= value <= statistics.max
+
+
+def archive_dir_for(db_file):
+    # The archive lives next to the database its rows were moved out of
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "archive")
+
+
+def horizon(now=None, months=ARCHIVE_AFTER_MONTHS):
+    """First day of the month `months` before now's; rows dated before it are archived."""
+    now = now or datetime.now()
+    month = now.year * 12 + now.month - 1 - months
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+class Archive:
+    """Parquet parts of the archived rows under `root`, listed in archive_parts."""
+
+    def __init__(self, root):
+        self.root = root
+        self._footers = {}
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, part):
+        return os.path.join(self.root, part)
+
+    def parts(self, conn, table, start=None, end=None):
+        """Files holding the table's archived rows for the months from start to end."""
+        first = start.strftime("%Y-%m") if start is not None else ""
+        last = end.strftime("%Y-%m") if end is not None else "9999-12"
+        return [self.path(part) for (part,) in conn.execute(PARTS_IN_RANGE, (table, first, last))]
+
+    def table(self, conn, table, columns=None, patient_id=None, hospital_id=None, start=None, end=None):
+        """Archived rows as an Arrow table of `columns` (default all), or None when no part covers the range.
+
+        Filters match the SQL of the live tables: dates compare as ISO-8601 text.
+        """
+        paths = self.parts(conn, table, start, end)
+        if not paths:
+            return None
+        import pyarrow as pa
+
+        columns = columns or _schema(table).names
+        pieces = list(self._pieces(paths, table, columns, patient_id, hospital_id, start, end))
+        return pa.concat_tables(pieces) if pieces else _schema(table).empty_table().select(columns)
+
+    def has_rows(self, conn, table, patient_id=None, hospital_id=None, start=None, end=None):
+        """Whether any archived row matches, as table() filters; reads parts until one does."""
+        paths = self.parts(conn, table, start, end)
+        return any(piece.num_rows for piece in self._pieces(paths, table, ["id"], patient_id, hospital_id, start, end))
+
+    def _pieces(self, paths, table, columns, patient_id, hospital_id, start, end):
+        # The matching rows of each part, one Arrow table per part
+        if not paths:
+            return
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq  # only needed once a range reaches archived rows
+
+        date = TABLES[table][0]
+        conditions = []
+        if patient_id is not None:
+            conditions.append(("patient_id", pc.equal, patient_id))
+        if hospital_id is not None:
+            conditions.append(("hospital_id", pc.equal, hospital_id))
+        if start is not None:
+            conditions.append((date, pc.greater_equal, start.isoformat()))
+        if end is not None:
+            conditions.append((date, pc.less_equal, end.isoformat()))
+        read = list(dict.fromkeys(columns + [column for column, _, _ in conditions]))
+        for path in paths:
+            metadata = self._metadata(path)
+            groups = [i for i in range(metadata.num_row_groups) if patient_id is None or _may_hold(metadata.row_group(i).column(1).statistics, patient_id)]
+            if not groups:
+                continue
+            rows = pq.ParquetFile(path, metadata=metadata).read_row_groups(groups, columns=read)
+            for column, compare, value in conditions:
+                rows = rows.filter(compare(rows[column], value))
+            yield rows.select(columns)
+
+    def _metadata(self, path):
+        # Parts are never rewritten, so their footers can be kept
+        metadata = self._footers.get(path)
+        if metadata is None:
+            import pyarrow.parquet as pq
+
+            metadata = self._footers[path] = pq.read_metadata(path)
+        return metadata
+
+    def chunks(self, conn, table, columns, size, hospital_id=None):
+        """Every archived row as tuples of `columns`, `size` rows at a time, one part in memory at a time."""
+        import pyarrow.parquet as pq
+
+        filters = [("hospital_id", "=", hospital_id)] if hospital_id is not None else None
+        for path in self.parts(conn, table):
+            for batch in pq.read_table(path, columns=columns, filters=filters).to_batches(max_chunksize=size):
+                yield list(zip(*(column.to_pylist() for column in batch.columns)))
+
+    def move(self, db, before=None, batch=ARCHIVE_BATCH, now=None):
+        """Archive rows dated before `before` (default: the horizon); returns rows moved per table."""
+        # Compared as text with the stored ISO-8601 dates: a date without a time
+        # sorts before every timestamp of that day, whichever separator it uses
+        cutoff = (before or horizon(now)).strftime("%Y-%m-%d")
+        archived_at = (now or datetime.now()).isoformat()
+        moved = {}
+        for table in TABLES:
+            select, delete, credits = _statements(table)
+            after, moved[table], months = ("", 0), 0, set()
+            while True:
+                with db.write() as conn:
+                    rows = conn.execute(select, (cutoff, *after, batch)).fetchall()
+                    if not rows:
+                        break
+                    # One month per batch, as parts are
+                    month = rows[0][3][:7]
+                    rows = [row for row in rows if row[3][:7] == month]
+                    last = (rows[-1][3], rows[-1][0])  # date, id
+                    bounds = (cutoff, *after, *last)
+                    self._write_part(conn, table, month, rows, archived_at)
+                    for credit in credits:
+                        conn.execute(credit, bounds)
+                    seq = conn.execute(LAST_CHANGE).fetchone()[0]
+                    conn.execute(delete, bounds)
+                    conn.execute(MARK_ARCHIVED, (seq,))
+                moved[table] += len(rows)
+                months.add(month)
+                after = last
+            for month in sorted(months):
+                self.compact(db, table, month, archived_at)
+        return moved
+
+    def compact(self, db, table, month, archived_at=None):
+        """Merge a month's parts into one; the files replaced are left to remove_orphans()."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        with db.read() as conn:
+            parts = conn.execute(MONTH_PARTS, (table, month)).fetchall()
+        if len(parts) < 2:
+            return
+        # The month is read into memory once, to be sorted by patient across its parts
+        data = pa.concat_tables(pq.read_table(self.path(part), schema=_schema(table)) for _, part in parts)
+        data = data.sort_by([("patient_id", "ascending"), (TABLES[table][0], "ascending"), ("id", "ascending")])
+        part = self._part_name(table, month, pc.min(data["id"]).as_py(), data.num_rows)
+        staged = self._stage(part, data)
+        try:
+            with db.write() as conn:
+                if conn.execute(DELETE_MONTH_PARTS, (table, month, parts[-1][0])).rowcount != len(parts):
+                    raise RuntimeError(f"the {table} parts of {month} changed while being compacted")
+                os.replace(staged, self.path(part))
+                conn.execute(INSERT_PART, (table, month, part, data.num_rows, archived_at or datetime.now().isoformat()))
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+
+    def _write_part(self, conn, table, month, rows, archived_at):
+        import pyarrow as pa
+
+        schema = _schema(table)
+        rows.sort(key=lambda row: (row[1] or "", row[3], row[0]))  # patient, date, id
+        part = self._part_name(table, month, min(row[0] for row in rows), len(rows))
+        data = pa.Table.from_arrays([pa.array(values, field.type) for values, field in zip(zip(*rows), schema)], schema=schema)
+        os.replace(self._stage(part, data), self.path(part))
+        conn.execute(INSERT_PART, (table, month, part, len(rows), archived_at))
+
+    @staticmethod
+    def _part_name(table, month, first_id, rows):
+        # A row is archived once, so a batch's first id is unique; a merged part
+        # holds more rows than any part with its first id before it
+        return f"{table}/{month}/part-{first_id:012d}-{rows}.parquet"
+
+    def _stage(self, part, data):
+        # Written and fsynced under a temporary name, for os.replace() to put in place
+        import pyarrow.parquet as pq
+
+        directory = os.path.dirname(self.path(part))
+        os.makedirs(directory, exist_ok=True)
+        fd, staged = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                pq.write_table(data, out, compression=COMPRESSION, row_group_size=ROW_GROUP_ROWS)
+                out.flush()
+                os.fsync(out.fileno())
+        except BaseException:
+            os.remove(staged)
+            raise
+        return staged
+
+    def remove_orphans(self, db):
+        """Delete files no part names, left by a batch that did not commit or replaced by compact(); returns how many."""
+        removed = 0
+        # Under the write lock no batch sits between writing its files and committing
+        with db.write() as conn:
+            known = {part for (part,) in conn.execute(ALL_PARTS)}
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    if os.path.relpath(path, self.root).replace(os.sep, "/") not in known:
+                        os.remove(path)
+                        removed += 1
+        return removed
+
+
+if __name__ == "__main__":
+    # python archive.py [--db data/trackmyhealth.db] [--months 6], e.g. nightly from cron
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Move old vital signs and appointments to the archive")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="keep this many whole months live")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH)
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    archive = Archive(archive_dir_for(args.db))
+    removed = archive.remove_orphans(db)
+    before = horizon(months=args.months)
+    moved = archive.move(db, before, args.batch)
+    db.close()
+    print(f"Archived rows dated before {before:%Y-%m-%d}: " + ", ".join(f"{rows:,} {table.replace('_', ' ')}" for table, rows in moved.items())
+          + (f"; removed {removed:,} orphaned files" if removed else ""))
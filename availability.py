@@ -0,0 +1,169 @@
+from datetime import datetime, time, timedelta
+
+from appointments import CHECKED_IN, SCHEDULED
+
+# Appointment slot availability.
+#
+# Each hospital has weekly opening hours (hospital_hours, defaulting to
+# DEFAULT_HOURS) and a parallel capacity: how many appointments may overlap at
+# any moment. The day is divided into slot_minutes cells; a booking occupies
+# every cell it touches and fits if none of them is already at capacity.
+#
+# Bookings are looked up through the (hospital_id, status, appointment_date)
+# index. Since only the start time is indexed, searches reach back
+# MAX_DURATION_MINUTES before the window for bookings that run into it, which is
+# why book() refuses longer appointments.
+
+ACTIVE_STATUSES = (SCHEDULED, CHECKED_IN)
+MAX_DURATION_MINUTES = 240
+DEFAULT_SLOT_MINUTES = 15
+# weekday (Monday = 0) -> (opens, closes)
+DEFAULT_HOURS = {0: ("09:00", "17:00"), 1: ("09:00", "17:00"), 2: ("09:00", "17:00"), 3: ("09:00", "17:00"), 4: ("09:00", "17:00"), 5: ("09:00", "13:00")}
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SEARCH_DAYS = 60
+
+HOSPITAL_SCHEDULE = "SELECT capacity, slot_minutes FROM hospitals WHERE id = ?"
+HOSPITAL_HOURS = "SELECT weekday, opens, closes FROM hospital_hours WHERE hospital_id = ?"
+DELETE_HOURS = "DELETE FROM hospital_hours WHERE hospital_id = ?"
+INSERT_HOURS = "INSERT INTO hospital_hours (hospital_id, weekday, opens, closes) VALUES (?, ?, ?, ?)"
+SET_SCHEDULE = "UPDATE hospitals SET capacity = ?, slot_minutes = ?, updated_at = ? WHERE id = ?"
+BOOKINGS_BETWEEN = f"SELECT appointment_date, duration FROM appointments WHERE hospital_id = ? AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)}) AND appointment_date >= ? AND appointment_date < ?"
+PATIENT_BOOKINGS_BETWEEN = f"SELECT appointment_date, duration FROM appointments WHERE patient_id = ? AND appointment_date >= ? AND appointment_date < ? AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, reason, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING id"
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is outside opening hours, full, or clashes with the patient's own bookings."""
+
+
+class Schedule:
+    """Opening hours and capacity of one hospital."""
+
+    def __init__(self, capacity=1, slot_minutes=DEFAULT_SLOT_MINUTES, hours=None):
+        self.capacity = capacity
+        self.slot_minutes = slot_minutes
+        # weekday -> (opening minute, closing minute)
+        self.hours = {day: (_minutes(opens), _minutes(closes)) for day, (opens, closes) in (DEFAULT_HOURS if hours is None else hours).items()}
+
+    def day_bounds(self, day):
+        """(opening, closing) datetimes for a date, or None when closed."""
+        hours = self.hours.get(day.weekday())
+        if hours is None or hours[0] >= hours[1]:
+            return None
+        midnight = datetime.combine(day, time())
+        return midnight + timedelta(minutes=hours[0]), midnight + timedelta(minutes=hours[1])
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def load_schedule(conn, hospital_id):
+    row = conn.execute(HOSPITAL_SCHEDULE, (hospital_id,)).fetchone()
+    hours = {weekday: (opens, closes) for weekday, opens, closes in conn.execute(HOSPITAL_HOURS, (hospital_id,))}
+    capacity, slot_minutes = row if row else (1, DEFAULT_SLOT_MINUTES)
+    return Schedule(capacity or 1, slot_minutes or DEFAULT_SLOT_MINUTES, hours or None)
+
+
+def save_schedule(conn, hospital_id, capacity, slot_minutes, hours):
+    """Replace a hospital's hours ({weekday: ("HH:MM", "HH:MM")}, closed days omitted); call inside a write transaction."""
+    conn.execute(SET_SCHEDULE, (capacity, slot_minutes, datetime.now().isoformat(), hospital_id))
+    conn.execute(DELETE_HOURS, (hospital_id,))
+    conn.executemany(INSERT_HOURS, [(hospital_id, day, opens, closes) for day, (opens, closes) in sorted(hours.items())])
+
+
+def bookings(conn, hospital_id, start, end):
+    """(start, end) datetimes of active bookings that overlap [start, end)."""
+    params = [hospital_id, *ACTIVE_STATUSES, (start - timedelta(minutes=MAX_DURATION_MINUTES)).isoformat(), end.isoformat()]
+    intervals = []
+    for when, duration in conn.execute(BOOKINGS_BETWEEN, params):
+        begins = datetime.fromisoformat(when)
+        ends = begins + timedelta(minutes=duration or 0)
+        if ends > start and begins < end:
+            intervals.append((begins, ends))
+    return intervals
+
+
+def _occupancy(schedule, opens, cells, intervals):
+    # Difference array over the day's cells, then a running sum
+    slot = timedelta(minutes=schedule.slot_minutes)
+    delta = [0] * (cells + 1)
+    for begins, ends in intervals:
+        first = max(0, (begins - opens) // slot)
+        last = min(cells, -((opens - ends) // slot))  # ceiling division
+        if first < last:
+            delta[first] += 1
+            delta[last] -= 1
+    occupied, running = [], 0
+    for change in delta[:cells]:
+        running += change
+        occupied.append(running)
+    return occupied
+
+
+def free_slots(conn, hospital_id, duration, after, count=10, schedule=None, days=SEARCH_DAYS):
+    """The next `count` start times from `after` on where a `duration`-minute booking fits."""
+    schedule = schedule or load_schedule(conn, hospital_id)
+    slot = timedelta(minutes=schedule.slot_minutes)
+    span = -(-duration // schedule.slot_minutes)
+    found = []
+    for offset in range(days):
+        bounds = schedule.day_bounds(after.date() + timedelta(days=offset))
+        if bounds is None:
+            continue
+        opens, closes = bounds
+        if closes <= after:
+            continue
+        cells = (closes - opens) // slot
+        occupied = _occupancy(schedule, opens, cells, bookings(conn, hospital_id, opens, closes))
+        # Sliding count of full cells over the span a booking would cover
+        full = [1 if n >= schedule.capacity else 0 for n in occupied]
+        blocked = sum(full[:span])
+        for first in range(cells - span + 1):
+            if first:
+                blocked += full[first + span - 1] - full[first - 1]
+            begins = opens + first * slot
+            if not blocked and begins >= after:
+                found.append(begins)
+                if len(found) == count:
+                    return found
+    return found
+
+
+def check_slot(conn, hospital_id, patient_id, begins, duration, schedule=None):
+    """Raise SlotUnavailable unless a booking at `begins` fits."""
+    schedule = schedule or load_schedule(conn, hospital_id)
+    if not 0 < duration <= MAX_DURATION_MINUTES:
+        raise SlotUnavailable(f"Appointments last between 1 and {MAX_DURATION_MINUTES} minutes.")
+    ends = begins + timedelta(minutes=duration)
+    bounds = schedule.day_bounds(begins.date())
+    if bounds is None or begins < bounds[0] or ends > bounds[1]:
+        raise SlotUnavailable("The hospital is closed at that time.")
+    opens = bounds[0]
+    cells = (bounds[1] - opens) // timedelta(minutes=schedule.slot_minutes)
+    occupied = _occupancy(schedule, opens, cells, bookings(conn, hospital_id, begins, ends))
+    first = (begins - opens) // timedelta(minutes=schedule.slot_minutes)
+    last = -((opens - ends) // timedelta(minutes=schedule.slot_minutes))
+    if any(n >= schedule.capacity for n in occupied[first:last]):
+        raise SlotUnavailable("That time is fully booked.")
+    params = [patient_id, (begins - timedelta(minutes=MAX_DURATION_MINUTES)).isoformat(), ends.isoformat(), *ACTIVE_STATUSES]
+    for when, other in conn.execute(PATIENT_BOOKINGS_BETWEEN, params):
+        if datetime.fromisoformat(when) + timedelta(minutes=other or 0) > begins:
+            raise SlotUnavailable("You already have an appointment at that time.")
+
+
+def book(conn, hospital_id, patient_id, begins, duration, reason):
+    """Check and insert in the caller's write transaction; returns the new appointment id.
+
+    The write transaction (BEGIN IMMEDIATE) holds SQLite's write lock from the
+    check to the insert, so two sessions can never both take the last place.
+    """
+    check_slot(conn, hospital_id, patient_id, begins, duration)
+    now = datetime.now().isoformat()
+    return conn.execute(INSERT_APPOINTMENT, (patient_id, hospital_id, begins.isoformat(), duration, SCHEDULED, reason, now, now)).fetchone()[0]
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    return {"AVAILABILITY_BOOKINGS": BOOKINGS_BETWEEN, "AVAILABILITY_PATIENT_BOOKINGS": PATIENT_BOOKINGS_BETWEEN, "AVAILABILITY_HOURS": HOSPITAL_HOURS, "AVAILABILITY_SCHEDULE": HOSPITAL_SCHEDULE}
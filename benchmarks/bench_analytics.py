@@ -0,0 +1,107 @@
+"""Analytics snapshot: export cost, incremental refresh and report latency vs SQL on the live database.
+
+    python benchmarks/bench_analytics.py [patients] [hospitals]
+
+Fills a database with synthetic.generate (5 appointments per patient), then reports
+  - the first (full) export, and the snapshot's size on disk
+  - an incremental export after CHANGED appointments changed status
+  - each admin report from the snapshot, first after an export and memoized,
+    against the same aggregate in SQL on the live database; both must agree
+  - loading the snapshot from disk, as after a restart
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import synthetic
+from appointments import COMPLETED, NO_SHOW
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+from migrations import apply_migrations
+
+CHANGED = 1_000
+PER_DAY_SQL = "SELECT hospital_id, date(appointment_date), count(*) FROM appointments WHERE appointment_date >= ? AND appointment_date < ? GROUP BY 1, 2"
+NO_SHOW_SQL = "SELECT hospital_id, sum(status = ?), count(*) FROM appointments WHERE status IN (?, ?) AND appointment_date >= ? AND appointment_date < ? GROUP BY hospital_id"
+CONDITIONS_SQL = "SELECT patient_id, chronic_conditions FROM medical_history"
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def sql_per_day(conn, start, end):
+    return {(h, d): n for h, d, n in conn.execute(PER_DAY_SQL, (start.isoformat(), end.isoformat()))}
+
+
+def sql_no_shows(conn, start, end):
+    return {h: (missed, n) for h, missed, n in conn.execute(NO_SHOW_SQL, (NO_SHOW, COMPLETED, NO_SHOW, start.isoformat(), end.isoformat()))}
+
+
+def sql_conditions(conn):
+    # SQLite cannot split the comma-separated list; done here as the app would have to
+    patients = {}
+    for patient_id, conditions in conn.execute(CONDITIONS_SQL):
+        patients.setdefault(patient_id, set()).update(c.strip() for c in (conditions or "").split(",") if c.strip())
+    return Counter(c for conditions in patients.values() for c in conditions)
+
+
+def directory_mb(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 2 ** 20
+
+
+if __name__ == "__main__":
+    patients = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    hospitals = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "bench.db")
+        db = ConnectionManager(db_file)
+        apply_migrations(db)
+        counts = synthetic.generate(db, BlobStore(blob_dir_for(db_file)), hospitals=hospitals, patients=patients, appointments=5, vitals=0, reports=0)
+        print(f"{counts['appointments']:,} appointments, {counts['patients']:,} patients, {hospitals} hospitals; database {os.path.getsize(db_file) / 2 ** 20:,.0f} MB")
+
+        snapshot_dir = analytics.snapshot_dir_for(db_file)
+        snapshot = analytics.Snapshot(db, snapshot_dir, interval=None)
+        exported, ms = timed(snapshot.export)
+        print(f"full export:        {ms:8.0f} ms  {sum(exported.values()):,} rows, snapshot {directory_mb(snapshot_dir):.1f} MB")
+        with db.read() as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM appointments")]
+        now = datetime.now().isoformat()
+        with db.write() as conn:
+            conn.executemany("UPDATE appointments SET status = ?, updated_at = ? WHERE id = ?", [(NO_SHOW, now, i) for i in random.Random(0).sample(ids, CHANGED)])
+        exported, ms = timed(snapshot.export)
+        print(f"incremental export: {ms:8.0f} ms  {sum(exported.values()):,} rows after {CHANGED:,} changes")
+        # Rows changed within OVERLAP of the last export are exported again
+        exported, ms = timed(snapshot.export)
+        print(f"no-change export:   {ms:8.0f} ms  {sum(exported.values()):,} rows")
+
+        today = datetime.combine(date.today(), datetime.min.time())
+        start, end = today - timedelta(days=30), today + timedelta(days=8)
+        print(f"\n{'report':<24} {'snapshot':>9} {'memoized':>9} {'SQL':>9}")
+        reports = [
+            ("appointments per day", (analytics.appointments_per_day, start, end), lambda conn: sql_per_day(conn, start, end),
+             lambda frame: {(r.hospital_id, r.day.isoformat()): r.appointments for r in frame.itertuples()}),
+            ("no-show rates", (analytics.no_show_rates, start, today), lambda conn: sql_no_shows(conn, start, today),
+             lambda frame: {r.hospital_id: (r.no_shows, r.appointments) for r in frame.itertuples()}),
+            ("condition prevalence", (analytics.condition_prevalence,), sql_conditions,
+             lambda frame: Counter(dict(zip(frame["condition"], frame["patients"])))),
+        ]
+        for name, (report, *args), sql, normalize in reports:
+            frame, cold = timed(snapshot.query, report, *args)
+            _, warm = timed(snapshot.query, report, *args)
+            with db.read() as conn:
+                expected, sql_ms = timed(sql, conn)
+            assert normalize(frame) == expected, name
+            print(f"{name:<24} {cold:7.1f}ms {warm:7.3f}ms {sql_ms:7.1f}ms")
+
+        _, ms = timed(analytics.Snapshot, db, snapshot_dir, None)
+        print(f"\nload snapshot from disk: {ms:.0f} ms")
+        db.close()
@@ -0,0 +1,179 @@
+"""Read API load test against scraping the same data from the Streamlit pages.
+
+    python benchmarks/bench_api.py [--patients 5000] [--connections 8] [--seconds 5] [--reruns 30]
+
+Fills a database with synthetic.generate, starts api.py in its own process and
+drives it from --connections keep-alive client threads for --seconds per workload:
+  - vitals / appointments: first page (DEFAULT_LIMIT rows) of a random patient, 200
+  - revalidate: the same vitals request with the ETag from an earlier response, 304
+reporting requests per second and p50 / p99 latency. For comparison, a patient
+session opens the Medical History and Appointments pages in Streamlit's AppTest
+and reruns them --reruns times, which is what every interaction (or scrape) of
+those pages costs the server. Client, server and AppTest share this machine, so
+the client's own cost is part of the API numbers.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import api
+import synthetic
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+from migrations import apply_migrations
+
+APP = os.path.join(ROOT, "Healthrecords.py")
+DB_FILE = "data/trackmyhealth.db"  # relative, as in Healthrecords.py
+PATIENT_PASSWORD = "patient123"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_file, port):
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "api.py"), "--db", db_file, "--port", str(port)], stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    sys.exit("api.py did not start")
+
+
+def load(port, token, paths, etags, connections, seconds):
+    """Requests per second and latencies over `seconds` from `connections` threads."""
+    latencies, statuses = [], []
+    deadline = time.perf_counter() + seconds
+
+    def client(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {"Authorization": f"Bearer {token}"}
+        while time.perf_counter() < deadline:
+            path = rng.choice(paths)
+            if etags:
+                headers["If-None-Match"] = etags[path]
+            started = time.perf_counter()
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(connections)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000, set(statuses)
+
+
+def etags_for(port, token, paths):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    for path in paths:
+        conn.request("GET", path, headers={"Authorization": f"Bearer {token}"})
+        response = conn.getresponse()
+        response.read()
+        etags[path] = response.getheader("ETag")
+    conn.close()
+    return etags
+
+
+def streamlit_reruns(username, reruns):
+    """Child process: reruns per second of the patient pages in AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.run()
+    at.selectbox[0].select("Patient").run()
+    at.text_input[0].input(username)
+    at.text_input[1].input(PATIENT_PASSWORD).run()
+    [button for button in at.button if button.label == "Login"][0].click().run()
+    rates = {}
+    for page in ("Medical History", "Appointments"):
+        at.sidebar.selectbox[0].select(page).run()
+        times = []
+        for _ in range(reruns):
+            started = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        rates[page] = statistics.median(times) * 1000
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=5_000)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--streamlit-child", metavar="USERNAME", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.streamlit_child:
+        print(json.dumps(streamlit_reruns(args.streamlit_child, args.reruns)))
+        sys.exit(0)
+
+    directory = tempfile.mkdtemp(prefix="bench_api_")
+    try:
+        db_file = os.path.join(directory, DB_FILE)
+        db = ConnectionManager(db_file)
+        apply_migrations(db)
+        counts = synthetic.generate(db, BlobStore(blob_dir_for(db_file)), hospitals=20, patients=args.patients, appointments=5, vitals=50, reports=0.2)
+        token = api.issue_token(db, "admin")
+        db.close()
+        print(f"{counts['patients']:,} patients, {counts['vital_signs']:,} vitals, {counts['appointments']:,} appointments")
+
+        port = free_port()
+        server = start_server(db_file, port)
+        try:
+            rng = random.Random(0)
+            patients = [synthetic.patient_id(rng.randrange(args.patients)) for _ in range(1_000)]
+            workloads = [
+                ("vitals (200)", [f"/patients/{p}/vitals" for p in patients], False),
+                ("appointments (200)", [f"/patients/{p}/appointments" for p in patients], False),
+                ("revalidate (304)", [f"/patients/{p}/vitals" for p in patients], True),
+            ]
+            print(f"\n{'API, ' + str(args.connections) + ' connections':<30} {'req/s':>8} {'p50':>8} {'p99':>8}")
+            for name, paths, revalidate in workloads:
+                etags = etags_for(port, token, paths) if revalidate else None
+                rate, p50, p99, statuses = load(port, token, paths, etags, args.connections, args.seconds)
+                print(f"{name:<30} {rate:8,.0f} {p50:6.2f}ms {p99:6.2f}ms  status {', '.join(map(str, sorted(statuses)))}")
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait()
+
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--streamlit-child", synthetic.patient_username(0), "--reruns", str(args.reruns)],
+                                cwd=directory, capture_output=True, text=True)
+        if result.returncode:
+            sys.exit(result.stderr[-3000:])
+        print(f"\n{'Streamlit rerun (one session)':<30} {'req/s':>8} {'p50':>8}")
+        for page, ms in json.loads(result.stdout.strip().splitlines()[-1]).items():
+            print(f"{page:<30} {1000 / ms:8,.1f} {ms:6.1f}ms")
+    finally:
+        shutil.rmtree(directory)
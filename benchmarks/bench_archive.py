@@ -0,0 +1,139 @@
+"""Archival of old vital signs and appointments: what it moves, and what reads cost before and after.
+
+    python benchmarks/bench_archive.py [--patients 20000] [--vitals 100] [--appointments 10] [--months 6] [--lookups 300]
+
+Fills a database with synthetic.generate (a year of history per patient), then
+measures the page reads below for --lookups random patients (median per call),
+archives everything older than --months whole months with archive.py, and
+measures the same reads again:
+  - vitals, last 30 days: both trend charts, live rows only
+  - vitals, all time: both trend charts; raw rows, so archived months are merged in
+  - appointment history, last year / all time, archived months merged in
+  - hospital appointments page: the first page and count of a week back to a month ahead
+Also reported: rows moved, archival throughput, the longest write transaction
+(how long the app's writers may wait), and the bytes of the live tables with
+their indexes (dbstat) against the archive's files.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_access
+import synthetic
+import vitals
+from archive import Archive, archive_dir_for
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+from migrations import apply_migrations
+from views.charts import VITAL_CHART_METRICS
+
+HOSPITALS = 20
+TABLE_BYTES = "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name WHERE m.tbl_name IN ('vital_signs', 'appointments') GROUP BY m.tbl_name"
+
+
+class TimedWrites(ConnectionManager):
+    """Records how long each write transaction held the write lock."""
+
+    holds = []
+
+    @contextmanager
+    def write(self):
+        started = time.perf_counter()
+        with super().write() as conn:
+            yield conn
+        self.holds.append(time.perf_counter() - started)
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(path) for name in names)
+
+
+def workloads(archive, patients, hospitals):
+    now = datetime.now()
+    last_month, last_year = now - timedelta(days=30), now - timedelta(days=365)
+    filters = [data_access.appointment_filters(h, (now - timedelta(days=7)).date(), (now + timedelta(days=30)).date()) for h in hospitals]
+    return {
+        "vitals, last 30 days": [lambda conn, p=p: [vitals.load_series(conn, p, m, start=last_month, archive=archive) for m in VITAL_CHART_METRICS] for p in patients],
+        "vitals, all time": [lambda conn, p=p: [vitals.load_series(conn, p, m, archive=archive) for m in VITAL_CHART_METRICS] for p in patients],
+        "appointment history, last year": [lambda conn, p=p: data_access.appointment_history(conn, archive, p, start=last_year) for p in patients],
+        "appointment history, all time": [lambda conn, p=p: data_access.appointment_history(conn, archive, p) for p in patients],
+        "hospital appointments page": [lambda conn, f=f: (data_access.appointments_page(conn, f), data_access.count_appointments(conn, f)) for f in filters],
+    }
+
+
+def measure(db, calls):
+    times = []
+    with db.read() as conn:
+        calls[0](conn)  # warm: imports, statement cache
+        for call in calls:
+            started = time.perf_counter()
+            call(conn)
+            times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def live_bytes(db):
+    with db.read() as conn:
+        return dict(conn.execute(TABLE_BYTES).fetchall())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--vitals", type=float, default=100)
+    parser.add_argument("--appointments", type=float, default=10)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--lookups", type=int, default=300)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_archive_")
+    try:
+        db_file = os.path.join(directory, "archive.db")
+        db = TimedWrites(db_file)
+        apply_migrations(db)
+        counts = synthetic.generate(db, BlobStore(blob_dir_for(db_file)), hospitals=HOSPITALS, patients=args.patients,
+                                    appointments=args.appointments, vitals=args.vitals, reports=0)
+        print(f"{counts['patients']:,} patients, {counts['vital_signs']:,} vitals, {counts['appointments']:,} appointments")
+        rng = random.Random(0)
+        patients = [synthetic.patient_id(rng.randrange(args.patients)) for _ in range(args.lookups)]
+        hospitals = [synthetic.hospital_id(rng.randrange(HOSPITALS)) for _ in range(args.lookups)]
+        archive = Archive(archive_dir_for(db_file))
+
+        calls = workloads(archive, patients, hospitals)
+        before = {name: measure(db, c) for name, c in calls.items()}
+        bytes_before = live_bytes(db)
+
+        from archive import horizon
+        db.holds.clear()
+        started = time.perf_counter()
+        moved = archive.move(db, horizon(months=args.months))
+        elapsed = time.perf_counter() - started
+        holds = sorted(db.holds)
+        archive.remove_orphans(db)  # the parts compact() replaced
+        total = sum(moved.values())
+        print(f"\nArchived before {horizon(months=args.months):%Y-%m-%d}: " + ", ".join(f"{rows:,} {table.replace('_', ' ')}" for table, rows in moved.items()))
+        print(f"{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), {len(holds)} write transactions (batches and compactions), p50 {holds[len(holds) // 2] * 1000:.0f}ms, max {holds[-1] * 1000:.0f}ms")
+
+        bytes_after = live_bytes(db)
+        print(f"\n{'live table + indexes':<24} {'before':>9} {'after':>9}")
+        for table in ("vital_signs", "appointments"):
+            print(f"{table:<24} {bytes_before[table] / 2 ** 20:7.1f}MB {bytes_after[table] / 2 ** 20:7.1f}MB")
+        print(f"{'archive files':<24} {'':>9} {directory_bytes(archive.root) / 2 ** 20:7.1f}MB")
+
+        after = {name: measure(db, c) for name, c in calls.items()}
+        print(f"\n{'median per call':<32} {'before':>8} {'after':>8}")
+        for name in calls:
+            print(f"{name:<32} {before[name]:6.2f}ms {after[name]:6.2f}ms")
+        db.close()
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,117 @@
+"""Slot searches against a hospital with 100k appointments.
+
+    python benchmarks/bench_availability.py [appointments] [searches]
+
+Seeds one hospital (capacity 4, default opening hours) with non-overlapping
+lanes of bookings at ~60% utilisation, then times "next 10 free 30-minute
+slots" from random points in the booked range: availability.free_slots against
+a per-candidate overlap query (one COUNT per grid slot). Finally, several
+threads race for the same slot to check that exactly `capacity` bookings win.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import availability
+from db import ConnectionManager
+from migrations import apply_migrations
+
+HOSPITAL_ID = "HOS_BENCH"
+CAPACITY = 4
+NAIVE_OVERLAP = "SELECT COUNT(*) FROM appointments WHERE hospital_id = ? AND status IN (?, ?) AND appointment_date >= ? AND appointment_date < ? AND datetime(appointment_date, '+' || duration || ' minutes') > datetime(?)"
+
+
+def seed(db, count, rng):
+    schedule = availability.Schedule(CAPACITY)
+    rows, day = [], date(2020, 1, 1)
+    while len(rows) < count:
+        bounds = schedule.day_bounds(day)
+        if bounds:
+            for lane in range(CAPACITY):
+                t = bounds[0]
+                while t < bounds[1] and len(rows) < count:
+                    duration = rng.choice((15, 30, 45, 60))
+                    if rng.random() < 0.6 and t + timedelta(minutes=duration) <= bounds[1]:
+                        rows.append((f"PAT_{len(rows) % 5000:05d}_{lane}", HOSPITAL_ID, t.isoformat(), duration, "Scheduled", "bench"))
+                        t += timedelta(minutes=duration)
+                    else:
+                        t += timedelta(minutes=15)
+        day += timedelta(days=1)
+    with db.write() as conn:
+        conn.execute("INSERT INTO hospitals (id, name, address, status, capacity) VALUES (?, 'Bench', '', 'approved', ?)", (HOSPITAL_ID, CAPACITY))
+        conn.executemany("INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, reason) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("ANALYZE")
+    return date(2020, 1, 1), day
+
+
+def naive_free_slots(conn, duration, after, count=10):
+    # One overlap query per candidate start; counts overlapping bookings rather than peak load
+    schedule = availability.Schedule(CAPACITY)
+    found, day = [], after.date()
+    while len(found) < count:
+        bounds = schedule.day_bounds(day)
+        if bounds:
+            t = bounds[0]
+            while t + timedelta(minutes=duration) <= bounds[1] and len(found) < count:
+                if t >= after:
+                    end = t + timedelta(minutes=duration)
+                    params = (HOSPITAL_ID, *availability.ACTIVE_STATUSES, (t - timedelta(minutes=availability.MAX_DURATION_MINUTES)).isoformat(), end.isoformat(), t.isoformat())
+                    if conn.execute(NAIVE_OVERLAP, params).fetchone()[0] < CAPACITY:
+                        found.append(t)
+                t += timedelta(minutes=schedule.slot_minutes)
+        day += timedelta(days=1)
+    return found
+
+
+def time_searches(name, search, starts):
+    started = time.perf_counter()
+    for after in starts:
+        assert len(search(after)) == 10
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {len(starts) / elapsed:>10,.0f} searches/s  ({elapsed / len(starts) * 1000:.2f} ms each)")
+
+
+def race(db, threads=16):
+    # Everyone wants 10:00 on a day with no bookings
+    slot = datetime(2035, 1, 2, 10, 0)
+    wins, losses = [], []
+
+    def attempt(n):
+        try:
+            with db.write() as conn:
+                wins.append(availability.book(conn, HOSPITAL_ID, f"PAT_RACE_{n}", slot, 30, "race"))
+        except availability.SlotUnavailable:
+            losses.append(n)
+
+    workers = [threading.Thread(target=attempt, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(wins) == CAPACITY, (wins, losses)
+    print(f"race for one slot: {threads} sessions, {len(wins)} booked (capacity {CAPACITY}), {len(losses)} refused")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+        first, last = seed(db, count, rng)
+        span = (last - first).days
+        starts = [datetime.combine(first, datetime.min.time()) + timedelta(days=rng.randrange(span), minutes=rng.randrange(24 * 60)) for _ in range(searches)]
+        print(f"{count:,} appointments over {span:,} days, capacity {CAPACITY}")
+        with db.read() as conn:
+            schedule = availability.load_schedule(conn, HOSPITAL_ID)
+            time_searches("free_slots", lambda after: availability.free_slots(conn, HOSPITAL_ID, 30, after, schedule=schedule), starts)
+            time_searches("per-slot overlap query", lambda after: naive_free_slots(conn, 30, after), starts[: max(1, searches // 10)])
+        race(db)
+        db.close()
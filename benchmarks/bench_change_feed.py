@@ -0,0 +1,123 @@
+"""Change feed: trigger cost on writes, consumer read rate and compaction.
+
+    python benchmarks/bench_change_feed.py [patients] [writes]
+
+Fills a database with synthetic.generate, copies it, and drops the change_log
+triggers from the copy. Then, alternating between the two for ROUNDS rounds, it
+reports the best commits per second of each for
+  - booking: one appointment insert per transaction
+  - status change: one appointment update per transaction
+  - vitals batch: 100 readings per transaction through vitals_ingest.write_readings
+Then, with triggers, it reports
+  - a consumer paging through the whole log with fetch_changes (DEFAULT_LIMIT per page)
+  - compact(): collapsing superseded entries, then pruning everything as expired
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import changefeed
+import synthetic
+import vitals_ingest
+from availability import INSERT_APPOINTMENT
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+from migrations import CHANGE_FEED_TABLES, apply_migrations
+
+VITALS_BATCH = 100
+ROUNDS = 3
+
+
+def rate(fn, count):
+    started = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - started)
+
+
+def workloads(db, patients, hospitals, writes, rng):
+    now = datetime.now()
+
+    def book():
+        for n in range(writes):
+            p = rng.randrange(patients)
+            with db.write() as conn:
+                conn.execute(INSERT_APPOINTMENT, (synthetic.patient_id(p), synthetic.patient_hospital(p, hospitals), (now + timedelta(days=1, minutes=n)).isoformat(),
+                                                  30, "Scheduled", "Check-up", now.isoformat(), now.isoformat())).fetchall()
+
+    def change_status():
+        with db.read() as conn:
+            ids = [row[0] for row in conn.execute("SELECT id FROM appointments LIMIT ?", (writes,))]
+        for i in ids:
+            with db.write() as conn:
+                conn.execute("UPDATE appointments SET status = ?, updated_at = ? WHERE id = ?", (rng.choice(["Completed", "Cancelled"]), now.isoformat(), i))
+
+    def vitals():
+        for _ in range(writes // VITALS_BATCH):
+            readings = [{"patient_id": synthetic.patient_id(rng.randrange(patients)), "pulse": rng.randint(55, 100), "temperature": 98.6} for _ in range(VITALS_BATCH)]
+            items, _ = vitals_ingest.validate_batch(readings, now)
+            with db.write() as conn:
+                vitals_ingest.write_readings(conn, items)
+
+    return [("booking", book, writes), ("status change", change_status, writes), (f"vitals batch x{VITALS_BATCH}", vitals, writes // VITALS_BATCH)]
+
+
+if __name__ == "__main__":
+    patients = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    hospitals = 20
+    with tempfile.TemporaryDirectory() as directory:
+        db_file = os.path.join(directory, "feed.db")
+        db = ConnectionManager(db_file)
+        apply_migrations(db)
+        counts = synthetic.generate(db, BlobStore(blob_dir_for(db_file)), hospitals=hospitals, patients=patients, appointments=5, vitals=10, reports=0)
+        db.close()
+        plain_file = os.path.join(directory, "plain.db")
+        shutil.copy(db_file, plain_file)
+        plain = ConnectionManager(plain_file)
+        with plain.write() as conn:
+            for table in CHANGE_FEED_TABLES:
+                for operation in ("insert", "update", "delete"):
+                    conn.execute(f"DROP TRIGGER {table}_change_{operation}")
+        db = ConnectionManager(db_file)
+        with db.read() as conn:
+            logged = changefeed.latest_cursor(conn)
+        print(f"{counts['patients']:,} patients, {counts['appointments']:,} appointments, {counts['vital_signs']:,} vitals; {logged:,} change log entries")
+
+        print(f"\n{'workload':<20} {'no triggers':>12} {'change log':>12} {'cost':>7}")
+        best = {}
+        for _ in range(ROUNDS):
+            for (name, without, count), (_, with_log, _) in zip(workloads(plain, patients, hospitals, writes, random.Random(0)), workloads(db, patients, hospitals, writes, random.Random(0))):
+                base, logged_rate = best.get(name, (0, 0))
+                best[name] = max(base, rate(without, count)), max(logged_rate, rate(with_log, count))
+        for name, (base, logged_rate) in best.items():
+            print(f"{name:<20} {base:9,.0f}/s {logged_rate:9,.0f}/s {(base / logged_rate - 1) * 100:6.1f}%")
+        plain.close()
+
+        with db.read() as conn:
+            latest = changefeed.latest_cursor(conn)
+        started, cursor, fetched = time.perf_counter(), 0, 0
+        while cursor < latest:
+            with db.read() as conn:
+                changes, cursor = changefeed.fetch_changes(conn, cursor)
+            fetched += len(changes)
+        elapsed = time.perf_counter() - started
+        print(f"\nconsumer catch-up: {fetched:,} changes in {elapsed:.2f} s ({fetched / elapsed:,.0f}/s)")
+
+        started = time.perf_counter()
+        superseded, _ = changefeed.compact(db)
+        print(f"compact superseded: {superseded:,} entries in {time.perf_counter() - started:.2f} s")
+        started = time.perf_counter()
+        _, pruned = changefeed.compact(db, now=datetime.now() + changefeed.RETENTION + timedelta(days=1))
+        print(f"prune expired:      {pruned:,} entries in {time.perf_counter() - started:.2f} s")
+        with db.read() as conn:
+            try:
+                changefeed.fetch_changes(conn, 0)
+            except changefeed.CursorExpired as e:
+                print(f"cursor 0 after pruning: {e}")
+        db.close()
@@ -0,0 +1,66 @@
+"""Vitals DataFrame construction: list-of-dicts (the old view code) vs data_access.
+
+    python benchmarks/bench_dataframes.py [rows]
+
+Reports rows/sec and tracemalloc peak memory for each path.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import data_access
+from db import ConnectionManager
+from migrations import apply_migrations
+
+LEGACY_VITALS = "SELECT recorded_date, temperature, blood_pressure, pulse, oxygen_saturation, weight, bmi FROM vital_signs WHERE patient_id = ? ORDER BY recorded_date DESC"
+
+
+def seed(db, rows):
+    start = datetime(2020, 1, 1)
+    with db.write() as conn:
+        conn.executemany(
+            "INSERT INTO vital_signs (patient_id, hospital_id, recorded_date, temperature, blood_pressure, pulse, oxygen_saturation, weight, bmi) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (("PAT_BENCH", "HOS_BENCH", (start + timedelta(minutes=i)).isoformat(), 97.0 + (i % 30) / 10, f"{110 + i % 30}/{70 + i % 20}", 60 + i % 40, 95.0 + i % 5, 150.0 + i % 20, 22.0 + (i % 40) / 10) for i in range(rows)),
+        )
+
+
+def legacy(conn):
+    vitals = conn.execute(LEGACY_VITALS, ("PAT_BENCH",)).fetchall()
+    return pd.DataFrame([{"Date": v[0].split("T")[0], "Temperature (°F)": v[1], "BP (mmHg)": v[2], "Pulse (bpm)": v[3], "O2 Sat (%)": v[4], "Weight (lbs)": v[5], "BMI": v[6]} for v in vitals])
+
+
+def columnar(conn):
+    return data_access.vital_signs(conn, "PAT_BENCH")
+
+
+def measure(name, fn, conn, rows):
+    # Timed and memory-traced runs are separate: tracemalloc slows allocation-heavy code
+    started = time.perf_counter()
+    df = fn(conn)
+    elapsed = time.perf_counter() - started
+    assert len(df) == rows
+    del df
+    tracemalloc.start()
+    df = fn(conn)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<16} {elapsed:8.2f} s {rows / elapsed:>12,.0f} rows/s  peak {peak / 2**20:8.1f} MiB  frame {df.memory_usage(deep=True).sum() / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+        seed(db, rows)
+        with db.read() as conn:
+            measure("list-of-dicts", legacy, conn, rows)
+            measure("data_access", columnar, conn, rows)
+        db.close()
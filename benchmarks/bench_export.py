@@ -0,0 +1,134 @@
+"""Hospital export: throughput and peak memory as the hospital grows.
+
+    python benchmarks/bench_export.py [--sizes 5000,20000,60000] [--formats csv,jsonl,fhir]
+
+For each size, a database holding one hospital with that many patients is filled
+by synthetic.generate (5 appointments, 20 vitals and 0.1 reports of 32 KB per
+patient). Each export then runs in a fresh process, writing a .tar.gz to disk, and
+reports rows and report files exported, archive size, time, rows per second, and
+peak anonymous RSS above the process's own before the export started, sampled from
+/proc/self/status every 10 ms. Anonymous, because ru_maxrss also counts database
+pages touched through the connections' 256 MB mmap, which are page cache. "naive"
+is the by-hand dump for comparison: fetchall() per table, one JSON Lines member
+per table built in memory, written with tarfile.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Only what the export itself needs: the children measure their own peak RSS
+import export
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+
+HOSPITAL_ID = "HOS_SYN000000"  # synthetic.hospital_id(0)
+
+
+def anon_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+
+
+class PeakSampler(threading.Thread):
+    """Highest anonymous RSS seen until stop()."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = anon_rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(0.01):
+            self.peak = max(self.peak, anon_rss_mb())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return max(self.peak, anon_rss_mb())
+
+
+def naive_export(db, blob_store, hospital_id, out):
+    rows = files = 0
+    with db.read() as conn, tarfile.open(fileobj=out, mode="w:gz") as archive:
+        for table, (columns, sql) in export.TABLES.items():
+            records = [dict(zip(columns, row)) for row in conn.execute(sql, (hospital_id,) * sql.count("?")).fetchall()]
+            data = "".join(json.dumps(record) + "\n" for record in records).encode()
+            info = tarfile.TarInfo(f"{table}.jsonl")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+            rows += len(records)
+            if table == "reports":
+                for record in records:
+                    archive.add(blob_store.path(record["content_hash"]), export.report_path(record))
+                    files += 1
+    return rows, files
+
+
+def child(db_file, fmt):
+    db = ConnectionManager(db_file)
+    store = BlobStore(blob_dir_for(db_file))
+    out_file = os.path.join(os.path.dirname(db_file), f"export.{fmt}.tar.gz")
+    # Warm the imports and the connection, so the baseline excludes them
+    with db.read() as conn:
+        conn.execute("SELECT count(*) FROM patients").fetchone()
+    baseline = anon_rss_mb()
+    sampler = PeakSampler()
+    sampler.start()
+    started = time.perf_counter()
+    with open(out_file, "wb") as f:
+        if fmt == "naive":
+            rows, files = naive_export(db, store, HOSPITAL_ID, f)
+        else:
+            manifest = export.export_hospital(db, store, HOSPITAL_ID, f, fmt)
+            rows, files = sum(entry["rows"] for entry in manifest["tables"].values()), manifest["report_files"]
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+    result = {"rows": rows, "files": files, "seconds": elapsed, "archive_mb": os.path.getsize(out_file) / 2 ** 20, "baseline_mb": baseline, "peak_mb": peak}
+    os.remove(out_file)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="5000,20000,60000")
+    parser.add_argument("--formats", default="csv,jsonl,fhir,naive")
+    parser.add_argument("--child", nargs=2, metavar=("DB", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(*args.child)))
+        sys.exit(0)
+
+    import synthetic
+    from migrations import apply_migrations
+
+    print(f"{'patients':>8} {'format':<6} {'rows':>10} {'files':>6} {'archive':>9} {'time':>7} {'rows/s':>8} {'peak anon':>9} {'over base':>10}")
+    for size in map(int, args.sizes.split(",")):
+        directory = tempfile.mkdtemp(prefix="bench_export_")
+        try:
+            db_file = os.path.join(directory, "export.db")
+            db = ConnectionManager(db_file)
+            apply_migrations(db)
+            synthetic.generate(db, BlobStore(blob_dir_for(db_file)), hospitals=1, patients=size, appointments=5, vitals=20, reports=0.1, report_kb=32)
+            db.close()
+            for fmt in args.formats.split(","):
+                result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", db_file, fmt], capture_output=True, text=True)
+                if result.returncode:
+                    sys.exit(result.stderr[-3000:])
+                r = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"{size:8,} {fmt:<6} {r['rows']:10,} {r['files']:6,} {r['archive_mb']:7.1f}MB {r['seconds']:6.1f}s {r['rows'] / r['seconds']:8,.0f} "
+                      f"{r['peak_mb']:7.0f}MB {r['peak_mb'] - r['baseline_mb']:8.1f}MB")
+        finally:
+            shutil.rmtree(directory)
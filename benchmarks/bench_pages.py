@@ -0,0 +1,241 @@
+"""Every page, driven headlessly through Streamlit's AppTest, at several dataset sizes.
+
+    python benchmarks/bench_pages.py [--sizes small,medium] [--users 3]
+                                     [--json results.json] [--baseline results.json] [--tolerance 0.25]
+
+Each size runs in its own process: a fresh database is filled by synthetic.generate,
+then patients, hospitals and the admin log in and open every page of their menu.
+Per page it reports
+  - cold: the first visit by a user, with none of their read models cached:
+    rerun time (p50 / p95 over users), page function time, SQL statements, rows
+  - warm: page function time and statements of a rerun with nothing changed
+  - peak: tracemalloc peak of the page function on a cold visit, from a separate
+    pass with one more user (tracing slows everything down)
+Rerun time is what AppTest measures for the whole script, its own overhead
+included; page function time and statement counts are taken around the app's
+own profiled render (profiling.Profiler.render).
+
+--json saves the results; --baseline compares against saved ones and exits 1
+when a page issues more SQL statements than before, or its cold page function
+time grew by more than --tolerance (and MIN_REGRESSION_MS).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import profiling
+import synthetic
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager
+from migrations import apply_migrations
+
+APP = os.path.join(ROOT, "Healthrecords.py")
+DB_FILE = "data/trackmyhealth.db"  # relative, as in Healthrecords.py; each size runs in its own directory
+# name -> synthetic.generate arguments
+SIZES = {
+    "small": {"hospitals": 5, "patients": 1_000, "appointments": 5, "vitals": 20, "reports": 0.5, "report_kb": 32},
+    "medium": {"hospitals": 20, "patients": 20_000, "appointments": 5, "vitals": 20, "reports": 0.1, "report_kb": 32},
+    "large": {"hospitals": 50, "patients": 200_000, "appointments": 5, "vitals": 20, "reports": 0.02, "report_kb": 32},
+}
+# Logging in lands on the Dashboard, so its cold visit is the "Login + Dashboard" step
+PAGES = {
+    "Patient": ["Appointments", "Medical History", "About"],
+    "Hospital": ["Appointments", "Medical History", "Medical History: search", "Patient Management", "About"],
+    "Admin": ["Hospital Approvals", "Performance", "About"],
+}
+ADMIN = ("admin", "admin123")
+# Page function time must grow by this much as well as by --tolerance to count
+MIN_REGRESSION_MS = 5
+
+renders = []
+
+
+def capture_renders():
+    # Record each page function's time, statements, rows and tracemalloc peak
+    # around the app's own profiled render
+    render = profiling.Profiler.render
+
+    @contextmanager
+    def profiled(self, page):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        with render(self, page) as current:
+            yield current
+        statements = current.statements.values()
+        peak = (tracemalloc.get_traced_memory()[1] - before) / 1024 if tracing else None
+        renders.append((time.perf_counter() - started, sum(entry[0] for entry in statements), sum(entry[2] for entry in statements), peak))
+    profiling.Profiler.render = profiled
+
+
+def accounts(size, users):
+    hospitals, patients = SIZES[size]["hospitals"], SIZES[size]["patients"]
+    spread = lambda total: sorted({i * total // users for i in range(users)})
+    return {
+        "Patient": [(synthetic.patient_username(n), "patient123") for n in spread(patients)],
+        "Hospital": [(synthetic.hospital_username(n), synthetic.HOSPITAL_PASSWORD) for n in spread(hospitals)],
+        "Admin": [ADMIN],
+    }
+
+
+def search_text(db, username):
+    # A surname the hospital's staff would type: one of its own patients'
+    with db.read() as conn:
+        return conn.execute("SELECT p.last_name FROM users u JOIN hospitals h ON h.user_id = u.id JOIN hospital_patients m ON m.hospital_id = h.id JOIN patients p ON p.id = m.patient_id WHERE u.username = ? LIMIT 1", (username,)).fetchone()[0]
+
+
+def timed_run(at, action):
+    first = len(renders)
+    started = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    page_renders = renders[first:]
+    return {
+        "rerun_ms": elapsed * 1000,
+        "render_ms": sum(wall for wall, _, _, _ in page_renders) * 1000,
+        "statements": sum(statements for _, statements, _, _ in page_renders),
+        "rows": sum(rows for _, _, rows, _ in page_renders),
+        "peak_kb": max((peak for _, _, _, peak in page_renders if peak is not None), default=None),
+    }
+
+
+def visit(role, username, password, search):
+    from streamlit.testing.v1 import AppTest
+
+    steps = {}
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.run()
+    at.selectbox[0].select(role).run()
+    at.text_input[0].input(username)
+    at.text_input[1].input(password).run()
+    login = [button for button in at.button if button.label == "Login"][0]
+    steps["Login + Dashboard"] = (timed_run(at, lambda: login.click().run()), timed_run(at, at.run))
+    for page in PAGES[role]:
+        if page == "Medical History: search":
+            box = [text for text in at.text_input if text.key == "patient_search"][0]
+            cold = timed_run(at, lambda: box.input(search).run())
+        else:
+            cold = timed_run(at, lambda: at.sidebar.selectbox[0].select(page).run())
+        steps[page] = (cold, timed_run(at, at.run))
+    return steps
+
+
+def run_size(size, users):
+    directory = tempfile.mkdtemp(prefix=f"bench_pages_{size}_")
+    os.chdir(directory)
+    try:
+        db = ConnectionManager(DB_FILE)
+        apply_migrations(db)
+        started = time.perf_counter()
+        counts = synthetic.generate(db, BlobStore(blob_dir_for(DB_FILE)), **SIZES[size])
+        generated = time.perf_counter() - started
+        logins = accounts(size, users + 1)
+        searches = {username: search_text(db, username) for username, _ in logins["Hospital"]}
+        db.close()
+        capture_renders()
+        results = {}
+        for role, users_of_role in logins.items():
+            # The last account is the memory pass; the admin is the only one of its kind
+            timing, memory = (users_of_role[:-1], users_of_role[-1:]) if len(users_of_role) > 1 else (users_of_role, users_of_role)
+            for username, password in timing:
+                for page, (cold, warm) in visit(role, username, password, searches.get(username)).items():
+                    entry = results.setdefault(f"{role}: {page}", {"cold": [], "warm": [], "peak_kb": None})
+                    entry["cold"].append(cold)
+                    entry["warm"].append(warm)
+            tracemalloc.start()
+            for username, password in memory:
+                for page, (cold, _) in visit(role, username, password, searches.get(username)).items():
+                    results[f"{role}: {page}"]["peak_kb"] = cold["peak_kb"]
+            tracemalloc.stop()
+        return {"size": size, "counts": counts, "generate_s": generated, "db_mb": os.path.getsize(DB_FILE) / 2 ** 20, "pages": results}
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(directory)
+
+
+def summarize(entry):
+    cold = entry["cold"]
+    reruns = sorted(sample["rerun_ms"] for sample in cold)
+    return {
+        "cold_p50_ms": statistics.median(reruns),
+        "cold_p95_ms": reruns[min(len(reruns) - 1, int(len(reruns) * 0.95))],
+        "render_ms": statistics.median(sample["render_ms"] for sample in cold),
+        "statements": max(sample["statements"] for sample in cold),
+        "rows": statistics.median(sample["rows"] for sample in cold),
+        "warm_render_ms": statistics.median(sample["render_ms"] for sample in entry["warm"]),
+        "warm_statements": max(sample["statements"] for sample in entry["warm"]),
+        "peak_kb": entry["peak_kb"],
+    }
+
+
+def report(result):
+    counts = result["counts"]
+    print(f"\n== {result['size']}: {counts['hospitals']:,} hospitals, {counts['patients']:,} patients, {counts['appointments']:,} appointments, "
+          f"{counts['vital_signs']:,} vital signs, {counts['reports']:,} reports ({counts['report_bytes'] / 2 ** 20:,.0f} MB); "
+          f"generated in {result['generate_s']:.0f} s, database {result['db_mb']:,.0f} MB")
+    print(f"{'page':<36} {'cold p50':>9} {'p95':>9} {'render':>9} {'SQL':>5} {'rows':>7} {'warm':>8} {'SQL':>4} {'peak KB':>9}")
+    for page, summary in result["summary"].items():
+        print(f"{page:<36} {summary['cold_p50_ms']:7.1f}ms {summary['cold_p95_ms']:7.1f}ms {summary['render_ms']:7.1f}ms {summary['statements']:>5} {summary['rows']:>7,.0f} "
+              f"{summary['warm_render_ms']:6.1f}ms {summary['warm_statements']:>4} {summary['peak_kb']:>9,.0f}")
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for size, result in results.items():
+        for page, summary in result["summary"].items():
+            before = baseline.get(size, {}).get("summary", {}).get(page)
+            if before is None:
+                continue
+            if summary["statements"] > before["statements"]:
+                found.append(f"{size} / {page}: {before['statements']} -> {summary['statements']} SQL statements")
+            if summary["render_ms"] > max(before["render_ms"] * (1 + tolerance), before["render_ms"] + MIN_REGRESSION_MS):
+                found.append(f"{size} / {page}: cold page function {before['render_ms']:.1f} -> {summary['render_ms']:.1f} ms")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="small,medium", help=f"of {', '.join(SIZES)}; generating large takes about 15 minutes")
+    parser.add_argument("--users", type=int, default=3, help="users per role for timing")
+    parser.add_argument("--json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        # One size per process, so Streamlit's process-wide caches start empty
+        result = run_size(args.child, args.users)
+        result["summary"] = {page: summarize(entry) for page, entry in result.pop("pages").items()}
+        print(json.dumps(result))
+        sys.exit(0)
+    results = {}
+    for size in args.sizes.split(","):
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", size, "--users", str(args.users)], capture_output=True, text=True)
+        if child.returncode:
+            sys.exit(f"{size} failed:\n{child.stderr[-3000:]}")
+        results[size] = json.loads(child.stdout.strip().splitlines()[-1])
+        report(results[size])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
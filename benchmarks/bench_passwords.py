@@ -0,0 +1,103 @@
+"""Password hashing: calibrated scrypt on the Hasher pool vs the old unsalted SHA-256.
+
+    python benchmarks/bench_passwords.py [logins per session] [sessions,...] [workers,...]
+
+Reports the calibrated cost and time per hash, then logins/sec and login latency
+p50 / p95 with that many concurrent sessions each verifying one password at a
+time, for pool sizes `workers`. Also the first login of a legacy account (verify
+plus rehash), and how far a pure-Python thread gets while hashes run, which
+shows whether hashing holds the GIL (page scripts of other sessions would stall).
+"""
+import hashlib
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import passwords
+
+PASSWORD = "patient123"
+
+
+def sessions_run(verify, sessions, per_session):
+    latencies = []
+    lock = threading.Lock()
+
+    def session():
+        mine = []
+        for _ in range(per_session):
+            started = time.perf_counter()
+            verify()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return sessions * per_session / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def python_progress(seconds, during=None):
+    # Loop iterations a pure-Python thread completes in `seconds`, alone or alongside `during`
+    count = 0
+    stop = time.perf_counter() + seconds
+    worker = threading.Thread(target=during) if during else None
+    if worker:
+        worker.start()
+    while time.perf_counter() < stop:
+        count += 1
+    if worker:
+        worker.join()
+    return count
+
+
+if __name__ == "__main__":
+    per_session = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    session_counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 8, 32]
+    worker_counts = [int(n) for n in sys.argv[3].split(",")] if len(sys.argv) > 3 else sorted({1, passwords.WORKERS})
+    started = time.perf_counter()
+    cost = passwords.calibrate()
+    print(f"calibrated scrypt N=2^{cost[0].bit_length() - 1} r={cost[1]} p={cost[2]} in {time.perf_counter() - started:.2f} s on {os.cpu_count()} CPU(s)")
+    stored = passwords.hash_password(PASSWORD, cost)
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        passwords.check_password(PASSWORD, stored)
+        times.append(time.perf_counter() - started)
+    print(f"one hash: {statistics.median(times) * 1000:.1f} ms, {256 * cost[0] * cost[1] / 2 ** 20:.0f} MiB\n")
+
+    legacy = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    for sessions in session_counts:
+        rate, p50, p95 = sessions_run(lambda: passwords.check_password(PASSWORD, legacy), sessions, per_session * 100)
+        print(f"sha256 (before)   {sessions:>3} sessions               {rate:10,.0f} logins/s   p50 {p50 * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+        for workers in worker_counts:
+            hasher = passwords.Hasher(cost, workers=workers)
+            try:
+                rate, p50, p95 = sessions_run(lambda: hasher.verify(PASSWORD, stored), sessions, per_session)
+            finally:
+                hasher.close()
+            print(f"scrypt Hasher     {sessions:>3} sessions {workers:>2} workers    {rate:10,.1f} logins/s   p50 {p50 * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms")
+
+    hasher = passwords.Hasher(cost)
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        ok, upgraded = hasher.verify(PASSWORD, legacy)
+        times.append(time.perf_counter() - started)
+    assert ok and upgraded
+    print(f"\nfirst login of a legacy account (verify + rehash): {statistics.median(times) * 1000:.1f} ms")
+
+    seconds = 1.0
+    alone = python_progress(seconds)
+    during = python_progress(seconds, lambda: [hasher.verify(PASSWORD, stored) for _ in range(int(seconds / statistics.median(times) * 2) + 1)])
+    hasher.close()
+    print(f"pure-Python thread while hashing: {during / alone:.0%} of its progress alone")
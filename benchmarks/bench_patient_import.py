@@ -0,0 +1,69 @@
+"""Patient onboarding: one transaction per patient (the Patient Management form) vs patient_import.
+
+    python benchmarks/bench_patient_import.py [bulk rows] [single rows]
+
+Reports patients/sec for each path. The bulk input is a CSV in which every
+1000th row is invalid, so the per-row error path is included in the timing.
+"""
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import patient_import
+from db import ConnectionManager
+from migrations import apply_migrations
+
+HOSPITAL_ID = "HOS_BENCH"
+
+
+def make_csv(rows):
+    out = io.StringIO()
+    out.write("First Name,Last Name,Date of Birth,Gender,Phone,Email,Address,Blood Type,Allergies,Chronic Conditions\n")
+    for i in range(rows):
+        born = "1985-13-40" if i % 1000 == 999 else f"{1940 + i % 80}-{1 + i % 12:02d}-{1 + i % 28:02d}"
+        out.write(f"Given{i},Family{i % 5000},{born},{'MF'[i % 2]},555-{i % 10000:04d},p{i}@example.com,{i} Main St,{patient_import.BLOOD_TYPES[i % 8]},{'Penicillin' if i % 7 == 0 else ''},{'Asthma' if i % 11 == 0 else ''}\n")
+    return io.BytesIO(out.getvalue().encode())
+
+
+def single_row(db, records):
+    # The form path: four INSERTs and a commit per patient
+    password_hash = hashlib.sha256("patient123".encode()).hexdigest()
+    for _, r in records:
+        patient_id = f"PAT_{str(uuid.uuid4())[:8]}"
+        user_id = f"USR_PAT_{str(uuid.uuid4())[:8]}"
+        current_time = datetime.now().isoformat()
+        with db.write() as conn:
+            conn.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (user_id, f"{r['first_name'].lower()}.{r['last_name'].lower()}.{patient_id}", password_hash, "patient", f"{r['first_name']} {r['last_name']}", r["email"], current_time, current_time))
+            conn.execute('INSERT INTO patients (id, user_id, first_name, last_name, date_of_birth, gender, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_id, user_id, r["first_name"], r["last_name"], r["date_of_birth"], r["gender"], current_time, current_time))
+            conn.execute('INSERT INTO contact_info (patient_id, phone, email, address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)', (patient_id, r["phone"], r["email"], r["address"], current_time, current_time))
+            conn.execute('INSERT INTO medical_history (patient_id, hospital_id, blood_type, allergies, chronic_conditions, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)', (patient_id, HOSPITAL_ID, r["blood_type"], r["allergies"], r["chronic_conditions"], current_time, current_time))
+
+
+def report(name, count, elapsed, extra=""):
+    print(f"{name:<12} {count:>9,} patients {elapsed:8.2f} s {count / elapsed:>10,.0f} patients/s{extra}")
+
+
+if __name__ == "__main__":
+    bulk_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    single_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+
+        records = list(patient_import.read_csv(make_csv(single_rows)))
+        started = time.perf_counter()
+        single_row(db, records)
+        report("single-row", len(records), time.perf_counter() - started)
+
+        source = make_csv(bulk_rows)
+        started = time.perf_counter()
+        imported, errors = patient_import.import_patients(db, HOSPITAL_ID, patient_import.read_csv(source))
+        report("bulk", imported, time.perf_counter() - started, f"  ({len(errors):,} rows rejected)")
+        db.close()
@@ -0,0 +1,62 @@
+"""Cost of the profiling instrumentation per SQL statement.
+
+    python benchmarks/bench_profiling.py [statements]
+
+Runs the same mix of statements on a plain sqlite3 connection and on a
+ProfiledConnection, both outside a render (what the ingest server and imports
+pay) and inside one (what page renders pay): primary-key lookups fetched with
+fetchone, short range scans iterated row by row, and fetchall of a page of rows.
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling
+
+ROWS = 100_000
+
+
+def make_db(factory):
+    conn = sqlite3.connect(":memory:", isolation_level=None, factory=factory)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, patient_id INTEGER, value REAL)")
+    conn.execute("CREATE INDEX t_patient ON t (patient_id)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", ((i, i % 5000, i * 0.5) for i in range(ROWS)))
+    return conn
+
+
+def workload(conn, statements):
+    for i in range(statements // 3):
+        conn.execute("SELECT value FROM t WHERE id = ?", (i * 7 % ROWS,)).fetchone()
+        for row in conn.execute("SELECT id, value FROM t WHERE patient_id = ?", (i % 5000,)):
+            pass
+        conn.execute("SELECT id, patient_id, value FROM t WHERE id >= ? LIMIT 20", (i % ROWS,)).fetchall()
+
+
+def timed(name, conn, statements, profiler=None):
+    started = time.perf_counter()
+    if profiler is None:
+        workload(conn, statements)
+    else:
+        with profiler.render("bench"):
+            workload(conn, statements)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<32} {elapsed / statements * 1e6:7.2f} us/statement")
+    return elapsed
+
+
+if __name__ == "__main__":
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    plain = make_db(sqlite3.Connection)
+    profiled = make_db(profiling.ProfiledConnection)
+    workload(plain, 3000)
+    workload(profiled, 3000)
+    base = timed("plain connection", plain, statements)
+    idle = timed("profiled, outside a render", profiled, statements)
+    profiler = profiling.Profiler()
+    active = timed("profiled, inside a render", profiled, statements, profiler)
+    print(f"overhead: {(idle - base) / statements * 1e6:.2f} us/statement outside a render, {(active - base) / statements * 1e6:.2f} us inside")
+    page = profiler.summary()["pages"][0]
+    print(f"recorded {page['max_queries']:,} statements and {page['mean_rows']:,.0f} rows in the render")
@@ -0,0 +1,97 @@
+"""Rule evaluation over a hospital's patients with a few hundred rules.
+
+    python benchmarks/bench_rules.py [patients] [rules]
+
+Compares a keyword-by-keyword substring scan per rule (how the old if/elif
+chains worked, scaled up), RuleEngine.evaluate per patient, and
+RuleEngine.evaluate_frame over the whole set. All three must agree. Histories
+are drawn from a skewed vocabulary, so many patients share the same entries.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import rules
+
+CONDITIONS = [f"condition {i:03d}" for i in range(300)] + ["hypertension", "diabetes", "asthma"]
+ALLERGENS = [f"allergen {i:03d}" for i in range(100)] + ["penicillin", "pollen", "lisinopril"]
+
+
+def make_rules(count, rng):
+    specs = []
+    for i in range(count):
+        when = {"conditions": {"any": rng.sample(CONDITIONS, 2)}}
+        if i % 3 == 0:
+            when["allergies"] = {"none": rng.sample(ALLERGENS, 1)}
+        if i % 10 == 0:
+            when["blood_type"] = ["O-", "O+"]
+        specs.append({"id": f"rule-{i}", "kind": "treatment" if i % 2 else "tip", "priority": i, "text": f"rule {i}", "when": when})
+    return specs
+
+
+def skewed_sample(rng, population, k):
+    # A few conditions are common and most are rare, as in real registries
+    return list(dict.fromkeys(rng.choices(population, weights=[1 / (rank + 1) for rank in range(len(population))], k=k)))
+
+
+def make_patients(count, rng):
+    blood_types = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+    return pd.DataFrame({
+        "patient_id": [f"PAT_{i:06d}" for i in range(count)],
+        "blood_type": [rng.choice(blood_types) for _ in range(count)],
+        "allergies": [", ".join(skewed_sample(rng, ALLERGENS[::-1], rng.randrange(3))) or None for _ in range(count)],
+        "chronic_conditions": [", ".join(skewed_sample(rng, CONDITIONS[::-1], rng.randrange(4))) or None for _ in range(count)],
+        "surgeries": [None] * count,
+        "family_history": [None] * count,
+    })
+
+
+def naive(specs, record):
+    # Lower-cased substring tests, rule by rule, keyword by keyword
+    matched = []
+    for spec in specs:
+        ok = record["blood_type"] in spec["when"].get("blood_type", [record["blood_type"]])
+        for field, condition in spec["when"].items():
+            if field == "blood_type" or not ok:
+                continue
+            text = (record[rules.FIELDS[field]] or "").lower()
+            ok = (not condition.get("any") or any(k in text for k in condition["any"])) and not any(k in text for k in condition.get("none", []))
+        if ok:
+            matched.append(spec["id"])
+    return matched
+
+
+def timed(name, count, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {count:>8,} patients {elapsed:8.3f} s {count / elapsed:>12,.0f} patients/s")
+    return result
+
+
+if __name__ == "__main__":
+    patients = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rule_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(7)
+    specs = make_rules(rule_count, rng)
+    df = make_patients(patients, rng)
+    started = time.perf_counter()
+    engine = rules.RuleEngine(specs)
+    print(f"{rule_count} rules compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    sample = records[: max(1, patients // 50)]
+    by_order = {spec["id"]: position for position, spec in enumerate(sorted(specs, key=lambda s: (s["priority"], s["id"])))}
+
+    slow = timed("substring scan per rule", len(sample), lambda: [naive(specs, r) for r in sample])
+    single = timed("evaluate per patient", len(records), lambda: [[rule.id for rule in engine.evaluate(r)] for r in records])
+    frame = timed("evaluate_frame", len(records), lambda: engine.evaluate_frame(df))
+
+    assert single[: len(slow)] == [sorted(ids, key=by_order.get) for ids in slow]
+    grouped = frame.groupby("patient_id")["rule_id"].apply(list).to_dict()
+    assert all(sorted(grouped.get(r["patient_id"], []), key=by_order.get) == ids for r, ids in zip(records, single))
+    print(f"{len(frame):,} (patient, rule) matches")
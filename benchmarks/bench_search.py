@@ -0,0 +1,101 @@
+"""Patient search latency with a million patients.
+
+    python benchmarks/bench_search.py [patients] [hospitals] [searches]
+
+Imports patients through patient_import (so the search triggers run, and the
+import rate with them is reported), spread over `hospitals` hospitals, with
+names drawn from skewed first/last name lists. Then times search.search_patients
+for what staff type: the first letters of a surname, a full name, part of a
+patient ID or phone number, a condition, and a misspelt name. Also times the old
+approach, loading every patient of the hospital for the selectbox.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import patient_import
+import search
+from db import ConnectionManager
+from migrations import apply_migrations
+
+FIRST = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen"] + [f"Given{i:03d}" for i in range(480)]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin"] + [f"Family{i:04d}" for i in range(4980)]
+CONDITIONS = ["Hypertension", "Diabetes", "Asthma", "Arthritis", "Migraine", "", "", "", "", ""]
+ALLERGIES = ["Penicillin", "Pollen", "Peanuts", "Latex", "", "", "", "", "", ""]
+OLD_HOSPITAL_PATIENTS = "SELECT p.id, p.first_name, p.last_name FROM patients p JOIN hospital_patients h ON h.patient_id = p.id WHERE h.hospital_id = ?"
+
+
+def skewed(rng, names):
+    return names[min(int(rng.paretovariate(1.2)) - 1, len(names) - 1)] if rng.random() < 0.5 else rng.choice(names)
+
+
+def records(rng, count):
+    for i in range(count):
+        yield {
+            "first_name": skewed(rng, FIRST), "last_name": skewed(rng, LAST), "date_of_birth": "", "gender": "",
+            "phone": f"555-{rng.randrange(10000):04d}-{rng.randrange(10000):04d}", "email": f"p{i}@example.com", "address": f"{i} Main St",
+            "blood_type": "", "allergies": rng.choice(ALLERGIES), "chronic_conditions": rng.choice(CONDITIONS),
+        }
+
+
+def seed(db, patients, hospitals, rng):
+    started = time.perf_counter()
+    batch = 20_000
+    pending = records(rng, patients)
+    for first in range(0, patients, batch):
+        chunk = [next(pending) for _ in range(min(batch, patients - first))]
+        with db.write() as conn:
+            for h in range(hospitals):
+                part = chunk[h::hospitals]
+                if part:
+                    patient_import.insert_patients(conn, f"HOS_{h:04d}", part, password_hash="x")
+    elapsed = time.perf_counter() - started
+    print(f"imported {patients:,} patients into {hospitals} hospitals: {elapsed:.1f} s ({patients / elapsed:,.0f} patients/s, search index included)")
+
+
+def typo(rng, word):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def timed(name, conn, queries):
+    times, hits = [], 0
+    for hospital_id, text in queries:
+        started = time.perf_counter()
+        hits += len(search.search_patients(conn, hospital_id, text))
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    print(f"{name:<20} p50 {statistics.median(times):7.2f} ms   p95 {times[int(len(times) * 0.95)]:7.2f} ms   {hits / len(queries):5.1f} results/search")
+
+
+if __name__ == "__main__":
+    patients = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    hospitals = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    searches = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+        seed(db, patients, hospitals, rng)
+        with db.write() as conn:
+            conn.execute("ANALYZE")
+        with db.read() as conn:
+            sample = conn.execute("SELECT p.id, p.first_name, p.last_name, c.phone, h.hospital_id FROM patients p JOIN contact_info c ON c.patient_id = p.id JOIN hospital_patients h ON h.patient_id = p.id ORDER BY random() LIMIT ?", (searches,)).fetchall()
+            hospital = lambda row: row[4]
+            timed("surname prefix (3)", conn, [(hospital(r), r[2][:3]) for r in sample])
+            timed("surname prefix (5)", conn, [(hospital(r), r[2][:5]) for r in sample])
+            timed("full name", conn, [(hospital(r), f"{r[1]} {r[2]}") for r in sample])
+            timed("patient ID part", conn, [(hospital(r), r[0][4:10]) for r in sample])
+            timed("phone part", conn, [(hospital(r), r[3][-9:]) for r in sample])
+            timed("condition", conn, [(hospital(r), rng.choice(CONDITIONS[:5])) for r in sample])
+            timed("misspelt surname", conn, [(hospital(r), typo(rng, r[2])) for r in sample])
+            started = time.perf_counter()
+            for r in sample[:20]:
+                conn.execute(OLD_HOSPITAL_PATIENTS, (hospital(r),)).fetchall()
+            print(f"{'load all patients':<20} {(time.perf_counter() - started) / 20 * 1000:7.2f} ms per hospital (the old selectbox)")
+        db.close()
@@ -0,0 +1,106 @@
+"""Cold start and per-rerun fixed overhead of the Streamlit script.
+
+    python benchmarks/bench_startup.py [--runs 5] [--reruns 50]
+
+Each run is a fresh process on a freshly migrated demo database, as after a
+server restart. It reports
+  - import: `import streamlit` and AppTest, which the app cannot influence
+  - login page: the first script run, the app's own imports, resources and the
+    login page, and which heavy libraries (pandas, matplotlib, altair, PIL)
+    are loaded by then
+  - first page: logging in as patient1, i.e. the first render of the dashboard
+  - rerun overhead: a rerun of the About page (no SQL), minus the page
+    function itself: what every rerun of every page pays before and after
+    the page (script body, CSS, navigation, Streamlit's own work)
+Times are medians over runs; rerun overhead is the median over --reruns reruns.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "Healthrecords.py")
+HEAVY = ["pandas", "matplotlib", "altair", "PIL"]
+
+
+def child(reruns):
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = time.perf_counter() - started
+
+    sys.path.insert(0, ROOT)
+    import profiling
+
+    # Time spent inside page functions, to separate it from the rest of a rerun
+    page_seconds = []
+    render = profiling.Profiler.render
+
+    def timed(self, page):
+        context = render(self, page)
+
+        class Timed:
+            def __enter__(self):
+                self.started = time.perf_counter()
+                return context.__enter__()
+
+            def __exit__(self, *exc):
+                page_seconds.append(time.perf_counter() - self.started)
+                return context.__exit__(*exc)
+        return Timed()
+    profiling.Profiler.render = timed
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    login_page = time.perf_counter() - started
+    loaded = [name for name in HEAVY if name in sys.modules]
+    at.selectbox[0].select("Patient").run()
+    at.text_input[0].input("patient1")
+    at.text_input[1].input("patient123").run()
+    started = time.perf_counter()
+    [button for button in at.button if button.label == "Login"][0].click().run()
+    first_page = time.perf_counter() - started
+    at.sidebar.selectbox[0].select("About").run()
+    overheads = []
+    for _ in range(reruns):
+        del page_seconds[:]
+        started = time.perf_counter()
+        at.run()
+        overheads.append(time.perf_counter() - started - sum(page_seconds))
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return {"import_s": imported, "login_page_s": login_page, "loaded": loaded, "first_page_s": first_page, "rerun_overhead_ms": statistics.median(overheads) * 1000}
+
+
+def run(reruns):
+    directory = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--reruns", str(reruns)], cwd=directory, capture_output=True, text=True)
+        if result.returncode:
+            sys.exit(result.stderr[-3000:])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.reruns)))
+        sys.exit(0)
+    results = [run(args.reruns) for _ in range(args.runs)]
+    median = lambda key: statistics.median(result[key] for result in results)
+    print(f"import streamlit + AppTest {median('import_s') * 1000:8.0f} ms")
+    print(f"login page (cold)          {median('login_page_s') * 1000:8.0f} ms   loaded: {', '.join(results[0]['loaded']) or 'none of ' + ', '.join(HEAVY)}")
+    print(f"first page after login     {median('first_page_s') * 1000:8.0f} ms")
+    print(f"rerun overhead             {median('rerun_overhead_ms'):8.2f} ms")
@@ -0,0 +1,129 @@
+"""Load test for the vitals ingestion endpoint.
+
+    python benchmarks/bench_vitals_ingest.py [seconds] [clients] [readings per request]
+
+Starts vitals_ingest's HTTP server on a temporary database and has client
+processes (each standing in for a ward's bedside gateway) post batches as fast
+as they can. Reports readings/sec accepted and committed, 503 responses, request
+latency percentiles and the writer's commit count; then compares the per-reading
+cost of the old rollup trigger with the batch rollups on the same data.
+"""
+import http.client
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vitals_ingest
+from db import ConnectionManager
+from migrations import VITAL_ROLLUP_UPSERT, apply_migrations, vital_rollup_source
+
+BEDS_PER_CLIENT = 50
+
+
+def readings(client, start, count):
+    # One reading per bed every 5 seconds of simulated time
+    for i in range(start, start + count):
+        bed = i % BEDS_PER_CLIENT
+        yield {
+            "patient_id": f"PAT_{client:03d}_{bed:03d}", "hospital_id": f"HOS_{client:03d}",
+            "recorded_date": (datetime(2024, 1, 1) + timedelta(seconds=5 * (i // BEDS_PER_CLIENT))).isoformat(),
+            "temperature": 97.5 + (i % 20) / 10, "blood_pressure": f"{110 + i % 25}/{70 + i % 15}", "pulse": 60 + i % 40,
+            "respiratory_rate": 12 + i % 8, "oxygen_saturation": 94 + i % 6, "weight": 150 + bed, "height": 66,
+        }
+
+
+def client(port, client_id, seconds, batch, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    sent, busy, latencies, position = 0, 0, [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        body = json.dumps(list(readings(client_id, position, batch)))
+        started = time.perf_counter()
+        conn.request("POST", "/vitals", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.status == 503:
+            busy += 1
+            time.sleep(float(response.getheader("Retry-After", "1")) / 10)
+            continue
+        sent += batch
+        position += batch
+    results.put((sent, busy, latencies))
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] * 1000 if len(values) > 1 else 0.0
+
+
+def load_test(seconds, clients, batch):
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+        writer = vitals_ingest.VitalsWriter(db)
+        server = vitals_ingest.make_server(writer, port=0, require_token=False)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=client, args=(server.server_port, c, seconds, batch, results)) for c in range(clients)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        accepted_elapsed = time.perf_counter() - started
+        writer.flush()
+        committed_elapsed = time.perf_counter() - started
+        server.shutdown()
+        server.server_close()
+        stats = writer.snapshot()
+        writer.close()
+        with db.read() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM vital_signs").fetchone()[0]
+        db.close()
+    accepted = sum(o[0] for o in outcomes)
+    latencies = [l for o in outcomes for l in o[2]]
+    assert stored == accepted == stats["written"], (stored, accepted, stats)
+    print(f"{clients} clients x {batch} readings/request for {seconds} s")
+    print(f"  accepted   {accepted:>10,} readings {accepted / accepted_elapsed:>10,.0f} readings/s")
+    print(f"  committed  {stored:>10,} readings {stored / committed_elapsed:>10,.0f} readings/s in {stats['commits']:,} commits (avg {stored / max(stats['commits'], 1):,.0f} per commit)")
+    print(f"  503 responses {sum(o[1] for o in outcomes):,}; latency p50 {percentile(latencies, 50):.1f} ms  p95 {percentile(latencies, 95):.1f} ms  p99 {percentile(latencies, 99):.1f} ms")
+
+
+def rollup_cost(rows=100_000, batch=1_000):
+    """Same batches through the old per-row rollup trigger and through write_readings."""
+    items, _ = vitals_ingest.validate_batch(list(readings(0, 0, rows)))
+    for name in ("per-row trigger", "batch rollups"):
+        with tempfile.TemporaryDirectory() as directory:
+            db = ConnectionManager(os.path.join(directory, "bench.db"))
+            apply_migrations(db)
+            if name == "per-row trigger":
+                with db.write() as conn:
+                    conn.execute(f"CREATE TRIGGER vital_signs_rollup AFTER INSERT ON vital_signs BEGIN {VITAL_ROLLUP_UPSERT.format(source=vital_rollup_source('NEW'))} END")
+            started = time.perf_counter()
+            for i in range(0, rows, batch):
+                with db.write() as conn:
+                    if name == "per-row trigger":
+                        conn.executemany(vitals_ingest.INSERT_VITALS, [row for row, _ in items[i:i + batch]])
+                    else:
+                        vitals_ingest.write_readings(conn, items[i:i + batch])
+            elapsed = time.perf_counter() - started
+            db.close()
+        print(f"  {name:<16} {rows / elapsed:>10,.0f} readings/s")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    load_test(seconds, clients, batch)
+    print("rollup maintenance, 1,000-reading commits:")
+    rollup_cost()
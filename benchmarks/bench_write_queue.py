@@ -0,0 +1,89 @@
+"""Concurrent session writes: one transaction each (db.write) vs the group-committing WriteQueue.
+
+    python benchmarks/bench_write_queue.py [writes per session] [sessions,...]
+
+Each session thread books appointments one at a time, the way page callbacks do:
+insert the appointment (the dashboard counter triggers fire) and update the
+patient's last login. Reports writes/sec, per-write latency p50 / p95 and the
+number of commits, with synchronous=NORMAL (the app's setting, no fsync per
+commit in WAL mode) and synchronous=FULL (an fsync per commit).
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionManager, WriteQueue
+from migrations import apply_migrations
+
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, reason, created_at, updated_at) VALUES (?, ?, ?, 30, 'Scheduled', 'bench', ?, ?)"
+UPDATE_LOGIN = "UPDATE users SET last_login = ? WHERE id = ?"
+
+
+def book(conn, session, i):
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    conn.execute(INSERT_APPOINTMENT, (f"PAT_{session}", f"HOS_{session % 5}", f"2030-01-01T{i % 24:02d}:00:00", now, now))
+    conn.execute(UPDATE_LOGIN, (now, f"USR_{session}"))
+
+
+def direct(db):
+    def write(session, i):
+        with db.write() as conn:
+            book(conn, session, i)
+    return write, lambda: None
+
+
+def queued(db):
+    writes = WriteQueue(db)
+
+    def write(session, i):
+        writes.submit(book, session, i).result()
+    return write, writes.close
+
+
+def run(name, make, sessions, per_session, synchronous):
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "bench.db"))
+        apply_migrations(db)
+        db._writer.execute(f"PRAGMA synchronous = {synchronous}")
+        write, close = make(db)
+        latencies = []
+        lock = threading.Lock()
+
+        def session(number):
+            mine = []
+            for i in range(per_session):
+                started = time.perf_counter()
+                write(number, i)
+                mine.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(mine)
+
+        generation = db.generation
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        close()
+        commits = db.generation - generation
+        db.close()
+    latencies.sort()
+    total = sessions * per_session
+    print(f"{synchronous:<6} {name:<12} {sessions:>3} sessions  {total / elapsed:8,.0f} writes/s   p50 {statistics.median(latencies) * 1000:6.2f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.2f} ms   {commits:,} commits")
+
+
+if __name__ == "__main__":
+    per_session = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    session_counts = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 8, 32]
+    for synchronous in ("NORMAL", "FULL"):
+        for sessions in session_counts:
+            run("db.write", direct, sessions, per_session, synchronous)
+            run("WriteQueue", queued, sessions, per_session, synchronous)
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_dir_for(db_file):
+    # Report files live next to the database they belong to
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "blobs")
+
+
+class BlobStore:
+    """Content-addressed file store: each blob is saved once under its SHA-256.
+
+    Identical uploads (the same report attached to several patients or sent by
+    several hospitals) share one file on disk. Writes go to a temporary file and
+    are renamed into place, so readers never see a partial blob.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._tmp = os.path.join(root, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put_chunks(self, chunks):
+        """Store an iterable of byte chunks; returns (digest, size)."""
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return digest, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_stream(self, stream, chunk_size=CHUNK_SIZE):
+        return self.put_chunks(iter(lambda: stream.read(chunk_size), b""))
+
+    def open(self, digest):
+        return open(self.path(digest), "rb")
+
+    def iter_chunks(self, digest, chunk_size=CHUNK_SIZE):
+        with self.open(digest) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
@@ -0,0 +1,279 @@
+import argparse
+import ipaddress
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Change feed for downstream systems (lab, billing, insurance).
+#
+# Triggers (migration 15) append one change_log entry per inserted, updated or
+# deleted row of the clinical tables: seq, table, primary key, operation (for
+# users, only updates of the profile columns, migration 19). A
+# consumer keeps the seq of the last change it processed as its cursor and asks
+# for the next N; fetch_changes() returns them oldest first together with each
+# row's current columns (None once it is deleted), read in one query per table.
+# Rows moved out of the live tables by archive.py come as operation 'archive':
+# gone from the database, but not deleted.
+# seq increases in commit order (SQLite has one writer), so a consumer that
+# resumes from its cursor never misses a change.
+#
+# The feed carries every patient's records, so requests need an admin bearer
+# token, checked as api.py checks them (python api.py --issue-token <admin>).
+# Only a server bound to loopback may be started without (--no-auth).
+#
+# The log is kept small by compact():
+#   - an entry followed by a later one for the same row is dropped: the later
+#     entry returns the same current row, so no consumer loses anything;
+#   - entries older than RETENTION are dropped and change_log_state.pruned_through
+#     advanced; a cursor below it raises CursorExpired (HTTP 410), and that
+#     consumer has to re-export everything once and resume from latest_cursor().
+# Both run in small batches, each its own write transaction.
+
+DEFAULT_LIMIT = 1_000
+MAX_LIMIT = 10_000
+RETENTION = timedelta(days=30)
+COMPACT_BATCH = 10_000
+COMPACT_INTERVAL = 3_600
+# Fetched in chunks: SQLite limits the number of bound parameters
+ROW_CHUNK = 500
+
+# Columns returned per table; credentials are never part of the feed
+COLUMNS = {
+    "users": ["id", "username", "role", "name", "email", "created_at", "updated_at"],
+    "patients": ["id", "user_id", "first_name", "last_name", "date_of_birth", "gender", "created_at", "updated_at"],
+    "medical_history": ["id", "patient_id", "hospital_id", "blood_type", "allergies", "chronic_conditions", "surgeries", "family_history", "uploaded_at", "updated_at"],
+    "vital_signs": ["id", "patient_id", "hospital_id", "recorded_date", "temperature", "blood_pressure", "pulse", "respiratory_rate", "oxygen_saturation", "weight", "height", "bmi", "recorded_by", "notes", "created_at", "updated_at"],
+    "appointments": ["id", "patient_id", "hospital_id", "appointment_date", "duration", "status", "reason", "notes", "created_at", "updated_at"],
+    "reports": ["id", "patient_id", "hospital_id", "file_name", "content_hash", "file_size", "upload_date", "created_at", "updated_at"],
+}
+
+CHANGES_AFTER = "SELECT seq, table_name, row_key, operation, changed_at FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?"
+# Never below pruned_through, which is all that is left once every entry is pruned
+LATEST_SEQ = "SELECT max(coalesce((SELECT max(seq) FROM change_log), 0), (SELECT pruned_through FROM change_log_state WHERE id = 1))"
+FEED_STATE = "SELECT pruned_through, compacted_through FROM change_log_state WHERE id = 1"
+# Earlier entries of the rows changed in a seq range
+SUPERSEDED = """
+    DELETE FROM change_log WHERE seq IN (
+        SELECT earlier.seq FROM change_log AS recent
+        JOIN change_log AS earlier INDEXED BY idx_change_log_row
+          ON earlier.table_name = recent.table_name AND earlier.row_key = recent.row_key AND earlier.seq < recent.seq
+        WHERE recent.seq > ? AND recent.seq <= ?)
+"""
+SET_COMPACTED = "UPDATE change_log_state SET compacted_through = ? WHERE id = 1"
+# The first entry young enough to keep. Walks the log from its oldest entry, so
+# it reads about as many rows as are pruned (not in the plan check)
+FIRST_RETAINED = "SELECT seq FROM change_log WHERE changed_at >= ? ORDER BY seq LIMIT 1"
+# pruned_through advances to the last entry actually removed, not to the boundary:
+# entries below it that compaction already dropped were superseded, not lost
+PRUNE = "DELETE FROM change_log WHERE seq IN (SELECT seq FROM change_log WHERE seq < ? ORDER BY seq LIMIT ?) RETURNING seq"
+SET_PRUNED = "UPDATE change_log_state SET pruned_through = max(pruned_through, ?) WHERE id = 1"
+
+
+class CursorExpired(Exception):
+    """Changes after the cursor have been pruned; the consumer must resynchronize."""
+
+
+def _rows_query(table, count):
+    return f"SELECT {', '.join(COLUMNS[table])} FROM {table} WHERE id IN ({', '.join('?' * count)})"
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    statements = {"CHANGE_FEED_" + name: sql for name, sql in (("CHANGES_AFTER", CHANGES_AFTER), ("SUPERSEDED", SUPERSEDED), ("PRUNE", PRUNE))}
+    statements.update({f"CHANGE_FEED_ROWS_{table.upper()}": _rows_query(table, 1) for table in COLUMNS})
+    return statements
+
+
+def latest_cursor(conn):
+    """Cursor for a consumer that has just exported everything."""
+    return conn.execute(LATEST_SEQ).fetchone()[0]
+
+
+def fetch_changes(conn, after=0, limit=DEFAULT_LIMIT):
+    """Up to `limit` changes with seq > after, oldest first; returns (changes, next cursor).
+
+    The log and the rows are read in one read transaction, so they are one snapshot:
+    a row is as of its latest entry returned, or None if deleted by then.
+    """
+    began = not conn.in_transaction
+    if began:
+        conn.execute("BEGIN")
+    try:
+        return _fetch_changes(conn, after, limit)
+    finally:
+        if began:
+            conn.execute("COMMIT")
+
+
+def _fetch_changes(conn, after, limit):
+    pruned_through, _ = conn.execute(FEED_STATE).fetchone()
+    if after < pruned_through:
+        raise CursorExpired(f"changes up to {pruned_through} have been pruned; cursor {after} is too old")
+    entries = conn.execute(CHANGES_AFTER, (after, max(1, min(limit, MAX_LIMIT)))).fetchall()
+    keys = {}
+    for _, table, key, operation, _ in entries:
+        if operation != "delete":
+            keys.setdefault(table, set()).add(key)
+    rows = {}
+    for table, table_keys in keys.items():
+        table_keys = list(table_keys)
+        for start in range(0, len(table_keys), ROW_CHUNK):
+            chunk = table_keys[start:start + ROW_CHUNK]
+            for row in conn.execute(_rows_query(table, len(chunk)), chunk):
+                rows[table, row[0]] = dict(zip(COLUMNS[table], row))
+    changes = [{"seq": seq, "table": table, "key": key, "operation": operation, "changed_at": changed_at, "row": rows.get((table, key))}
+               for seq, table, key, operation, changed_at in entries]
+    return changes, (entries[-1][0] if entries else after)
+
+
+def compact(db, retention=RETENTION, batch=COMPACT_BATCH, now=None):
+    """Drop superseded entries and entries older than `retention`; returns (superseded, pruned)."""
+    superseded = pruned = 0
+    with db.read() as conn:
+        _, compacted_through = conn.execute(FEED_STATE).fetchone()
+        latest = latest_cursor(conn)
+    for start in range(compacted_through, latest, batch):
+        end = min(start + batch, latest)
+        with db.write() as conn:
+            superseded += conn.execute(SUPERSEDED, (start, end)).rowcount
+            conn.execute(SET_COMPACTED, (end,))
+    cutoff = ((now or datetime.now()) - retention).isoformat()
+    with db.read() as conn:
+        row = conn.execute(FIRST_RETAINED, (cutoff,)).fetchone()
+    # Everything is older than the cutoff: prune through the latest entry
+    boundary = row[0] if row else latest + 1
+    while True:
+        with db.write() as conn:
+            deleted = [seq for seq, in conn.execute(PRUNE, (boundary, batch))]
+            if deleted:
+                conn.execute(SET_PRUNED, (max(deleted),))
+        pruned += len(deleted)
+        if len(deleted) < batch:
+            return superseded, pruned
+
+
+class ChangeFeedHandler(BaseHTTPRequestHandler):
+    """GET /changes?after=<cursor>&limit=<n>; GET /changes/latest for a fresh consumer's cursor."""
+
+    protocol_version = "HTTP/1.1"
+    db = None  # set by make_server
+    require_token = True
+
+    def _reply(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self):
+        if not self.require_token:
+            return True
+        from api import ApiError, authenticate  # api imports COLUMNS from here
+
+        try:
+            with self.db.read() as conn:
+                role = authenticate(conn, self.headers)[0]
+        except ApiError as e:
+            self._reply(e.status, {"error": str(e)}, e.headers)
+            return False
+        except sqlite3.Error as e:
+            self._reply(500, {"error": str(e)})
+            return False
+        if role != "admin":
+            self._reply(403, {"error": "the change feed needs an admin token"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/changes/latest":
+            with self.db.read() as conn:
+                return self._reply(200, {"cursor": latest_cursor(conn)})
+        if url.path != "/changes":
+            return self._reply(404, {"error": "not found"})
+        try:
+            after = int(query.get("after", ["0"])[0])
+            limit = int(query.get("limit", [str(DEFAULT_LIMIT)])[0])
+        except ValueError:
+            return self._reply(400, {"error": "after and limit must be integers"})
+        try:
+            with self.db.read() as conn:
+                changes, cursor = fetch_changes(conn, after, limit)
+        except CursorExpired as e:
+            return self._reply(410, {"error": str(e)})
+        except sqlite3.Error as e:
+            return self._reply(500, {"error": str(e)})
+        self._reply(200, {"changes": changes, "cursor": cursor, "more": len(changes) == max(1, min(limit, MAX_LIMIT))})
+
+    def log_message(self, format, *args):
+        # Consumers poll continuously; per-request access logs would swamp the console
+        pass
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_server(db, host="127.0.0.1", port=8766, require_token=True):
+    if not require_token and not is_loopback(host):
+        raise ValueError(f"refusing to serve the change feed on {host} without tokens")
+    handler = type("BoundChangeFeedHandler", (ChangeFeedHandler,), {"db": db, "require_token": require_token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def compact_periodically(db, stop, interval=COMPACT_INTERVAL):
+    while not stop.wait(interval):
+        compact(db)
+
+
+if __name__ == "__main__":
+    # python changefeed.py [--db data/trackmyhealth.db] [--port 8766]
+    # python changefeed.py --compact: compact once and exit, e.g. from cron
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Change feed for downstream systems")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--no-auth", action="store_true", help="serve without bearer tokens (loopback hosts only)")
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    if args.compact:
+        superseded, pruned = compact(db)
+        print(f"Removed {superseded:,} superseded and {pruned:,} expired entries")
+        db.close()
+        raise SystemExit
+    try:
+        server = make_server(db, args.host, args.port, require_token=not args.no_auth)
+    except ValueError as e:
+        db.close()
+        raise SystemExit(str(e))
+    stop = threading.Event()
+    threading.Thread(target=compact_periodically, args=(db, stop), daemon=True).start()
+    print(f"Serving changes on http://{args.host}:{args.port}/changes")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        db.close()
@@ -0,0 +1,163 @@
+from datetime import date
+
+import pandas as pd
+
+import queries
+import vitals
+
+# Typed DataFrames straight from SQL for the views. Rows are pulled from the
+# cursor in chunks and converted column by column, timestamps are parsed
+# vectorized, and numeric columns keep numeric dtypes instead of pre-formatted
+# strings.
+
+APPOINTMENT_DTYPES = {"ID": "Int64", "Duration (min)": "Int64", "Status": "string", "Reason": "string"}
+# Rows fetched per chunk; only one chunk of Python tuples is alive at a time
+CHUNK_ROWS = 50_000
+
+
+def _typed(df, dates):
+    for column in dates:
+        df[column] = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+    return df
+
+
+def read_frame(conn, sql, params=(), dates=(), dtypes=None):
+    chunks = [_typed(chunk, dates) for chunk in pd.read_sql_query(sql, conn, params=list(params), dtype=dtypes, chunksize=CHUNK_ROWS)]
+    if len(chunks) == 1:
+        return chunks[0]
+    if chunks:
+        return pd.concat(chunks, ignore_index=True)
+    return _typed(pd.read_sql_query(sql, conn, params=list(params), dtype=dtypes), dates)
+
+
+def _split_timestamp(df, column):
+    # Display columns for a parsed timestamp, computed per column rather than per row
+    position = df.columns.get_loc(column)
+    df.insert(position, "Time", df[column].dt.strftime("%H:%M"))
+    df.insert(position, "Date", df[column].dt.date)
+    return df.drop(columns=[column])
+
+
+def upcoming_appointments(conn, patient_id):
+    df = read_frame(conn, queries.PATIENT_UPCOMING_APPOINTMENTS, (patient_id,), dates=["appointment_date"])
+    df.columns = ["ID", "Hospital", "appointment_date", "Duration (min)", "Status", "Reason"]
+    return _split_timestamp(df.astype(APPOINTMENT_DTYPES), "appointment_date")
+
+
+# Appointment history on the medical history pages: the patient's appointments
+# from the start of the chosen range, newest first, archived ones (archive.py)
+# included once the range reaches an archived month.
+HISTORY_LIMIT = 200
+# Names of the hospitals on a history page, looked up together
+HOSPITAL_NAMES = "SELECT id, name FROM hospitals WHERE id IN ({})"
+
+
+def appointment_history_query(patient_id, hospital_id=None, start=None, limit=HISTORY_LIMIT):
+    clauses, params = ["a.patient_id = ?"], [patient_id]
+    if hospital_id is not None:
+        clauses.append("a.hospital_id = ?")
+        params.append(hospital_id)
+    if start is not None:
+        clauses.append("a.appointment_date >= ?")
+        params.append(start.isoformat())
+    sql = f"SELECT a.id, a.hospital_id, a.appointment_date, a.duration, a.status, a.reason FROM appointments a WHERE {' AND '.join(clauses)} ORDER BY a.appointment_date DESC, a.id DESC LIMIT ?"
+    return sql, params + [limit]
+
+
+def appointment_history(conn, archive, patient_id, hospital_id=None, start=None, limit=HISTORY_LIMIT):
+    df = read_frame(conn, *appointment_history_query(patient_id, hospital_id, start, limit))
+    archived = archive.table(conn, "appointments", list(df.columns), patient_id, hospital_id, start) if archive is not None else None
+    if archived is not None and archived.num_rows:
+        df = pd.concat([df, archived.to_pandas()], ignore_index=True).sort_values(["appointment_date", "id"], ascending=False).head(limit)
+    hospitals = df["hospital_id"].dropna().unique().tolist()
+    names = dict(conn.execute(HOSPITAL_NAMES.format(", ".join("?" * len(hospitals))), hospitals)) if hospitals else {}
+    df["hospital_id"] = df["hospital_id"].map(lambda hospital: names.get(hospital, hospital))
+    df = _typed(df.reset_index(drop=True), ["appointment_date"])
+    df.columns = ["ID", "Hospital", "appointment_date", "Duration (min)", "Status", "Reason"]
+    return _split_timestamp(df.astype(APPOINTMENT_DTYPES), "appointment_date")
+
+
+# Hospital appointment list: keyset pagination on (appointment_date, id) with
+# server-side filters, so each page costs the same however long the history is.
+PAGE_SIZE = 25
+
+
+def appointment_filters(hospital_id, date_from=None, date_to=None, status=None, patient_id=None):
+    """WHERE clauses and params for a hospital's appointments; date_to is exclusive."""
+    clauses, params = ["a.hospital_id = ?"], [hospital_id]
+    if date_from is not None:
+        clauses.append("a.appointment_date >= ?")
+        params.append(date_from.isoformat())
+    if date_to is not None:
+        clauses.append("a.appointment_date < ?")
+        params.append(date_to.isoformat())
+    if status:
+        clauses.append("a.status = ?")
+        params.append(status)
+    if patient_id:
+        clauses.append("a.patient_id = ?")
+        params.append(patient_id)
+    return clauses, params
+
+
+def appointments_page_query(filters, after=None, limit=PAGE_SIZE):
+    clauses, params = list(filters[0]), list(filters[1])
+    if after is not None:
+        clauses.append("(a.appointment_date, a.id) > (?, ?)")
+        params.extend(after)
+    sql = f"SELECT a.id, p.first_name, p.last_name, a.appointment_date, a.appointment_date AS cursor_date, a.duration, a.status, a.reason FROM appointments a JOIN patients p ON a.patient_id = p.id WHERE {' AND '.join(clauses)} ORDER BY a.appointment_date, a.id LIMIT ?"
+    return sql, params + [limit]
+
+
+def appointment_count_query(filters):
+    return f"SELECT COUNT(*) FROM appointments a WHERE {' AND '.join(filters[0])}", list(filters[1])
+
+
+def appointments_page(conn, filters, after=None, limit=PAGE_SIZE):
+    """Return (page DataFrame, cursor for the next page or None)."""
+    sql, params = appointments_page_query(filters, after, limit + 1)
+    df = read_frame(conn, sql, params, dates=["appointment_date"])
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        next_cursor = (df["cursor_date"].iloc[-1], int(df["id"].iloc[-1]))
+    df = df.drop(columns=["cursor_date"])
+    df.insert(1, "Patient", df.pop("first_name") + " " + df.pop("last_name"))
+    df.columns = ["ID", "Patient", "appointment_date", "Duration (min)", "Status", "Reason"]
+    return _split_timestamp(df.astype(APPOINTMENT_DTYPES), "appointment_date"), next_cursor
+
+
+def count_appointments(conn, filters):
+    return conn.execute(*appointment_count_query(filters)).fetchone()[0]
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    day = date(2000, 1, 1)
+    variants = {
+        "ALL": appointment_filters("H"),
+        "DATES": appointment_filters("H", day, day),
+        "STATUS": appointment_filters("H", day, day, "Scheduled"),
+        "PATIENT": appointment_filters("H", day, day, None, "P"),
+    }
+    statements = {}
+    for name, filters in variants.items():
+        statements[f"APPOINTMENTS_PAGE_{name}"] = appointments_page_query(filters, after=("", 0))[0]
+        statements[f"APPOINTMENTS_COUNT_{name}"] = appointment_count_query(filters)[0]
+    statements["APPOINTMENT_HISTORY_PATIENT"] = appointment_history_query("P", start=day)[0]
+    statements["APPOINTMENT_HISTORY_PATIENT_HOSPITAL"] = appointment_history_query("P", "H", day)[0]
+    statements["APPOINTMENT_HISTORY_HOSPITAL_NAMES"] = HOSPITAL_NAMES.format("?, ?")
+    return statements
+
+
+def patient_reports(conn, patient_id, hospital_id):
+    df = read_frame(conn, queries.PATIENT_HOSPITAL_REPORTS, (patient_id, hospital_id), dates=["upload_date"], dtypes={"file_size": "Int64"})
+    df["upload_date"] = df["upload_date"].dt.date
+    return df.rename(columns={"file_name": "File Name", "upload_date": "Upload Date", "file_size": "Size (bytes)"})
+
+
+def vital_signs(conn, patient_id, hospital_id=None, start=None, end=None):
+    """Raw readings with numeric systolic/diastolic columns, indexed by recorded_date."""
+    sql, params = vitals.raw_series_query(patient_id, hospital_id, start, end, list(vitals.RAW_COLUMNS))
+    df = read_frame(conn, sql, params, dates=["recorded_date"], dtypes={m: "float64" for m in vitals.RAW_COLUMNS})
+    return df.set_index("recorded_date")
@@ -0,0 +1,250 @@
+import os
+import queue
+import sqlite3
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while the
+# writer holds its lock; synchronous=NORMAL is durable across application crashes
+# in WAL mode and avoids an fsync per commit.
+BUSY_TIMEOUT_MS = 5000
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",        # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",      # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+# WriteQueue: jobs per group commit, retries when another process holds the
+# write lock past the busy timeout, and how many commits the latency figures cover
+MAX_GROUP = 256
+LOCK_RETRIES = 3
+LATENCY_WINDOW = 1000
+
+
+class ConnectionManager:
+    """Process-wide SQLite access: a pool of read-only connections plus one writer.
+
+    Connections are opened once and reused across Streamlit reruns and sessions.
+    Reads borrow a connection from the pool, writes are serialized through the
+    single writer connection, so readers never queue behind a write lock.
+
+    `generation` counts committed write transactions that changed rows, so
+    in-process caches can tell whether anything was written since they loaded.
+    `factory` is the sqlite3.Connection subclass to open, e.g. an instrumented one.
+    """
+
+    def __init__(self, db_file, pool_size=8, factory=sqlite3.Connection):
+        self.db_file = db_file
+        self.pool_size = pool_size
+        self.factory = factory
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._created_lock = threading.Lock()
+        self.generation = 0
+
+    def _connect(self, read_only=False):
+        # Connections are shared between Streamlit's script threads, but each is
+        # only ever used by one thread at a time (pool checkout / writer lock).
+        conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, isolation_level=None, factory=self.factory)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._created_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return self._connect(read_only=True)
+        return self._readers.get()
+
+    @contextmanager
+    def read(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            # End any implicit read transaction so the next borrower sees fresh data
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            changes = conn.total_changes
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                # Bumped after the commit: a reader that loads in between is
+                # tagged with the old generation and simply reloads next time
+                if conn.total_changes != changes:
+                    self.generation += 1
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    """The write queue did not get to a job in time; it was withdrawn unrun, so nothing was written."""
+
+
+class WriteQueue:
+    """One writer thread that runs queued mutations in group commits.
+
+    submit(fn, *args) queues fn(conn, *args) and returns a Future. The writer
+    takes everything queued meanwhile (up to max_group jobs) into one write
+    transaction, each job in its own savepoint: a job that raises is rolled back
+    alone and its Future gets the exception, the others commit together. Futures
+    resolve only after the commit, so a result means the change is in the
+    database. If the write lock cannot be taken, the group is retried before any
+    job has run; a failed commit fails every job in the group. A job whose Future
+    is cancelled before the writer takes it is dropped unrun.
+    """
+
+    def __init__(self, db, max_group=MAX_GROUP):
+        self.db = db
+        self.max_group = max_group
+        self._pending = deque()  # (future, fn, args, submitted at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._in_flight = 0
+        self._commit_seconds = deque(maxlen=LATENCY_WINDOW)
+        self._wait_seconds = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {"submitted": 0, "committed": 0, "failed": 0, "commits": 0, "grouped": 0, "largest_group": 0, "lock_retries": 0, "cancelled": 0, "last_error": None}
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write queue is closed")
+            self._pending.append((future, fn, args, time.perf_counter()))
+            self.stats["submitted"] += 1
+            self._cond.notify_all()
+        return future
+
+    def call(self, fn, *args, timeout=None):
+        """submit() and wait for the result; WriteTimeout if the job has not started within `timeout` seconds.
+
+        A job that has started is always waited for: it may be about to commit,
+        and reporting it as failed would invite a duplicate.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            if not future.cancel():
+                return future.result()
+        raise WriteTimeout(f"the database was busy for {timeout:g} s; nothing was saved, please try again")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                taken = [self._pending.popleft() for _ in range(min(self.max_group, len(self._pending)))]
+                # Marks each Future running, so it can no longer be cancelled
+                group = [job for job in taken if job[0].set_running_or_notify_cancel()]
+                self.stats["cancelled"] += len(taken) - len(group)
+                if not group:
+                    self._cond.notify_all()
+                    continue
+                self._in_flight = len(group)
+            started = time.perf_counter()
+            outcomes, error = self._commit(group)
+            finished = time.perf_counter()
+            if error is not None:
+                outcomes = [(False, error)] * len(group)
+            with self._cond:
+                self._in_flight = 0
+                self.stats["largest_group"] = max(self.stats["largest_group"], len(group))
+                if error is None:
+                    self.stats["commits"] += 1
+                    self.stats["grouped"] += len(group)
+                    self._commit_seconds.append(finished - started)
+                for (_, _, _, submitted), (ok, value) in zip(group, outcomes):
+                    self.stats["committed" if ok else "failed"] += 1
+                    if not ok:
+                        self.stats["last_error"] = f"{type(value).__name__}: {value}"
+                    self._wait_seconds.append(finished - submitted)
+                self._cond.notify_all()
+            for (future, _, _, _), (ok, value) in zip(group, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit(self, group):
+        # Returns ([(ok, result or exception)] per job, None), or (None, error) if the transaction failed
+        for attempt in range(LOCK_RETRIES + 1):
+            outcomes = []
+            try:
+                with self.db.write() as conn:
+                    for _, fn, args, _ in group:
+                        conn.execute("SAVEPOINT job")
+                        try:
+                            outcomes.append((True, fn(conn, *args)))
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO job")
+                            outcomes.append((False, e))
+                        conn.execute("RELEASE job")
+                return outcomes, None
+            except sqlite3.OperationalError as e:
+                # Only BEGIN IMMEDIATE can be locked out; no job has run yet then
+                if outcomes or "locked" not in str(e) or attempt == LOCK_RETRIES:
+                    return None, e
+                with self._cond:
+                    self.stats["lock_retries"] += 1
+            except sqlite3.Error as e:
+                return None, e
+
+    def snapshot(self):
+        """Counters plus queue depth and commit / end-to-end latency percentiles (ms)."""
+        with self._cond:
+            commits = sorted(self._commit_seconds)
+            waits = sorted(self._wait_seconds)
+            snapshot = dict(self.stats, pending=len(self._pending) + self._in_flight)
+        for name, samples in (("commit", commits), ("wait", waits)):
+            snapshot[f"{name}_p50_ms"] = statistics.median(samples) * 1000 if samples else None
+            snapshot[f"{name}_p95_ms"] = samples[int(len(samples) * 0.95)] * 1000 if samples else None
+        snapshot["jobs_per_commit"] = snapshot["grouped"] / snapshot["commits"] if snapshot["commits"] else None
+        return snapshot
+
+    def close(self):
+        """Stop accepting jobs, finish the queued ones and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
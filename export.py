@@ -0,0 +1,352 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+from datetime import datetime
+
+from archive import TABLES as ARCHIVED_TABLES
+from appointments import CANCELLED, CHECKED_IN, COMPLETED, NO_SHOW, SCHEDULED
+from changefeed import COLUMNS
+
+# Bulk export of one hospital's records, for audits and for hospitals leaving.
+#
+# export_hospital() writes a gzip-compressed tar archive to a file object as it
+# goes, so memory stays flat however large the hospital is:
+#   - each table is read through one cursor, CHUNK_ROWS rows at a time, and each
+#     chunk becomes its own archive member (patients/part-00001.csv, ...) whose
+#     size is known once it is rendered; nothing is spooled to disk
+#   - report files are copied from the blob store CHUNK_SIZE bytes at a time,
+#     next to the part that lists them
+#   - manifest.json, written last, lists every part and the row counts
+# Members are written directly (header, data, padding) rather than through
+# tarfile.TarFile, which keeps the TarInfo of every member it has written.
+#
+# Everything is read in one read transaction, so the archive is a consistent
+# snapshot while the hospital keeps working (in WAL mode, checkpoints cannot
+# pass the snapshot until the export finishes). Given the row archive, vital
+# signs and appointments moved there (archive.py) follow the live rows; its
+# parts are looked up in the same transaction, so no row is missed or repeated.
+#
+# Formats: csv and jsonl hold the columns as stored, without credentials or file
+# contents; fhir maps the rows to FHIR R4 resources, one collection Bundle per part.
+
+FORMATS = {"csv": "csv", "jsonl": "jsonl", "fhir": "json"}
+CHUNK_ROWS = 5_000
+CHUNK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+HOSPITAL_COLUMNS = ["id", "name", "address", "phone", "email", "status", "capacity", "slot_minutes", "created_at", "updated_at"]
+
+
+def _select(table, alias, source, where):
+    return f"SELECT {', '.join(f'{alias}.{c}' for c in COLUMNS[table])} FROM {source} WHERE {where}"
+
+
+# table -> (columns, SELECT of the hospital's rows, with one ? per hospital id), in
+# export order. The lookups name their indexes, as in migration 13: statistics
+# gathered on a small database must not turn them into scans. Patients are
+# those the hospital may look up (hospital_patients) plus any it recorded
+# vitals or reports for.
+TABLES = {
+    "hospitals": (HOSPITAL_COLUMNS, f"SELECT {', '.join(HOSPITAL_COLUMNS)} FROM hospitals WHERE id = ?"),
+    "patients": (COLUMNS["patients"], _select("patients", "p", "patients AS p", """p.id IN (
+        SELECT patient_id FROM hospital_patients WHERE hospital_id = ?
+        UNION SELECT patient_id FROM vital_signs INDEXED BY idx_vital_signs_hospital WHERE hospital_id = ?
+        UNION SELECT patient_id FROM reports INDEXED BY idx_reports_hospital WHERE hospital_id = ?)""")),
+    "medical_history": (COLUMNS["medical_history"], _select("medical_history", "m", "medical_history AS m INDEXED BY idx_medical_history_hospital", "m.hospital_id = ?")),
+    "vital_signs": (COLUMNS["vital_signs"], _select("vital_signs", "v", "vital_signs AS v INDEXED BY idx_vital_signs_hospital", "v.hospital_id = ?")),
+    "appointments": (COLUMNS["appointments"], _select("appointments", "a", "appointments AS a INDEXED BY idx_appointments_hospital_date", "a.hospital_id = ?")),
+    "reports": (COLUMNS["reports"], _select("reports", "r", "reports AS r INDEXED BY idx_reports_hospital", "r.hospital_id = ?")),
+}
+
+
+def plan_queries():
+    """The export statements, for the query-plan check in queries.py."""
+    return {f"EXPORT_{name.upper()}": sql for name, (_, sql) in TABLES.items()}
+
+
+def report_path(row):
+    # Prefixed with the report id: file names repeat across patients
+    name = os.path.basename((row["file_name"] or "").replace("\\", "/")) or "report"
+    return f"reports/files/{row['id']}-{name}"
+
+
+# FHIR R4 mapping
+
+LOINC = "http://loinc.org"
+UCUM = "http://unitsofmeasure.org"
+VITALS_PANEL = ("85353-1", "Vital signs, weight, height, head circumference, oxygen saturation and BMI panel")
+# vital_signs column -> (LOINC code, display, UCUM unit)
+VITAL_CODES = {
+    "temperature": ("8310-5", "Body temperature", "[degF]"),
+    "pulse": ("8867-4", "Heart rate", "/min"),
+    "respiratory_rate": ("9279-1", "Respiratory rate", "/min"),
+    "oxygen_saturation": ("59408-5", "Oxygen saturation in Arterial blood by Pulse oximetry", "%"),
+    "weight": ("29463-7", "Body weight", "[lb_av]"),
+    "height": ("8302-2", "Body height", "[in_i]"),
+    "bmi": ("39156-5", "Body mass index (BMI) [Ratio]", "kg/m2"),
+}
+BLOOD_PRESSURE = (("8480-6", "Systolic blood pressure"), ("8462-4", "Diastolic blood pressure"))
+BLOOD_TYPE = ("882-1", "ABO and Rh group [Type] in Blood")
+APPOINTMENT_STATUS = {SCHEDULED: "booked", CHECKED_IN: "checked-in", COMPLETED: "fulfilled", CANCELLED: "cancelled", NO_SHOW: "noshow"}
+
+
+def _fhir_id(value):
+    # FHIR ids allow letters, digits, "-" and "."
+    return str(value).replace("_", "-")
+
+
+def _reference(kind, value):
+    return {"reference": f"{kind}/{_fhir_id(value)}"} if value else None
+
+
+def _code(code, display):
+    return {"coding": [{"system": LOINC, "code": code, "display": display}]}
+
+
+def _quantity(value, unit):
+    return {"value": value, "unit": unit, "system": UCUM, "code": unit}
+
+
+def _items(text):
+    return [item.strip() for item in (text or "").split(",") if item.strip()]
+
+
+def _clean(resource):
+    return {key: value for key, value in resource.items() if value not in (None, "", [])}
+
+
+def _organization(row):
+    telecom = [{"system": "phone", "value": row["phone"]}] if row["phone"] else []
+    telecom += [{"system": "email", "value": row["email"]}] if row["email"] else []
+    return [_clean({"resourceType": "Organization", "id": _fhir_id(row["id"]), "active": row["status"] == "approved", "name": row["name"],
+                    "telecom": telecom, "address": [{"text": row["address"]}] if row["address"] else []})]
+
+
+def _patient(row):
+    gender = (row["gender"] or "").lower()
+    return [_clean({"resourceType": "Patient", "id": _fhir_id(row["id"]), "name": [{"family": row["last_name"], "given": [row["first_name"]]}],
+                    "gender": gender if gender in ("male", "female", "other") else "unknown", "birthDate": row["date_of_birth"]})]
+
+
+def _history(row):
+    subject, prefix, recorded = _reference("Patient", row["patient_id"]), f"history-{row['id']}", row["uploaded_at"]
+    resources = []
+    if row["blood_type"]:
+        resources.append(_clean({"resourceType": "Observation", "id": f"{prefix}-blood-type", "status": "final", "code": _code(*BLOOD_TYPE),
+                                 "subject": subject, "effectiveDateTime": recorded, "valueString": row["blood_type"]}))
+    for n, allergy in enumerate(_items(row["allergies"])):
+        resources.append(_clean({"resourceType": "AllergyIntolerance", "id": f"{prefix}-allergy-{n}", "patient": subject, "code": {"text": allergy}, "recordedDate": recorded}))
+    for n, condition in enumerate(_items(row["chronic_conditions"])):
+        resources.append(_clean({"resourceType": "Condition", "id": f"{prefix}-condition-{n}", "subject": subject, "code": {"text": condition},
+                                 "category": [{"text": "problem-list-item"}], "recordedDate": recorded}))
+    for n, surgery in enumerate(_items(row["surgeries"])):
+        resources.append(_clean({"resourceType": "Procedure", "id": f"{prefix}-procedure-{n}", "status": "completed", "subject": subject, "code": {"text": surgery}}))
+    if row["family_history"]:
+        resources.append(_clean({"resourceType": "FamilyMemberHistory", "id": f"{prefix}-family", "status": "completed", "patient": subject,
+                                 "relationship": {"text": "unspecified"}, "note": [{"text": row["family_history"]}]}))
+    return resources
+
+
+# Codings repeat in every vitals row; built once, shared by every resource
+_VITAL_CODINGS = {column: (_code(code, display), unit) for column, (code, display, unit) in VITAL_CODES.items()}
+_BLOOD_PRESSURE_CODINGS = [_code(code, display) for code, display in BLOOD_PRESSURE]
+_VITALS_PANEL_CODING = _code(*VITALS_PANEL)
+_VITAL_SIGNS_CATEGORY = [{"coding": [{"system": "http://terminology.hl7.org/CodeSystem/observation-category", "code": "vital-signs"}]}]
+
+
+def _blood_pressure(value):
+    # (systolic, diastolic) from "120/80"; legacy values like "120/" or free text
+    # give no components rather than stopping the export halfway through the tar
+    systolic, slash, diastolic = (value or "").partition("/")
+    try:
+        return (float(systolic), float(diastolic)) if slash else ()
+    except ValueError:
+        return ()
+
+
+def _vitals(row):
+    components = [{"code": coding, "valueQuantity": _quantity(row[column], unit)} for column, (coding, unit) in _VITAL_CODINGS.items() if row[column] is not None]
+    for coding, value in zip(_BLOOD_PRESSURE_CODINGS, _blood_pressure(row["blood_pressure"])):
+        components.append({"code": coding, "valueQuantity": _quantity(value, "mm[Hg]")})
+    return [_clean({"resourceType": "Observation", "id": f"vitals-{row['id']}", "status": "final", "category": _VITAL_SIGNS_CATEGORY,
+                    "code": _VITALS_PANEL_CODING, "subject": _reference("Patient", row["patient_id"]), "effectiveDateTime": row["recorded_date"],
+                    "component": components, "note": [{"text": row["notes"]}] if row["notes"] else []})]
+
+
+def _appointment(row):
+    return [_clean({"resourceType": "Appointment", "id": f"appointment-{row['id']}", "status": APPOINTMENT_STATUS.get(row["status"], "proposed"),
+                    "start": row["appointment_date"], "minutesDuration": row["duration"], "description": row["reason"], "comment": row["notes"],
+                    "participant": [{"actor": _reference("Patient", row["patient_id"]), "status": "accepted"}]})]
+
+
+def _document(row):
+    attachment = _clean({"url": report_path(row), "title": row["file_name"], "size": row["file_size"], "creation": row["upload_date"]})
+    return [_clean({"resourceType": "DocumentReference", "id": f"report-{row['id']}", "status": "current", "subject": _reference("Patient", row["patient_id"]),
+                    "custodian": _reference("Organization", row["hospital_id"]), "date": row["upload_date"],
+                    "identifier": [{"system": "urn:ietf:params:hash:sha-256", "value": row["content_hash"]}] if row["content_hash"] else [],
+                    "content": [{"attachment": attachment}]})]
+
+
+FHIR = {"hospitals": _organization, "patients": _patient, "medical_history": _history, "vital_signs": _vitals, "appointments": _appointment, "reports": _document}
+
+
+def render(fmt, table, columns, rows, exported_at):
+    """One part: `rows` (tuples in `columns` order) as bytes in the given format."""
+    if fmt == "csv":
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return text.getvalue().encode()
+    records = [dict(zip(columns, row)) for row in rows]
+    if fmt == "jsonl":
+        return "".join(json.dumps(record) + "\n" for record in records).encode()
+    entries = [{"fullUrl": f"urn:trackmyhealth:{resource['resourceType']}/{resource['id']}", "resource": resource}
+               for record in records for resource in FHIR[table](record)]
+    return json.dumps({"resourceType": "Bundle", "type": "collection", "timestamp": exported_at, "entry": entries}).encode()
+
+
+class TarStream:
+    """Writes tar members one after another; nothing is kept per member."""
+
+    def __init__(self, out, mtime):
+        self.out = out
+        self.mtime = mtime
+        self.written = 0
+
+    def _write(self, data):
+        self.out.write(data)
+        self.written += len(data)
+
+    def _header(self, name, size):
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = size, self.mtime, 0o644
+        self._write(info.tobuf(tarfile.PAX_FORMAT))
+
+    def add(self, name, data):
+        self.add_chunks(name, len(data), [data])
+
+    def add_chunks(self, name, size, chunks):
+        self._header(name, size)
+        written = 0
+        for chunk in chunks:
+            self._write(chunk)
+            written += len(chunk)
+        if written != size:
+            raise ValueError(f"{name}: expected {size} bytes, read {written}")
+        self._write(b"\0" * (-size % tarfile.BLOCKSIZE))
+
+    def close(self):
+        # End-of-archive marker, then padding to a whole record as tar itself writes
+        self._write(b"\0" * (2 * tarfile.BLOCKSIZE))
+        self._write(b"\0" * (-self.written % tarfile.RECORDSIZE))
+
+
+def export_hospital(db, blob_store, hospital_id, out, fmt="jsonl", files=True, level=COMPRESS_LEVEL, progress=None, row_archive=None):
+    """Write a .tar.gz of the hospital's records to the binary file `out`; returns the manifest.
+
+    `files=False` leaves out the report files (their metadata is still exported).
+    `row_archive`, an archive.Archive, adds the archived rows of the hospital.
+    `progress`, if given, is called with (table, rows exported so far) after each part.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    started = time.perf_counter()
+    exported_at = datetime.now().isoformat(timespec="seconds")
+    manifest = {"hospital_id": hospital_id, "format": fmt, "exported_at": exported_at, "tables": {},
+                "report_files": 0, "report_bytes": 0, "missing_report_files": 0}
+    with db.read() as conn, gzip.GzipFile(fileobj=out, mode="wb", compresslevel=level, mtime=0) as compressed:
+        # One snapshot for every table; db.read() ends it
+        conn.execute("BEGIN")
+        if conn.execute("SELECT 1 FROM hospitals WHERE id = ?", (hospital_id,)).fetchone() is None:
+            raise ValueError(f"no hospital {hospital_id!r}")
+        archive = TarStream(compressed, int(time.time()))
+        for table, (columns, sql) in TABLES.items():
+            entry = manifest["tables"][table] = {"rows": 0, "parts": []}
+            for rows in _chunks(conn, table, columns, sql, hospital_id, row_archive):
+                part = f"{table}/part-{len(entry['parts']) + 1:05d}.{FORMATS[fmt]}"
+                archive.add(part, render(fmt, table, columns, rows, exported_at))
+                entry["parts"].append(part)
+                entry["rows"] += len(rows)
+                if table == "reports" and files:
+                    _add_report_files(archive, blob_store, columns, rows, manifest)
+                if progress:
+                    progress(table, entry["rows"])
+        manifest["seconds"] = round(time.perf_counter() - started, 3)
+        archive.add("manifest.json", json.dumps(manifest, indent=1).encode())
+        archive.close()
+    return manifest
+
+
+def _chunks(conn, table, columns, sql, hospital_id, row_archive):
+    cursor = conn.execute(sql, (hospital_id,) * sql.count("?"))
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        yield rows
+    if row_archive is not None and table in ARCHIVED_TABLES:
+        yield from row_archive.chunks(conn, table, columns, CHUNK_ROWS, hospital_id)
+
+
+def _add_report_files(archive, blob_store, columns, rows, manifest):
+    for row in rows:
+        row = dict(zip(columns, row))
+        try:
+            size = os.path.getsize(blob_store.path(row["content_hash"])) if row["content_hash"] else None
+        except FileNotFoundError:
+            size = None
+        if size is None:
+            manifest["missing_report_files"] += 1
+            continue
+        archive.add_chunks(report_path(row), size, blob_store.iter_chunks(row["content_hash"], CHUNK_SIZE))
+        manifest["report_files"] += 1
+        manifest["report_bytes"] += size
+
+
+if __name__ == "__main__":
+    # python export.py HOSPITAL_ID [--format jsonl|csv|fhir] [--out FILE | --out -]
+    from archive import Archive, archive_dir_for
+    from blobstore import BlobStore, blob_dir_for
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Export a hospital's records to a .tar.gz archive")
+    parser.add_argument("hospital_id")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--format", choices=list(FORMATS), default="jsonl")
+    parser.add_argument("--out", help="archive path, or - for stdout (default: HOSPITAL-TIMESTAMP.FORMAT.tar.gz)")
+    parser.add_argument("--level", type=int, default=COMPRESS_LEVEL, help="gzip level, 1 (fastest) to 9")
+    parser.add_argument("--no-files", action="store_true", help="leave out report files")
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    store = BlobStore(blob_dir_for(args.db))
+    row_archive = Archive(archive_dir_for(args.db))
+    log = lambda table, rows: print(f"\r{table}: {rows:,} rows", end="", file=sys.stderr)
+    try:
+        if args.out == "-":
+            manifest = export_hospital(db, store, args.hospital_id, sys.stdout.buffer, args.format, not args.no_files, args.level, log, row_archive)
+        else:
+            path = args.out or f"{args.hospital_id}-{datetime.now():%Y%m%d-%H%M%S}.{args.format}.tar.gz"
+            # Written under a temporary name, so an interrupted export is never mistaken for a complete one
+            try:
+                with open(path + ".partial", "wb") as f:
+                    manifest = export_hospital(db, store, args.hospital_id, f, args.format, not args.no_files, args.level, log, row_archive)
+            except BaseException:
+                os.remove(path + ".partial")
+                raise
+            os.replace(path + ".partial", path)
+            print(f"\nWrote {path}", file=sys.stderr)
+        rows = sum(entry["rows"] for entry in manifest["tables"].values())
+        print(f"{rows:,} rows, {manifest['report_files']:,} report files in {manifest['seconds']:.1f} s", file=sys.stderr)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
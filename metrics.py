@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from appointments import CANCELLED, COMPLETED, NO_SHOW, SCHEDULED
+
+# Dashboard figures.
+#
+# Appointment counts come from the counters that triggers on appointments keep
+# current (migration 12): totals per hospital and per patient by status, and per
+# hospital, day and status. Every figure is a handful of primary-key reads,
+# however long the appointment history is.
+#
+# The health score combines the patient's latest vital signs with attendance:
+#   80 points x the share of measured vitals inside NORMAL_RANGES, plus
+#   20 points x completed / (completed + no-shows), or the full 20 with no history.
+# Patients without any vital signs have no score.
+
+OWNER_COUNTS = "SELECT status, n FROM appointment_counts WHERE scope = ? AND owner_id = ?"
+HOSPITAL_DAY_COUNTS = "SELECT status, SUM(n) FROM hospital_day_counts WHERE hospital_id = ? AND day >= ? AND day <= ? GROUP BY status"
+LATEST_VITALS = "SELECT temperature, blood_pressure, pulse, respiratory_rate, oxygen_saturation, bmi FROM vital_signs WHERE patient_id = ? ORDER BY recorded_date DESC LIMIT 1"
+
+# Adult resting ranges; temperature in °F
+NORMAL_RANGES = {
+    "temperature": (97.0, 99.5),
+    "systolic": (90, 129),
+    "diastolic": (60, 84),
+    "pulse": (60, 100),
+    "respiratory_rate": (12, 20),
+    "oxygen_saturation": (95.0, 100.0),
+    "bmi": (18.5, 24.9),
+}
+VITALS_WEIGHT = 80
+ATTENDANCE_WEIGHT = 20
+
+
+def owner_counts(conn, scope, owner_id):
+    """{status: appointments} for a hospital or patient ("hospital" / "patient")."""
+    return {status: n for status, n in conn.execute(OWNER_COUNTS, (scope, owner_id))}
+
+
+def day_counts(conn, hospital_id, first, last):
+    """{status: appointments} of a hospital dated between two days, inclusive."""
+    return {status: n for status, n in conn.execute(HOSPITAL_DAY_COUNTS, (hospital_id, first.isoformat(), last.isoformat()))}
+
+
+def hospital_metrics(conn, hospital_id, today=None):
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    todays = day_counts(conn, hospital_id, today, today)
+    week = day_counts(conn, hospital_id, week_start, week_start + timedelta(days=6))
+    return {
+        "scheduled": owner_counts(conn, "hospital", hospital_id).get(SCHEDULED, 0),
+        # Everyone booked for today who has not cancelled, whether seen yet or not
+        "today": sum(n for status, n in todays.items() if status != CANCELLED),
+        "completed_week": week.get(COMPLETED, 0),
+        "no_shows_week": week.get(NO_SHOW, 0),
+    }
+
+
+def _blood_pressure(value):
+    try:
+        systolic, diastolic = str(value).split("/")
+        return float(systolic), float(diastolic)
+    except ValueError:
+        return None, None
+
+
+def health_score(vitals, completed, no_shows):
+    """0-100 from a latest-vitals dict and attendance counts; None without vitals."""
+    measured = {name: value for name, value in vitals.items() if name in NORMAL_RANGES and value is not None}
+    if not measured:
+        return None
+    in_range = sum(low <= measured[name] <= high for name, (low, high) in NORMAL_RANGES.items() if name in measured)
+    attended = completed / (completed + no_shows) if completed + no_shows else 1.0
+    return round(VITALS_WEIGHT * in_range / len(measured) + ATTENDANCE_WEIGHT * attended)
+
+
+def patient_metrics(conn, patient_id):
+    counts = owner_counts(conn, "patient", patient_id)
+    row = conn.execute(LATEST_VITALS, (patient_id,)).fetchone()
+    score = None
+    if row:
+        temperature, blood_pressure, pulse, respiratory_rate, oxygen_saturation, bmi = row
+        systolic, diastolic = _blood_pressure(blood_pressure) if blood_pressure else (None, None)
+        latest = {"temperature": temperature, "systolic": systolic, "diastolic": diastolic, "pulse": pulse, "respiratory_rate": respiratory_rate, "oxygen_saturation": oxygen_saturation, "bmi": bmi}
+        score = health_score(latest, counts.get(COMPLETED, 0), counts.get(NO_SHOW, 0))
+    return {"scheduled": counts.get(SCHEDULED, 0), "completed": counts.get(COMPLETED, 0), "no_shows": counts.get(NO_SHOW, 0), "health_score": score}
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    return {"METRICS_OWNER_COUNTS": OWNER_COUNTS, "METRICS_HOSPITAL_DAY_COUNTS": HOSPITAL_DAY_COUNTS, "METRICS_LATEST_VITALS": LATEST_VITALS}
@@ -0,0 +1,668 @@
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+
+from blobstore import CHUNK_SIZE, BlobStore, blob_dir_for
+
+# Versioned schema migrations.
+#
+# Each step runs exactly once per database, in its own write transaction, and is
+# recorded in schema_version. Steps must stay cheap on large databases: prefer
+# ALTER TABLE ... ADD COLUMN (a metadata-only change in SQLite), new tables and
+# CREATE INDEX over rewriting existing tables. A step that fills existing rows is
+# a Backfill: the runner commits it batch by batch, so the app's writers wait for
+# one batch at a time rather than the whole table, and the WAL can be
+# checkpointed between batches. Its watermark in migration_progress commits with
+# each batch, so an interrupted backfill resumes where it stopped; the version is
+# recorded with the last batch.
+# Never edit a step that has shipped; append a new one instead.
+
+BACKFILL_BATCH = 10_000
+
+PROGRESS = "SELECT done_through, last_rowid FROM migration_progress WHERE version = ?"
+INSERT_PROGRESS = "INSERT INTO migration_progress (version, done_through, last_rowid) VALUES (?, 0, ?)"
+UPDATE_PROGRESS = "UPDATE migration_progress SET done_through = ? WHERE version = ?"
+DELETE_PROGRESS = "DELETE FROM migration_progress WHERE version = ?"
+RECORD_VERSION = "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)"
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def add_column(conn, table, column, declaration):
+    # Databases created before migrations existed may already have the column
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+class Backfill:
+    """A step that fills existing rows of `table` in rowid batches, each its own write transaction.
+
+    prepare(conn) runs first, in a transaction of its own, e.g. to create the table
+    or trigger the backfill feeds; fill(conn, after, through) then handles the rows
+    with after < rowid <= through. Only rows present when prepare() ran are
+    backfilled: rows written later are the schema's (or the app's) to maintain.
+    """
+
+    def __init__(self, table, prepare, fill, batch=BACKFILL_BATCH):
+        self.table = table
+        self.prepare = prepare
+        self.fill = fill
+        self.batch = batch
+
+    def batch_end(self, conn, after, last_rowid):
+        return conn.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {self.table} WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?)",
+                            (after, last_rowid, self.batch)).fetchone()[0]
+
+
+# 1: base tables (CREATE IF NOT EXISTS so pre-migration databases are adopted as-is)
+def create_base_schema(conn):
+    # Users table (for patients, hospitals, admin)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('patient', 'hospital', 'admin')),
+        name TEXT,
+        email TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Patients table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS patients (
+        id TEXT PRIMARY KEY,
+        user_id TEXT UNIQUE REFERENCES users(id),
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        date_of_birth DATE,
+        gender TEXT,
+        profile_image TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Hospitals table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hospitals (
+        id TEXT PRIMARY KEY,
+        user_id TEXT UNIQUE REFERENCES users(id),
+        name TEXT NOT NULL,
+        address TEXT NOT NULL,
+        phone TEXT,
+        status TEXT CHECK(status IN ('pending', 'approved', 'rejected')) DEFAULT 'pending',
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Contact information
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS contact_info (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT REFERENCES patients(id),
+        phone TEXT,
+        email TEXT,
+        address TEXT,
+        emergency_contact_name TEXT,
+        emergency_contact_phone TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Medical history
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS medical_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT REFERENCES patients(id),
+        hospital_id TEXT REFERENCES hospitals(id),
+        blood_type TEXT,
+        allergies TEXT,
+        chronic_conditions TEXT,
+        surgeries TEXT,
+        family_history TEXT,
+        uploaded_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Vital signs
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS vital_signs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT REFERENCES patients(id),
+        hospital_id TEXT REFERENCES hospitals(id),
+        recorded_date TIMESTAMP,
+        temperature REAL,
+        blood_pressure TEXT,
+        pulse INTEGER,
+        respiratory_rate INTEGER,
+        oxygen_saturation REAL,
+        weight REAL,
+        height REAL,
+        bmi REAL,
+        recorded_by TEXT,
+        notes TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Appointments
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT REFERENCES patients(id),
+        hospital_id TEXT REFERENCES hospitals(id),
+        appointment_date TIMESTAMP,
+        duration INTEGER,
+        status TEXT,
+        reason TEXT,
+        notes TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+    # Uploaded reports
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT REFERENCES patients(id),
+        hospital_id TEXT REFERENCES hospitals(id),
+        file_name TEXT,
+        file_content BLOB,
+        upload_date TIMESTAMP,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+
+
+# 2: update_last_login writes users.last_login
+def add_users_last_login(conn):
+    add_column(conn, "users", "last_login", "TIMESTAMP")
+
+
+# 3: hospital_approvals lists hospitals.email; backfill it from the hospital's user account
+def add_hospitals_email(conn):
+    add_column(conn, "hospitals", "email", "TEXT")
+    conn.execute("UPDATE hospitals SET email = (SELECT u.email FROM users u WHERE u.id = hospitals.user_id) WHERE email IS NULL")
+
+
+# 4: demo accounts for a fresh database
+def seed_demo_data(conn):
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] != 0:
+        return
+    current_time = datetime.now().isoformat()
+    # Demo admin
+    admin_user_id = f"USR_ADM_{str(uuid.uuid4())[:8]}"
+    conn.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (admin_user_id, "admin", hashlib.sha256("admin123".encode()).hexdigest(), "admin", "Admin User", "admin@trackmyhealth.com", current_time, current_time))
+
+    # Demo patient
+    patient_user_id = f"USR_PAT_{str(uuid.uuid4())[:8]}"
+    patient_id = f"PAT_{str(uuid.uuid4())[:8]}"
+    conn.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_user_id, "patient1", hashlib.sha256("patient123".encode()).hexdigest(), "patient", "John Doe", "john@example.com", current_time, current_time))
+    conn.execute('INSERT INTO patients (id, user_id, first_name, last_name, date_of_birth, gender, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_id, patient_user_id, "John", "Doe", "1980-05-15", "Male", current_time, current_time))
+    conn.execute('INSERT INTO contact_info (patient_id, phone, email, address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)', (patient_id, "5551234567", "john.doe@example.com", "123 Main St", current_time, current_time))
+    conn.execute('INSERT INTO medical_history (patient_id, hospital_id, blood_type, allergies, chronic_conditions, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)', (patient_id, None, "A+", "Pollen", "Hypertension", current_time, current_time))
+
+    # Demo hospital
+    hospital_user_id = f"USR_HOS_{str(uuid.uuid4())[:8]}"
+    hospital_id = f"HOS_{str(uuid.uuid4())[:8]}"
+    conn.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (hospital_user_id, "hospital1", hashlib.sha256("hospital123".encode()).hexdigest(), "hospital", "City Hospital", "contact@cityhospital.com", current_time, current_time))
+    conn.execute('INSERT INTO hospitals (id, user_id, name, address, phone, email, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (hospital_id, hospital_user_id, "City Hospital", "456 Health Ave", "5559876543", "contact@cityhospital.com", "approved", current_time, current_time))
+
+    # Demo appointment
+    conn.execute('INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, reason, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_id, hospital_id, (datetime.now() + timedelta(days=1)).isoformat(), 30, "Scheduled", "Check-up", current_time, current_time))
+
+
+# 5: secondary indexes for the filters every page runs (see queries.py). The
+# hospitals status index covers the booking form's approved-hospital list, which
+# matches most rows. ANALYZE only records the average rows per status value, so
+# a partial index over pending rows tells the planner how few of them there are.
+def create_hot_query_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient_status ON appointments(patient_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient_date ON appointments(patient_id, appointment_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_hospital_status ON appointments(hospital_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_hospital_date ON appointments(hospital_id, appointment_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vital_signs_patient_date ON vital_signs(patient_id, recorded_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vital_signs_patient_hospital_date ON vital_signs(patient_id, hospital_id, recorded_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medical_history_patient_hospital ON medical_history(patient_id, hospital_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_patient_hospital ON reports(patient_id, hospital_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_contact_info_patient ON contact_info(patient_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hospitals_status ON hospitals(status, id, name, address, phone)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hospitals_pending ON hospitals(created_at) WHERE status = 'pending'")
+    conn.execute("ANALYZE")
+
+
+# 6: report contents move to the content-addressed blob store; rows keep metadata and the hash.
+# Each BLOB is streamed out with incremental blob I/O, so large reports are never
+# held in memory. The emptied pages are reused by SQLite (or reclaimed by VACUUM).
+def move_report_blobs(conn):
+    add_column(conn, "reports", "content_hash", "TEXT")
+    add_column(conn, "reports", "file_size", "INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_content_hash ON reports(content_hash)")
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    store = BlobStore(blob_dir_for(db_file))
+    report_ids = [row[0] for row in conn.execute("SELECT id FROM reports WHERE file_content IS NOT NULL")]
+    for report_id in report_ids:
+        digest, size = store.put_chunks(_report_content_chunks(conn, report_id))
+        conn.execute("UPDATE reports SET content_hash = ?, file_size = ?, file_content = NULL WHERE id = ?", (digest, size, report_id))
+
+
+def _report_content_chunks(conn, report_id):
+    kind = conn.execute("SELECT typeof(file_content) FROM reports WHERE id = ?", (report_id,)).fetchone()[0]
+    if kind != "blob":
+        # Text written by older code; small enough to read directly
+        yield conn.execute("SELECT CAST(file_content AS BLOB) FROM reports WHERE id = ?", (report_id,)).fetchone()[0]
+        return
+    with conn.blobopen("reports", "file_content", report_id, readonly=True) as blob:
+        for chunk in iter(lambda: blob.read(CHUNK_SIZE), b""):
+            yield chunk
+
+
+# 7: hourly and daily vital-sign rollups (count/sum/min/max per metric), maintained
+# by an insert trigger so trend charts never read raw rows for long ranges. Vitals
+# are append-only, so rollups are not adjusted on UPDATE/DELETE; rows removed from
+# vital_signs keep contributing to the history. hospital_id is stored as '' when
+# unknown so it can be part of the key.
+def vital_rollup_source(row):
+    # One output row per (resolution, metric) for the vital_signs row named by `row`
+    bp = f"{row}.blood_pressure"
+    return f"""
+    SELECT {row}.patient_id AS patient_id, r.resolution,
+        CASE r.resolution WHEN 'hour' THEN strftime('%Y-%m-%dT%H:00:00', {row}.recorded_date) ELSE date({row}.recorded_date) END AS bucket,
+        COALESCE({row}.hospital_id, '') AS hospital_id, m.metric,
+        CASE m.metric
+            WHEN 'temperature' THEN {row}.temperature
+            WHEN 'systolic' THEN CASE WHEN instr({bp}, '/') > 1 THEN CAST(substr({bp}, 1, instr({bp}, '/') - 1) AS REAL) END
+            WHEN 'diastolic' THEN CASE WHEN instr({bp}, '/') > 1 THEN CAST(substr({bp}, instr({bp}, '/') + 1) AS REAL) END
+            WHEN 'pulse' THEN {row}.pulse
+            WHEN 'respiratory_rate' THEN {row}.respiratory_rate
+            WHEN 'oxygen_saturation' THEN {row}.oxygen_saturation
+            WHEN 'weight' THEN {row}.weight
+            WHEN 'bmi' THEN {row}.bmi
+        END AS value
+    FROM {"vital_signs v, " if row == "v" else ""}(SELECT 'hour' AS resolution UNION ALL SELECT 'day') r,
+        (SELECT 'temperature' AS metric UNION ALL SELECT 'systolic' UNION ALL SELECT 'diastolic' UNION ALL SELECT 'pulse'
+         UNION ALL SELECT 'respiratory_rate' UNION ALL SELECT 'oxygen_saturation' UNION ALL SELECT 'weight' UNION ALL SELECT 'bmi') m
+    {"WHERE v.id > ? AND v.id <= ?" if row == "v" else ""}
+    """
+
+
+VITAL_ROLLUP_UPSERT = """
+    INSERT INTO vital_rollups (patient_id, resolution, bucket, hospital_id, metric, n, total, min_value, max_value)
+    SELECT patient_id, resolution, bucket, hospital_id, metric, 1, value, value, value FROM ({source})
+    WHERE value IS NOT NULL AND bucket IS NOT NULL
+    ON CONFLICT (patient_id, resolution, bucket, hospital_id, metric) DO UPDATE SET
+        n = n + excluded.n, total = total + excluded.total,
+        min_value = min(min_value, excluded.min_value), max_value = max(max_value, excluded.max_value);
+"""
+
+
+def create_vital_rollups(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS vital_rollups (
+        patient_id TEXT NOT NULL,
+        resolution TEXT NOT NULL CHECK(resolution IN ('hour', 'day')),
+        bucket TEXT NOT NULL,
+        hospital_id TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        total REAL NOT NULL,
+        min_value REAL NOT NULL,
+        max_value REAL NOT NULL,
+        PRIMARY KEY (patient_id, resolution, bucket, hospital_id, metric)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS vital_signs_rollup AFTER INSERT ON vital_signs BEGIN {VITAL_ROLLUP_UPSERT.format(source=vital_rollup_source('NEW'))} END")
+
+
+def backfill_vital_rollups(conn, after, through):
+    # Readings inserted once the trigger exists are past the last backfilled rowid
+    conn.execute(VITAL_ROLLUP_UPSERT.format(source=vital_rollup_source("v")), (after, through))
+
+
+# 8: the paginated appointment list filters by status within a date range, so the
+# hospital/status index gains appointment_date (the old one is its prefix)
+def extend_hospital_status_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_hospital_status_date ON appointments(hospital_id, status, appointment_date)")
+    conn.execute("DROP INDEX IF EXISTS idx_appointments_hospital_status")
+
+
+# 9: the per-row rollup trigger costs 16 upserts per inserted reading. Rollups are
+# now maintained by vitals_ingest.write_readings, which aggregates each batch
+# before upserting; it is the only code path that writes vital_signs.
+def drop_vital_rollup_trigger(conn):
+    conn.execute("DROP TRIGGER IF EXISTS vital_signs_rollup")
+
+
+# 10: booking availability: weekly opening hours and parallel capacity per hospital.
+# Hospitals without hospital_hours rows use availability.DEFAULT_HOURS.
+def create_hospital_hours(conn):
+    add_column(conn, "hospitals", "capacity", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "hospitals", "slot_minutes", "INTEGER NOT NULL DEFAULT 15")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hospital_hours (
+        hospital_id TEXT NOT NULL REFERENCES hospitals(id),
+        weekday INTEGER NOT NULL CHECK(weekday BETWEEN 0 AND 6),
+        opens TEXT NOT NULL,
+        closes TEXT NOT NULL,
+        PRIMARY KEY (hospital_id, weekday)
+    ) WITHOUT ROWID
+    ''')
+
+
+# 11: data_versions holds a counter per table that triggers bump on every write,
+# so caches can tell with one primary-key read whether their source changed.
+# Also an index for reading all of a hospital's medical_history rows.
+VERSIONED_TABLES = ["medical_history"]
+
+
+def create_data_versions(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    for table in VERSIONED_TABLES:
+        conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN UPDATE data_versions SET version = version + 1 WHERE name = '{table}'; END")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medical_history_hospital ON medical_history(hospital_id, patient_id)")
+
+
+# 12: dashboard counters kept by triggers on appointments, so dashboards read a
+# few primary-key rows instead of COUNT(*) over the appointment history.
+#   appointment_counts: appointments per (hospital or patient, status)
+#   hospital_day_counts: appointments per (hospital, local day, status), for
+#   "today" and "this week" figures
+# (table, key columns, key values for a row, condition for the row to be counted)
+APPOINTMENT_COUNTERS = [
+    ("appointment_counts", "scope, owner_id, status", "'hospital', {row}.hospital_id, {row}.status", "{row}.hospital_id IS NOT NULL"),
+    ("appointment_counts", "scope, owner_id, status", "'patient', {row}.patient_id, {row}.status", "{row}.patient_id IS NOT NULL"),
+    ("hospital_day_counts", "hospital_id, day, status", "{row}.hospital_id, date({row}.appointment_date), {row}.status", "{row}.hospital_id IS NOT NULL AND date({row}.appointment_date) IS NOT NULL"),
+]
+
+
+def _count_appointment(row, change):
+    # Adds `change` (1 or -1) to every counter the row falls under
+    return " ".join(
+        f"INSERT INTO {table} ({columns}, n) SELECT {values.format(row=row)}, {change} WHERE {counted.format(row=row)} AND {row}.status IS NOT NULL ON CONFLICT DO UPDATE SET n = n + excluded.n;"
+        for table, columns, values, counted in APPOINTMENT_COUNTERS
+    )
+
+
+def create_appointment_counters(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS appointment_counts (
+        scope TEXT NOT NULL CHECK(scope IN ('hospital', 'patient')),
+        owner_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (scope, owner_id, status)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hospital_day_counts (
+        hospital_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        status TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (hospital_id, day, status)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS appointments_count_insert AFTER INSERT ON appointments BEGIN {_count_appointment('NEW', 1)} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS appointments_count_delete AFTER DELETE ON appointments BEGIN {_count_appointment('OLD', -1)} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS appointments_count_update AFTER UPDATE OF patient_id, hospital_id, appointment_date, status ON appointments BEGIN {_count_appointment('OLD', -1)} {_count_appointment('NEW', 1)} END")
+    for table, columns, values, counted in APPOINTMENT_COUNTERS:
+        conn.execute(f"INSERT INTO {table} ({columns}, n) SELECT {values.format(row='a')}, COUNT(*) FROM appointments a WHERE {counted.format(row='a')} AND a.status IS NOT NULL GROUP BY 1, 2, 3")
+
+
+# 13: patient search for hospital staff.
+#   hospital_patients: which patients a hospital may look up (anyone with an
+#   appointment or a medical_history row there), kept by triggers
+#   patient_search: FTS5 trigram index of each patient's name, ID, contact
+#   details, allergies and chronic conditions; see search.py
+#   name_words / name_words_search: every distinct first and last name, with a
+#   trigram index of its own, to find the names a misspelt query word meant
+# patients has a TEXT primary key, whose implicit rowid VACUUM may renumber, so
+# documents are keyed by a docid from patient_search_docs instead. Any change to
+# a source row rewrites that patient's whole document. The lookups name their
+# indexes: statistics gathered on a small database must not turn them into scans.
+PATIENT_DOCUMENT = '''
+DELETE FROM patient_search WHERE rowid = (SELECT docid FROM patient_search_docs WHERE patient_id = {patient});
+INSERT OR IGNORE INTO patient_search_docs (patient_id) SELECT id FROM patients WHERE id = {patient};
+INSERT INTO patient_search (rowid, patient_id, name, contact, history)
+SELECT (SELECT docid FROM patient_search_docs WHERE patient_id = {patient}), id, first_name || ' ' || last_name,
+       (SELECT group_concat(coalesce(phone, '') || ' ' || coalesce(email, '') || ' ' || coalesce(address, ''), ' ') FROM contact_info INDEXED BY idx_contact_info_patient WHERE patient_id = {patient}),
+       (SELECT group_concat(coalesce(allergies, '') || ' ' || coalesce(chronic_conditions, ''), ' ') FROM medical_history INDEXED BY idx_medical_history_patient_hospital WHERE patient_id = {patient})
+FROM patients WHERE id = {patient};
+'''
+ADD_NAME_WORDS = "INSERT OR IGNORE INTO name_words (word) VALUES (lower(NEW.first_name)), (lower(NEW.last_name));"
+ADD_HOSPITAL_PATIENT = "INSERT OR IGNORE INTO hospital_patients (hospital_id, patient_id) SELECT {row}.hospital_id, {row}.patient_id WHERE {row}.hospital_id IS NOT NULL AND {row}.patient_id IS NOT NULL;"
+
+
+def create_patient_search(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hospital_patients (
+        hospital_id TEXT NOT NULL,
+        patient_id TEXT NOT NULL,
+        PRIMARY KEY (hospital_id, patient_id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE TABLE IF NOT EXISTS patient_search_docs (docid INTEGER PRIMARY KEY, patient_id TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(patient_id, name, contact, history, tokenize = 'trigram')")
+    conn.execute("CREATE TABLE IF NOT EXISTS name_words (id INTEGER PRIMARY KEY, word TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS name_words_search USING fts5(word, content = 'name_words', content_rowid = 'id', tokenize = 'trigram')")
+    triggers = {
+        "patients_search_insert": ("AFTER INSERT ON patients", ADD_NAME_WORDS + PATIENT_DOCUMENT.format(patient="NEW.id")),
+        "patients_search_update": ("AFTER UPDATE OF first_name, last_name ON patients", ADD_NAME_WORDS + PATIENT_DOCUMENT.format(patient="NEW.id")),
+        "patients_search_delete": ("AFTER DELETE ON patients", "DELETE FROM patient_search WHERE rowid = (SELECT docid FROM patient_search_docs WHERE patient_id = OLD.id); DELETE FROM patient_search_docs WHERE patient_id = OLD.id;"),
+        "contact_info_search_insert": ("AFTER INSERT ON contact_info", PATIENT_DOCUMENT.format(patient="NEW.patient_id")),
+        "contact_info_search_update": ("AFTER UPDATE ON contact_info", PATIENT_DOCUMENT.format(patient="OLD.patient_id") + PATIENT_DOCUMENT.format(patient="NEW.patient_id")),
+        "contact_info_search_delete": ("AFTER DELETE ON contact_info", PATIENT_DOCUMENT.format(patient="OLD.patient_id")),
+        "medical_history_search_insert": ("AFTER INSERT ON medical_history", ADD_HOSPITAL_PATIENT.format(row="NEW") + PATIENT_DOCUMENT.format(patient="NEW.patient_id")),
+        "medical_history_search_update": ("AFTER UPDATE ON medical_history", ADD_HOSPITAL_PATIENT.format(row="NEW") + PATIENT_DOCUMENT.format(patient="OLD.patient_id") + PATIENT_DOCUMENT.format(patient="NEW.patient_id")),
+        "medical_history_search_delete": ("AFTER DELETE ON medical_history", PATIENT_DOCUMENT.format(patient="OLD.patient_id")),
+        # Words are only ever added; one no patient has any more simply finds nobody
+        "name_words_search_insert": ("AFTER INSERT ON name_words", "INSERT INTO name_words_search (rowid, word) VALUES (NEW.id, NEW.word);"),
+        "appointments_hospital_patient_insert": ("AFTER INSERT ON appointments", ADD_HOSPITAL_PATIENT.format(row="NEW")),
+        "appointments_hospital_patient_update": ("AFTER UPDATE OF patient_id, hospital_id ON appointments", ADD_HOSPITAL_PATIENT.format(row="NEW")),
+    }
+    for name, (event, body) in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+    # Backfill
+    conn.execute("INSERT OR IGNORE INTO hospital_patients (hospital_id, patient_id) SELECT hospital_id, patient_id FROM appointments WHERE hospital_id IS NOT NULL AND patient_id IS NOT NULL")
+    conn.execute("INSERT OR IGNORE INTO hospital_patients (hospital_id, patient_id) SELECT hospital_id, patient_id FROM medical_history WHERE hospital_id IS NOT NULL AND patient_id IS NOT NULL")
+    conn.execute("INSERT OR IGNORE INTO name_words (word) SELECT lower(first_name) FROM patients UNION SELECT lower(last_name) FROM patients")
+    conn.execute("INSERT OR IGNORE INTO patient_search_docs (patient_id) SELECT id FROM patients")
+    conn.execute('''
+    INSERT INTO patient_search (rowid, patient_id, name, contact, history)
+    SELECT d.docid, p.id, p.first_name || ' ' || p.last_name, c.contact, m.history
+    FROM patients p
+    JOIN patient_search_docs d ON d.patient_id = p.id
+    LEFT JOIN (SELECT patient_id, group_concat(coalesce(phone, '') || ' ' || coalesce(email, '') || ' ' || coalesce(address, ''), ' ') AS contact FROM contact_info GROUP BY patient_id) c ON c.patient_id = p.id
+    LEFT JOIN (SELECT patient_id, group_concat(coalesce(allergies, '') || ' ' || coalesce(chronic_conditions, ''), ' ') AS history FROM medical_history GROUP BY patient_id) m ON m.patient_id = p.id
+    ''')
+
+
+# 14: incremental export of changed rows to the analytics snapshot (analytics.py)
+def create_updated_at_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_updated_at ON appointments(updated_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hospitals_updated_at ON hospitals(updated_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medical_history_updated_at ON medical_history(updated_at)")
+    # Rows written without updated_at would never be exported
+    now = datetime.now().isoformat()
+    conn.execute("UPDATE appointments SET updated_at = coalesce(created_at, ?) WHERE updated_at IS NULL", (now,))
+    conn.execute("UPDATE hospitals SET updated_at = coalesce(created_at, ?) WHERE updated_at IS NULL", (now,))
+    conn.execute("UPDATE medical_history SET updated_at = coalesce(uploaded_at, ?) WHERE updated_at IS NULL", (now,))
+
+
+# 15: change feed for downstream systems (changefeed.py). Every insert, update and
+# delete on these tables appends (table, primary key, operation) to change_log;
+# AUTOINCREMENT keeps seq increasing even after old entries are deleted.
+CHANGE_FEED_TABLES = ["users", "patients", "medical_history", "vital_signs", "appointments", "reports"]
+LOG_CHANGE = "INSERT INTO change_log (table_name, row_key, operation) VALUES ('{table}', {row}.id, '{operation}');"
+
+
+def create_change_log(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_key NOT NULL,
+        operation TEXT NOT NULL,
+        changed_at TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))
+    )
+    ''')
+    # Finds earlier entries of the same row when compacting
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log(table_name, row_key, seq)")
+    # pruned_through: the highest seq removed for age; older cursors cannot resume
+    # compacted_through: entries up to here have had their superseded predecessors removed
+    conn.execute("CREATE TABLE IF NOT EXISTS change_log_state (id INTEGER PRIMARY KEY CHECK (id = 1), pruned_through INTEGER NOT NULL, compacted_through INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO change_log_state (id, pruned_through, compacted_through) VALUES (1, 0, 0)")
+    for table in CHANGE_FEED_TABLES:
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table} BEGIN {LOG_CHANGE.format(table=table, row='NEW', operation='insert')} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE ON {table} BEGIN {LOG_CHANGE.format(table=table, row='NEW', operation='update')} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table} BEGIN {LOG_CHANGE.format(table=table, row='OLD', operation='delete')} END")
+
+
+# 16: bearer tokens for the read API (api.py); only a SHA-256 of each token is stored
+def create_api_tokens(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS api_tokens (
+        token_hash TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id),
+        created_at TIMESTAMP NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_api_tokens_user ON api_tokens(user_id)")
+
+
+# 17: per-hospital lookups for the bulk export (export.py); the other exported
+# tables already have an index leading with hospital_id
+def create_hospital_export_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vital_signs_hospital ON vital_signs(hospital_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_hospital ON reports(hospital_id)")
+
+
+# 18: archival of old vital signs and appointments (archive.py). archive_parts
+# lists the Parquet files the archived rows were moved to, by table and month of
+# the rows' date; the date indexes find the rows old enough to move.
+def create_archive_parts(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS archive_parts (
+        id INTEGER PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        month TEXT NOT NULL,
+        path TEXT NOT NULL UNIQUE,
+        rows INTEGER NOT NULL,
+        archived_at TIMESTAMP NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_parts_month ON archive_parts(table_name, month)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vital_signs_date ON vital_signs(recorded_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date)")
+
+
+# 19: the change feed publishes users' profile columns only; every login stamping
+# last_login (and upgrading password_hash) was an update entry carrying nothing new
+FEED_USER_COLUMNS = ["username", "role", "name", "email"]
+
+
+def narrow_users_change_trigger(conn):
+    conn.execute("DROP TRIGGER IF EXISTS users_change_update")
+    conn.execute(f"CREATE TRIGGER users_change_update AFTER UPDATE OF {', '.join(FEED_USER_COLUMNS)} ON users BEGIN {LOG_CHANGE.format(table='users', row='NEW', operation='update')} END")
+
+
+# Ordered (version, description, step); append only
+MIGRATIONS = [
+    (1, "base schema", create_base_schema),
+    (2, "users.last_login", add_users_last_login),
+    (3, "hospitals.email", add_hospitals_email),
+    (4, "demo data", seed_demo_data),
+    (5, "hot query indexes", create_hot_query_indexes),
+    (6, "reports in blob store", move_report_blobs),
+    (7, "vital sign rollups", Backfill("vital_signs", create_vital_rollups, backfill_vital_rollups)),
+    (8, "appointments hospital/status/date index", extend_hospital_status_index),
+    (9, "vital rollups maintained by the ingest path", drop_vital_rollup_trigger),
+    (10, "hospital opening hours and capacity", create_hospital_hours),
+    (11, "data versions for cache invalidation", create_data_versions),
+    (12, "appointment counters for dashboards", create_appointment_counters),
+    (13, "patient search index", create_patient_search),
+    (14, "updated_at indexes for analytics export", create_updated_at_indexes),
+    (15, "change log for the change feed", create_change_log),
+    (16, "API tokens", create_api_tokens),
+    (17, "hospital indexes for the bulk export", create_hospital_export_indexes),
+    (18, "archive catalog and date indexes", create_archive_parts),
+    (19, "users change trigger on profile columns", narrow_users_change_trigger),
+]
+
+
+def current_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(db):
+    """Bring the database up to the latest schema version; returns the versions applied."""
+    with db.write() as conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+        ''')
+        # Backfill steps under way: rows up to done_through are done, of those up to last_rowid
+        conn.execute("CREATE TABLE IF NOT EXISTS migration_progress (version INTEGER PRIMARY KEY, done_through INTEGER NOT NULL, last_rowid INTEGER NOT NULL)")
+        version = current_version(conn)
+    applied = []
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        if isinstance(step, Backfill):
+            if _backfill(db, step_version, description, step):
+                applied.append(step_version)
+            continue
+        with db.write() as conn:
+            # Another process may have migrated while we waited for the write lock
+            if current_version(conn) >= step_version:
+                continue
+            step(conn)
+            conn.execute(RECORD_VERSION, (step_version, description, datetime.now().isoformat()))
+        applied.append(step_version)
+    return applied
+
+
+def _backfill(db, version, description, step):
+    # Returns whether this call recorded the version. Each transaction re-reads the
+    # watermark, so processes migrating at the same time share the batches.
+    with db.write() as conn:
+        if current_version(conn) >= version:
+            return False
+        if conn.execute(PROGRESS, (version,)).fetchone() is None:
+            step.prepare(conn)
+            last_rowid = conn.execute(f"SELECT coalesce(MAX(rowid), 0) FROM {step.table}").fetchone()[0]
+            conn.execute(INSERT_PROGRESS, (version, last_rowid))
+    while True:
+        with db.write() as conn:
+            if current_version(conn) >= version:
+                return False
+            done_through, last_rowid = conn.execute(PROGRESS, (version,)).fetchone()
+            through = step.batch_end(conn, done_through, last_rowid)
+            if through is None:
+                conn.execute(DELETE_PROGRESS, (version,))
+                conn.execute(RECORD_VERSION, (version, description, datetime.now().isoformat()))
+                return True
+            step.fill(conn, done_through, through)
+            conn.execute(UPDATE_PROGRESS, (through, version))
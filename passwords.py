@@ -0,0 +1,134 @@
+import hashlib
+import hmac
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Password hashing with scrypt, a salted memory-hard KDF.
+#
+# Stored hashes look like "scrypt$<n>$<r>$<p>$<salt hex>$<key hex>", so every hash
+# carries the cost it was made with. Accounts created before this module hold an
+# unsalted SHA-256 hex digest; those still verify, and verify() returns a fresh
+# scrypt hash for the caller to store, so they are upgraded at their next login.
+#
+# Bulk imports and synthetic data give a whole batch of accounts one hash of the
+# default password, rather than running the KDF per row. Such a hash is stored as
+# "shared$" followed by the scrypt hash; it verifies like any other, but always
+# needs a rehash, so each account gets a salt of its own at its first login.
+#
+# The cost is calibrated once per process: starting from N=2^14, r=8, p=1 (the
+# scrypt paper's parameters for interactive logins, 16 MiB per hash), N grows up
+# to MAX_N and then p, until one hash takes about TARGET_SECONDS on this machine.
+# Hashing runs in a bounded thread pool; hashlib releases the GIL while it works,
+# so other sessions' scripts keep running, and at most `workers` hashes (and
+# their memory) are in progress at once. Beyond max_pending waiting logins,
+# Busy is raised instead of queueing without bound.
+
+TARGET_SECONDS = 0.1
+MIN_N = 2 ** 14
+MAX_N = 2 ** 16  # 64 MiB per hash with r=8
+BLOCK_SIZE = 8
+SALT_BYTES = 16
+KEY_BYTES = 32
+WORKERS = min(4, os.cpu_count() or 1)
+MAX_PENDING = 64
+SUBMIT_TIMEOUT = 5.0
+DEFAULT_COST = (MIN_N, BLOCK_SIZE, 1)
+SHARED_PREFIX = "shared$"
+
+
+class Busy(Exception):
+    """Too many password checks are already waiting."""
+
+
+def _scrypt(password, salt, n, r, p):
+    # OpenSSL refuses more than 32 MiB unless maxmem allows it
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n + 2 ** 20, dklen=KEY_BYTES)
+
+
+def hash_password(password, cost=DEFAULT_COST):
+    n, r, p = cost
+    salt = os.urandom(SALT_BYTES)
+    return f"scrypt${n}${r}${p}${salt.hex()}${_scrypt(password, salt, n, r, p).hex()}"
+
+
+def shared_hash(password, cost=DEFAULT_COST):
+    """A hash to store on many accounts at once; each is rehashed at its first login."""
+    return SHARED_PREFIX + hash_password(password, cost)
+
+
+def is_legacy(stored):
+    return not stored.startswith(("scrypt$", SHARED_PREFIX))
+
+
+def needs_rehash(stored, cost=DEFAULT_COST):
+    """True for legacy SHA-256 hashes, shared hashes and scrypt hashes weaker than `cost`."""
+    if is_legacy(stored) or stored.startswith(SHARED_PREFIX):
+        return True
+    n, r, p = (int(part) for part in stored.split("$")[1:4])
+    return n * r * p < cost[0] * cost[1] * cost[2]
+
+
+def check_password(password, stored):
+    if is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    _, n, r, p, salt, key = stored.removeprefix(SHARED_PREFIX).split("$")
+    return hmac.compare_digest(_scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p)).hex(), key)
+
+
+def calibrate(target_seconds=TARGET_SECONDS):
+    """(n, r, p) taking about target_seconds per hash here, never below DEFAULT_COST."""
+    salt = os.urandom(SALT_BYTES)
+    # Best of three, so a busy moment does not make the cost too low
+    base = min(_timed(salt) for _ in range(3))
+    factor = max(1, int(target_seconds / base))
+    n = min(MAX_N, MIN_N * 2 ** int(math.log2(factor)))
+    return n, BLOCK_SIZE, max(1, factor * MIN_N // n)
+
+
+def _timed(salt):
+    started = time.perf_counter()
+    _scrypt("calibration", salt, MIN_N, BLOCK_SIZE, 1)
+    return time.perf_counter() - started
+
+
+class Hasher:
+    """Calibrated hashing and verification on a bounded pool of worker threads."""
+
+    def __init__(self, cost=None, workers=WORKERS, max_pending=MAX_PENDING):
+        self.cost = cost or calibrate()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        # Compared against when the user does not exist, so unknown usernames take as long
+        self._dummy = hash_password("", self.cost)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=SUBMIT_TIMEOUT):
+            raise Busy("too many sign-ins in progress")
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.cost)
+
+    def verify(self, password, stored):
+        """(matches, new hash to store or None); `stored` None checks against a dummy hash."""
+        return self._run(self._verify, password, stored)
+
+    def _verify(self, password, stored):
+        if stored is None:
+            check_password(password, self._dummy)
+            return False, None
+        if not check_password(password, stored):
+            return False, None
+        return True, hash_password(password, self.cost) if needs_rehash(stored, self.cost) else None
+
+    def close(self):
+        self._pool.shutdown()
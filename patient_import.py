@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+
+import passwords
+
+# Bulk patient onboarding for hospitals.
+#
+# Records are streamed from a CSV file or a FHIR Patient bundle, validated one at
+# a time, and written in batches: each batch is one write transaction with one
+# executemany per table. A row that fails validation or a constraint is reported
+# with its row number and skipped; the rest of the batch is still imported. A file
+# that cannot be read on (not UTF-8, not JSON) raises UnreadableFile, carrying
+# what was imported up to that point.
+
+BATCH_ROWS = 20_000
+# Imported patients get the same default password as those added by hand
+DEFAULT_PASSWORD = "patient123"
+FIELDS = ["first_name", "last_name", "date_of_birth", "gender", "phone", "email", "address", "blood_type", "allergies", "chronic_conditions"]
+GENDERS = {"male": "Male", "m": "Male", "female": "Female", "f": "Female", "other": "Other", "unknown": "Other"}
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+INSERT_USER = "INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, 'patient', ?, ?, ?, ?)"
+INSERT_PATIENT = "INSERT INTO patients (id, user_id, first_name, last_name, date_of_birth, gender, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_CONTACT = "INSERT INTO contact_info (patient_id, phone, email, address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_HISTORY = "INSERT INTO medical_history (patient_id, hospital_id, blood_type, allergies, chronic_conditions, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+class UnreadableFile(ValueError):
+    """The file could not be read past some point; the rows before it were imported."""
+
+    def __init__(self, message, imported=0, errors=()):
+        super().__init__(message)
+        self.imported = imported
+        self.errors = list(errors)
+
+
+def _text_stream(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def read_csv(stream):
+    """Yield (row number, record) from a CSV with a header row; headers are matched case-insensitively."""
+    reader = csv.reader(_text_stream(stream))
+    header = [name.strip().lower().replace(" ", "_") for name in next(reader, [])]
+    # Column position per import field; fields missing from the file read as ""
+    positions = [header.index(field) if field in header else None for field in FIELDS]
+    for number, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        yield number, {field: row[i] if i is not None and i < len(row) else "" for field, i in zip(FIELDS, positions)}
+
+
+def fhir_patient(resource):
+    """Map a FHIR R4 Patient resource onto the import fields."""
+    name = next((n for n in resource.get("name", []) if n.get("use") == "official"), None) or (resource.get("name") or [{}])[0]
+    telecom = resource.get("telecom", [])
+    address = (resource.get("address") or [{}])[0]
+    return {
+        "first_name": " ".join(name.get("given", [])),
+        "last_name": name.get("family", ""),
+        "date_of_birth": resource.get("birthDate", ""),
+        "gender": resource.get("gender", ""),
+        "phone": next((t.get("value", "") for t in telecom if t.get("system") == "phone"), ""),
+        "email": next((t.get("value", "") for t in telecom if t.get("system") == "email"), ""),
+        "address": address.get("text") or ", ".join(part for part in address.get("line", []) + [address.get("city", ""), address.get("state", ""), address.get("postalCode", "")] if part),
+        "blood_type": "",
+        "allergies": "",
+        "chronic_conditions": "",
+    }
+
+
+def read_fhir(stream):
+    """Yield (entry number, record) from a FHIR Bundle or from NDJSON (one resource per line).
+
+    NDJSON, the FHIR bulk-data export format, is read line by line; a Bundle is a
+    single JSON document and has to be parsed whole. Non-Patient resources are skipped.
+    """
+    text = _text_stream(stream)
+    skipped, first = 0, text.readline()
+    while first and not first.strip():
+        skipped, first = skipped + 1, text.readline()
+    try:
+        resource = json.loads(first)
+        bundle = not isinstance(resource, dict) or resource.get("resourceType") == "Bundle"
+    except json.JSONDecodeError:
+        bundle = True
+    if bundle:
+        try:
+            document = json.loads(first + text.read())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"not a FHIR Bundle or NDJSON: {e}") from None
+        if not isinstance(document, dict) or document.get("resourceType") != "Bundle":
+            raise ValueError("expected a FHIR Bundle or NDJSON with one resource per line")
+        for number, entry in enumerate(document.get("entry") or [], start=1):
+            resource = entry.get("resource") if isinstance(entry, dict) else None
+            if isinstance(resource, dict) and resource.get("resourceType") == "Patient":
+                yield number, _patient_or_error(resource)
+        return
+    for number, line in enumerate(_lines(first, text), start=skipped + 1):
+        if not line.strip():
+            continue
+        try:
+            resource = json.loads(line)
+        except json.JSONDecodeError as e:
+            # Reported by validate() like any other bad row
+            yield number, ValueError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(resource, dict):
+            yield number, ValueError("expected a JSON object")
+        elif resource.get("resourceType") == "Patient":
+            yield number, _patient_or_error(resource)
+
+
+def _patient_or_error(resource):
+    try:
+        return fhir_patient(resource)
+    except (AttributeError, TypeError, IndexError):
+        return ValueError("malformed Patient resource")
+
+
+def _lines(first, rest):
+    yield first
+    yield from rest
+
+
+def validate(record):
+    """Return the cleaned record or raise ValueError describing the first problem."""
+    if isinstance(record, Exception):
+        raise ValueError(str(record))
+    clean = {field: (record.get(field) or "").strip() for field in FIELDS}
+    if not clean["first_name"] or not clean["last_name"]:
+        raise ValueError("first_name and last_name are required")
+    if clean["date_of_birth"]:
+        try:
+            born = date.fromisoformat(clean["date_of_birth"])
+        except ValueError:
+            raise ValueError(f"date_of_birth {clean['date_of_birth']!r} is not YYYY-MM-DD") from None
+        if not date(1900, 1, 1) <= born <= date.today():
+            raise ValueError(f"date_of_birth {clean['date_of_birth']} is out of range")
+    if clean["gender"]:
+        if clean["gender"].lower() not in GENDERS:
+            raise ValueError(f"unknown gender {clean['gender']!r}")
+        clean["gender"] = GENDERS[clean["gender"].lower()]
+    if clean["blood_type"]:
+        clean["blood_type"] = clean["blood_type"].upper()
+        if clean["blood_type"] not in BLOOD_TYPES:
+            raise ValueError(f"unknown blood_type {clean['blood_type']!r}")
+    if clean["email"] and not EMAIL_PATTERN.match(clean["email"]):
+        raise ValueError(f"invalid email {clean['email']!r}")
+    return clean
+
+
+def _table_rows(hospital_id, records, password_hash, now):
+    # 48-bit random suffixes: the 8 hex digits used for single patients collide
+    # within a few hundred thousand imports
+    users, patients, contacts, histories = [], [], [], []
+    for r in records:
+        suffix = os.urandom(6).hex()
+        patient_id, user_id = f"PAT_{suffix}", f"USR_PAT_{suffix}"
+        username = f"{r['first_name'].lower()}.{r['last_name'].lower()}.{suffix}"
+        users.append((user_id, username, password_hash, f"{r['first_name']} {r['last_name']}", r["email"] or None, now, now))
+        patients.append((patient_id, user_id, r["first_name"], r["last_name"], r["date_of_birth"] or None, r["gender"] or None, now, now))
+        contacts.append((patient_id, r["phone"] or None, r["email"] or None, r["address"] or None, now, now))
+        histories.append((patient_id, hospital_id, r["blood_type"] or None, r["allergies"] or None, r["chronic_conditions"] or None, now, now))
+    return users, patients, contacts, histories
+
+
+def insert_patients(conn, hospital_id, records, password_hash=None):
+    """Insert validated records inside the caller's write transaction; returns the new patient IDs."""
+    password_hash = password_hash or passwords.shared_hash(DEFAULT_PASSWORD)
+    users, patients, contacts, histories = _table_rows(hospital_id, records, password_hash, datetime.now().isoformat())
+    conn.executemany(INSERT_USER, users)
+    conn.executemany(INSERT_CONTACT, contacts)
+    conn.executemany(INSERT_HISTORY, histories)
+    # Patients last: the search index document (migration 13) is then built once,
+    # when the patient row arrives, rather than again for each related row
+    conn.executemany(INSERT_PATIENT, patients)
+    return [row[0] for row in patients]
+
+
+def _insert_batch(conn, hospital_id, batch, password_hash):
+    # Returns (imported count, [(row number, error)]); runs in the caller's write transaction
+    try:
+        conn.execute("SAVEPOINT import_batch")
+        insert_patients(conn, hospital_id, [record for _, record in batch], password_hash)
+        conn.execute("RELEASE import_batch")
+        return len(batch), []
+    except sqlite3.IntegrityError:
+        conn.execute("ROLLBACK TO import_batch")
+        conn.execute("RELEASE import_batch")
+    # Some row broke a constraint: redo the batch row by row to find which
+    imported, errors = 0, []
+    for number, record in batch:
+        try:
+            conn.execute("SAVEPOINT import_row")
+            insert_patients(conn, hospital_id, [record], password_hash)
+            conn.execute("RELEASE import_row")
+            imported += 1
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO import_row")
+            conn.execute("RELEASE import_row")
+            errors.append((number, str(e)))
+    return imported, errors
+
+
+def import_patients(db, hospital_id, rows, batch_size=BATCH_ROWS, progress=None, write=None):
+    """Validate and insert (row number, record) pairs; returns (imported count, [(row number, error)]).
+
+    `progress`, if given, is called with the number of rows processed after each batch.
+    `write`, if given, runs fn(conn, *args) in a write transaction and returns its
+    result, e.g. the app's resources.run_write; by default each batch is a db.write().
+    Raises UnreadableFile if `rows` fails to read on.
+    """
+    if write is None:
+        write = lambda fn, *args: _in_transaction(db, fn, *args)
+    # One shared hash of the default password for the whole import, rather than a
+    # KDF run per row; needs_rehash() gives each account its own at first login
+    password_hash = passwords.shared_hash(DEFAULT_PASSWORD)
+    imported, errors, batch, processed = 0, [], [], 0
+
+    def flush():
+        batch_imported, batch_errors = write(_insert_batch, hospital_id, batch, password_hash)
+        errors.extend(batch_errors)
+        return batch_imported
+
+    rows = iter(rows)
+    while True:
+        try:
+            number, record = next(rows)
+        except StopIteration:
+            break
+        except ValueError as e:  # bad encoding or JSON: nothing after this can be read
+            if batch:
+                imported += flush()
+            raise UnreadableFile(f"{e} (after {processed:,} rows)" if processed else str(e), imported, errors) from e
+        processed += 1
+        try:
+            batch.append((number, validate(record)))
+        except ValueError as e:
+            errors.append((number, str(e)))
+        if len(batch) >= batch_size:
+            imported += flush()
+            batch = []
+            if progress:
+                progress(processed)
+    if batch:
+        imported += flush()
+    if progress:
+        progress(processed)
+    return imported, errors
+
+
+def _in_transaction(db, fn, *args):
+    with db.write() as conn:
+        return fn(conn, *args)
+
+
+def read_file(name, stream):
+    """Pick the reader from the file name: .csv, or .json / .ndjson for FHIR."""
+    if name.lower().endswith(".csv"):
+        return read_csv(stream)
+    if name.lower().endswith((".json", ".ndjson", ".jsonl")):
+        return read_fhir(stream)
+    raise ValueError(f"Unsupported file type: {name}")
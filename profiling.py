@@ -0,0 +1,268 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Per-page render profiling.
+#
+# Healthrecords.py runs each page function inside Profiler.render(page). While a
+# render is active on a thread, connections created with ProfiledConnection
+# (ConnectionManager(..., factory=ProfiledConnection)) attribute every statement
+# they run to it: the time spent executing and fetching, and the rows fetched.
+# Outside a render (imports, the ingest server) Connection.execute costs one
+# thread-local lookup more than on a plain connection.
+#
+# Each render records its wall time, statement count, rows and slowest
+# statements, and flags N+1 patterns: the same statement executed N_PLUS_ONE_MIN
+# or more times in one render, usually a query issued per row of another.
+# Per-page p50/p95/p99 are taken over the last WINDOW renders of the page, and
+# the summary is written to a JSON file at most every WRITE_INTERVAL seconds.
+
+WINDOW = 1000
+SLOWEST = 5
+N_PLUS_ONE_MIN = 10
+WRITE_INTERVAL = 60
+TOP_STATEMENTS = 50
+
+_current = threading.local()
+
+
+class _Render:
+    def __init__(self, page):
+        self.page = page
+        self.statements = {}  # sql -> [executions, seconds, rows]
+
+    def statement(self, sql):
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = [0, 0.0, 0]
+        entry[0] += 1
+        return entry
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    _entry = None
+
+    def execute(self, sql, parameters=()):
+        render = getattr(_current, "render", None)
+        if render is None:
+            self._entry = None
+            return super().execute(sql, parameters)
+        self._entry = render.statement(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._entry[1] += time.perf_counter() - started
+
+    def executemany(self, sql, seq_of_parameters):
+        render = getattr(_current, "render", None)
+        if render is None:
+            self._entry = None
+            return super().executemany(sql, seq_of_parameters)
+        self._entry = render.statement(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._entry[1] += time.perf_counter() - started
+
+    # Rows are produced while fetching, so fetch time counts towards the statement
+    def fetchone(self):
+        entry = self._entry
+        if entry is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        entry[1] += time.perf_counter() - started
+        entry[2] += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        entry = self._entry
+        if entry is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        entry[1] += time.perf_counter() - started
+        entry[2] += len(rows)
+        return rows
+
+    def fetchall(self):
+        entry = self._entry
+        if entry is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        entry[1] += time.perf_counter() - started
+        entry[2] += len(rows)
+        return rows
+
+    def __next__(self):
+        entry = self._entry
+        if entry is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        finally:
+            entry[1] += time.perf_counter() - started
+        entry[2] += 1
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are attributed to the thread's active render."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # Outside a render, statements run on plain cursors and pay nothing per row
+    def execute(self, sql, parameters=()):
+        if getattr(_current, "render", None) is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if getattr(_current, "render", None) is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _percentile(values, p):
+    # Nearest rank over sorted values
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _statement_text(sql):
+    return " ".join(sql.split())
+
+
+class Profiler:
+    def __init__(self, path=None, window=WINDOW, write_interval=WRITE_INTERVAL):
+        self.path = path
+        self.window = window
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._renders = defaultdict(lambda: deque(maxlen=self.window))  # page -> recent render samples
+            self._counts = defaultdict(int)  # page -> renders since reset
+            self._statements = {}  # sql -> [executions, seconds, rows, pages]
+            self._n_plus_one = {}  # (page, sql) -> [renders, most executions in one render]
+            self._written = time.monotonic()
+
+    @contextmanager
+    def render(self, page):
+        """Profile the block as one render of `page`; nested renders are recorded separately."""
+        render = _Render(page)
+        outer = getattr(_current, "render", None)
+        _current.render = render
+        started = time.perf_counter()
+        try:
+            yield render
+        finally:
+            wall = time.perf_counter() - started
+            _current.render = outer
+            self._record(render, wall)
+
+    def _record(self, render, wall):
+        statements = render.statements
+        slowest = sorted(((seconds, sql, executions) for sql, (executions, seconds, rows) in statements.items()), reverse=True)[:SLOWEST]
+        repeated = [sql for sql, entry in statements.items() if entry[0] >= N_PLUS_ONE_MIN]
+        sample = {
+            "at": time.time(),
+            "wall": wall,
+            "queries": sum(entry[0] for entry in statements.values()),
+            "rows": sum(entry[2] for entry in statements.values()),
+            "slowest": [(sql, executions, seconds) for seconds, sql, executions in slowest],
+            "n_plus_one": bool(repeated),
+        }
+        now = time.monotonic()
+        with self._lock:
+            self._renders[render.page].append(sample)
+            self._counts[render.page] += 1
+            for sql, (executions, seconds, rows) in statements.items():
+                total = self._statements.get(sql)
+                if total is None:
+                    total = self._statements[sql] = [0, 0.0, 0, set()]
+                total[0] += executions
+                total[1] += seconds
+                total[2] += rows
+                total[3].add(render.page)
+            for sql in repeated:
+                flagged = self._n_plus_one.setdefault((render.page, sql), [0, 0])
+                flagged[0] += 1
+                flagged[1] = max(flagged[1], statements[sql][0])
+            due = self.path is not None and now - self._written >= self.write_interval
+            if due:
+                self._written = now
+        if due:
+            try:
+                self.write()
+            except OSError:
+                # Metrics are best effort; a full disk must not break the page
+                pass
+
+    def summary(self):
+        """Aggregates over the recorded renders, as plain JSON-serialisable data."""
+        with self._lock:
+            renders = {page: list(samples) for page, samples in self._renders.items()}
+            counts = dict(self._counts)
+            statements = {sql: (executions, seconds, rows, sorted(pages)) for sql, (executions, seconds, rows, pages) in self._statements.items()}
+            n_plus_one = {key: tuple(value) for key, value in self._n_plus_one.items()}
+        pages = []
+        for page, samples in sorted(renders.items()):
+            walls = sorted(sample["wall"] * 1000 for sample in samples)
+            queries = sorted(sample["queries"] for sample in samples)
+            pages.append({
+                "page": page,
+                "renders": counts[page],
+                "p50_ms": round(_percentile(walls, 50), 2),
+                "p95_ms": round(_percentile(walls, 95), 2),
+                "p99_ms": round(_percentile(walls, 99), 2),
+                "p50_queries": _percentile(queries, 50),
+                "p95_queries": _percentile(queries, 95),
+                "max_queries": queries[-1],
+                "mean_rows": round(sum(sample["rows"] for sample in samples) / len(samples), 1),
+                "n_plus_one_renders": sum(sample["n_plus_one"] for sample in samples),
+            })
+        slowest = sorted(((sample["wall"], page, sample) for page, samples in renders.items() for sample in samples), key=lambda item: item[0], reverse=True)[:SLOWEST * 2]
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "window": self.window,
+            "pages": pages,
+            "statements": [
+                {"statement": _statement_text(sql), "executions": executions, "total_ms": round(seconds * 1000, 2), "mean_ms": round(seconds * 1000 / executions, 3), "rows": rows, "pages": page_names}
+                for sql, (executions, seconds, rows, page_names) in sorted(statements.items(), key=lambda item: item[1][1], reverse=True)[:TOP_STATEMENTS]
+            ],
+            "n_plus_one": [
+                {"page": page, "statement": _statement_text(sql), "renders": flagged_renders, "max_executions": most}
+                for (page, sql), (flagged_renders, most) in sorted(n_plus_one.items(), key=lambda item: item[1][0], reverse=True)
+            ],
+            "slowest_renders": [
+                {
+                    "page": page,
+                    "at": datetime.fromtimestamp(sample["at"]).isoformat(timespec="seconds"),
+                    "wall_ms": round(wall * 1000, 2),
+                    "queries": sample["queries"],
+                    "rows": sample["rows"],
+                    "statements": [{"statement": _statement_text(sql), "executions": executions, "ms": round(seconds * 1000, 2)} for sql, executions, seconds in sample["slowest"]],
+                }
+                for wall, page, sample in slowest
+            ],
+        }
+
+    def write(self):
+        """Write the summary to `path`, replacing the previous file atomically."""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.summary(), f, indent=1)
+        os.replace(temporary, self.path)
@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# SQL for every statement the views run. Keeping them in one place lets the
+# query-plan check below EXPLAIN exactly what production executes.
+
+# The patient or hospital profile is resolved together with the login, once per session
+USER_BY_USERNAME = "SELECT u.id, u.password_hash, u.role, u.name, p.id, h.id FROM users u LEFT JOIN patients p ON p.user_id = u.id LEFT JOIN hospitals h ON h.user_id = u.id WHERE u.username = ?"
+UPDATE_LAST_LOGIN = "UPDATE users SET last_login = ? WHERE id = ?"
+# Only if the hash is still the one that was verified
+UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?"
+DELETE_USER = "DELETE FROM users WHERE id = ?"
+
+PATIENT_ID_BY_USER = "SELECT id FROM patients WHERE user_id = ?"
+HOSPITAL_ID_BY_USER = "SELECT id FROM hospitals WHERE user_id = ?"
+
+PENDING_HOSPITALS = "SELECT id, user_id, name, address, phone, email, status FROM hospitals WHERE status = 'pending'"
+APPROVED_HOSPITALS = "SELECT id, name, address, phone FROM hospitals WHERE status = 'approved'"
+SET_HOSPITAL_STATUS = "UPDATE hospitals SET status = ?, updated_at = ? WHERE id = ?"
+
+PATIENT_UPCOMING_APPOINTMENTS = "SELECT a.id, h.name, a.appointment_date, a.duration, a.status, a.reason FROM appointments a JOIN hospitals h ON a.hospital_id = h.id WHERE a.patient_id = ? AND a.appointment_date >= datetime('now') ORDER BY a.appointment_date ASC"
+
+PATIENT_HISTORY = "SELECT blood_type, allergies, chronic_conditions, surgeries, family_history FROM medical_history WHERE patient_id = ?"
+PATIENT_HOSPITAL_HISTORY = "SELECT blood_type, allergies, chronic_conditions, surgeries, family_history FROM medical_history WHERE patient_id = ? AND hospital_id = ?"
+PATIENT_HOSPITAL_REPORTS = "SELECT id, file_name, upload_date, file_size, content_hash FROM reports WHERE patient_id = ? AND hospital_id = ?"
+INSERT_REPORT = "INSERT INTO reports (patient_id, hospital_id, file_name, content_hash, file_size, upload_date, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def production_queries():
+    import appointments
+    import analytics
+    import api
+    import archive
+    import availability
+    import changefeed
+    import data_access
+    import export
+    import metrics
+    import rules
+    import search
+    import vitals
+
+    statements = {name: value for name, value in vars(sys.modules[__name__]).items() if name.isupper() and isinstance(value, str)}
+    # Statements built at runtime by other modules
+    statements.update(vitals.plan_queries())
+    statements.update(analytics.plan_queries())
+    statements.update(changefeed.plan_queries())
+    statements.update(api.plan_queries())
+    statements.update(export.plan_queries())
+    statements.update(archive.plan_queries())
+    statements.update(data_access.plan_queries())
+    statements.update(appointments.plan_queries())
+    statements.update(availability.plan_queries())
+    statements.update(rules.plan_queries())
+    statements.update(metrics.plan_queries())
+    statements.update(search.plan_queries())
+    return statements
+
+
+# Query-plan regression check
+def query_plan(conn, sql):
+    # Parameter values do not affect the plan; bind NULLs
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?"))]
+
+
+def is_table_scan(step):
+    # "SCAN (subquery-1)" and "SCAN CONSTANT ROW" walk intermediate results, not
+    # tables; an FTS5 table answering MATCH has an "M" term in its index string
+    if re.search(r"VIRTUAL TABLE INDEX \d+:\S*M", step):
+        return False
+    return step.startswith("SCAN ") and not step.startswith(("SCAN (", "SCAN CONSTANT ROW"))
+
+
+def find_table_scans(conn, queries=None):
+    """Return {name: plan} for every query whose plan contains a full table SCAN."""
+    scans = {}
+    for name, sql in (queries or production_queries()).items():
+        plan = query_plan(conn, sql)
+        if any(is_table_scan(step) for step in plan):
+            scans[name] = plan
+    return scans
+
+
+def seed_plan_database(conn, hospitals=100, patients_per_hospital=20, rows_per_patient=10):
+    # Enough rows, with realistic skew, that ANALYZE gives the planner production-like statistics
+    import vitals_ingest
+
+    now = datetime.now()
+    readings = []
+    for h in range(hospitals):
+        hospital_id = f"HOS_{h:05d}"
+        conn.execute("INSERT INTO users (id, username, password_hash, role, name, email) VALUES (?, ?, '', 'hospital', ?, ?)", (f"USR_{hospital_id}", hospital_id.lower(), hospital_id, f"{hospital_id}@example.com"))
+        conn.execute("INSERT INTO hospitals (id, user_id, name, address, status) VALUES (?, ?, ?, '', ?)", (hospital_id, f"USR_{hospital_id}", hospital_id, "pending" if h % 10 == 0 else "approved"))
+        for p in range(patients_per_hospital):
+            patient_id = f"PAT_{h:05d}_{p:05d}"
+            conn.execute("INSERT INTO users (id, username, password_hash, role, name) VALUES (?, ?, '', 'patient', ?)", (f"USR_{patient_id}", patient_id.lower(), patient_id))
+            conn.execute("INSERT INTO patients (id, user_id, first_name, last_name) VALUES (?, ?, 'First', 'Last')", (patient_id, f"USR_{patient_id}"))
+            conn.execute("INSERT INTO contact_info (patient_id) VALUES (?)", (patient_id,))
+            conn.execute("INSERT INTO medical_history (patient_id, hospital_id, blood_type) VALUES (?, ?, 'O+')", (patient_id, hospital_id))
+            for r in range(rows_per_patient):
+                when = (now - timedelta(days=r)).isoformat()
+                conn.execute("INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status) VALUES (?, ?, ?, 30, ?)", (patient_id, hospital_id, when, ("Scheduled", "Completed", "Cancelled")[r % 3]))
+                readings.append({"patient_id": patient_id, "hospital_id": hospital_id, "recorded_date": when, "pulse": 70})
+                conn.execute("INSERT INTO reports (patient_id, hospital_id, file_name, upload_date) VALUES (?, ?, 'report.pdf', ?)", (patient_id, hospital_id, when))
+    # Through the ingest path, which also fills vital_rollups
+    items, _ = vitals_ingest.validate_batch(readings, now)
+    vitals_ingest.write_readings(conn, items)
+    conn.execute("ANALYZE")
+
+
+if __name__ == "__main__":
+    # python queries.py: fail if any production query regresses to a table scan
+    # (the same check runs under pytest, tests/test_query_plans.py)
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = ConnectionManager(os.path.join(directory, "plans.db"))
+        apply_migrations(db)
+        with db.write() as conn:
+            seed_plan_database(conn)
+        with db.read() as conn:
+            scans = find_table_scans(conn)
+        db.close()
+    for name, plan in scans.items():
+        print(f"{name}: {' | '.join(plan)}")
+    print(f"{len(production_queries())} queries checked, {len(scans)} with table scans")
+    sys.exit(1 if scans else 0)
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Per-user read models for the pages: the rows, counts and frames a view renders,
+# keyed by what they depend on (patient, hospital, filters, page cursor).
+#
+# An entry is served from memory while both hold:
+#   - nothing was written through this process's ConnectionManager since it was
+#     loaded (db.generation is unchanged), and
+#   - it is younger than the TTL, which bounds staleness for writes made by other
+#     processes (the vitals ingest server, command-line imports).
+# A rerun whose read models are all cached never touches the database.
+
+TTL_SECONDS = 30
+MAX_ENTRIES = 4096
+
+
+class ReadModelCache:
+    def __init__(self, db, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (generation, loaded_at, value), least recently used first
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, load):
+        """The cached value for `key`, or load(conn) on a pooled read connection.
+
+        Values are shared between sessions and must not be modified by callers.
+        """
+        # Read before loading, so a write that commits meanwhile invalidates the entry
+        generation = self.db.generation
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[2]
+            self.stats["misses"] += 1
+        with self.db.read() as conn:
+            value = load(conn)
+        with self._lock:
+            self._entries[key] = (generation, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
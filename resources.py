@@ -0,0 +1,85 @@
+import streamlit as st
+
+import passwords
+import profiling
+import readmodels
+from archive import Archive, archive_dir_for
+from blobstore import BlobStore, blob_dir_for
+from db import ConnectionManager, WriteQueue
+from migrations import apply_migrations
+
+# Process-wide resources of the app, created on first use and shared by every
+# session. They live outside Healthrecords.py so that a rerun, which executes
+# that script again, does not redefine (and re-hash) their cached functions.
+
+DB_FILE = "data/trackmyhealth.db"
+
+METRICS_FILE = "data/metrics.json"
+
+# Shared connection manager, created once per process and reused across reruns.
+# Schema migrations run here, so they happen once at process start, not per rerun.
+@st.cache_resource
+def get_db():
+    db = ConnectionManager(DB_FILE, factory=profiling.ProfiledConnection)
+    apply_migrations(db)
+    return db
+
+# Page mutations go through one writer thread, which commits whatever the
+# sessions queued meanwhile together (db.WriteQueue)
+WRITE_TIMEOUT = 30
+
+@st.cache_resource
+def get_write_queue():
+    return WriteQueue(get_db())
+
+def run_write(fn, *args, timeout=WRITE_TIMEOUT):
+    """Run fn(conn, *args) in the next group commit; returns its result or raises its error.
+
+    db.WriteTimeout (an sqlite3.Error) if the job could not start within `timeout`
+    seconds; it is then withdrawn, so nothing was written. None waits indefinitely.
+    """
+    return get_write_queue().call(fn, *args, timeout=timeout)
+
+# Render timings and SQL statistics per page, written to METRICS_FILE periodically
+@st.cache_resource
+def get_profiler():
+    return profiling.Profiler(METRICS_FILE)
+
+# Report files, stored by content hash next to the database
+@st.cache_resource
+def get_blob_store():
+    return BlobStore(blob_dir_for(DB_FILE))
+
+# Vital signs and appointments older than the archive horizon, moved out of the
+# live tables by archive.py; read when a history range reaches them
+@st.cache_resource
+def get_archive():
+    return Archive(archive_dir_for(DB_FILE))
+
+# Authentication: scrypt, calibrated once per process, on a bounded worker pool (passwords.py)
+@st.cache_resource
+def get_hasher():
+    return passwords.Hasher()
+
+def hash_password(password):
+    return get_hasher().hash(password)
+
+# Clinical rules, compiled once per process; results are cached until medical_history changes
+@st.cache_resource
+def get_rule_cache():
+    import rules  # pandas; only pages that evaluate rules need it
+
+    return rules.RuleCache(rules.load_rules())
+
+# Columnar snapshot of appointments, hospitals and medical histories for admin
+# reporting, exported incrementally in the background (analytics.py)
+@st.cache_resource
+def get_analytics():
+    import analytics  # pyarrow; only the admin dashboard needs it
+
+    return analytics.Snapshot(get_db(), analytics.snapshot_dir_for(DB_FILE), archive=get_archive())
+
+# What the pages render, per user; see readmodels.py for when entries are reused
+@st.cache_resource
+def get_read_models():
+    return readmodels.ReadModelCache(get_db())
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+from collections import deque
+
+import pandas as pd
+
+# Clinical rule engine for treatment suggestions and health tips.
+#
+# Rules are data (rules.json): each names a kind ("treatment" or "tip"), a
+# priority, the text to show and structured conditions on the patient's medical
+# history, e.g.
+#
+#   "when": {"conditions": {"any": ["hypertension"]},
+#            "allergies": {"none": ["lisinopril"]},
+#            "blood_type": ["O-"]}
+#
+# Every keyword of every rule is compiled into one Aho-Corasick automaton, so a
+# history field is scanned once however many rules there are; only rules
+# anchored on a keyword that was found (plus rules with no positive keyword) are
+# then checked. Keywords match whole words, case-insensitively.
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+KINDS = ("treatment", "tip")
+# Rule field -> medical_history column
+FIELDS = {"allergies": "allergies", "conditions": "chronic_conditions", "surgeries": "surgeries", "family_history": "family_history"}
+
+HISTORY_COLUMNS = "patient_id, blood_type, allergies, chronic_conditions, surgeries, family_history"
+PATIENT_RULE_HISTORY = f"SELECT {HISTORY_COLUMNS} FROM medical_history WHERE patient_id = ?"
+PATIENT_HOSPITAL_RULE_HISTORY = f"SELECT {HISTORY_COLUMNS} FROM medical_history WHERE patient_id = ? AND hospital_id = ?"
+HOSPITAL_RULE_HISTORY = f"SELECT {HISTORY_COLUMNS} FROM medical_history WHERE hospital_id = ?"
+MEDICAL_HISTORY_VERSION = "SELECT version FROM data_versions WHERE name = 'medical_history'"
+
+
+class Automaton:
+    """Aho-Corasick matcher over a fixed keyword list; find() returns keyword indexes."""
+
+    def __init__(self, keywords):
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        for index, keyword in enumerate(keywords):
+            node = 0
+            for ch in keyword:
+                if ch not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = len(self._goto) - 1
+                node = self._goto[node][ch]
+            self._out[node].append((index, len(keyword)))
+        # Breadth-first failure links; each node also inherits its fallback's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        found, node, last = set(), 0, len(text) - 1
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index, length in out[node]:
+                start = i - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (i == last or not text[i + 1].isalnum()):
+                    found.add(index)
+        return found
+
+
+class Rule:
+    def __init__(self, spec, keyword_index):
+        self.id = spec["id"]
+        self.kind = spec["kind"]
+        if self.kind not in KINDS:
+            raise ValueError(f"rule {self.id}: unknown kind {self.kind!r}")
+        self.priority = spec.get("priority", 100)
+        self.title = spec.get("title", self.id)
+        self.text = spec["text"]
+        when = dict(spec.get("when", {}))
+        blood_types = when.pop("blood_type", None)
+        self.blood_types = frozenset(blood_types) if blood_types else None
+        # field -> (any, all, none) as sets of keyword indexes
+        self.conditions = {}
+        for field, condition in when.items():
+            if field not in FIELDS:
+                raise ValueError(f"rule {self.id}: unknown field {field!r}")
+            self.conditions[field] = tuple(frozenset(keyword_index(field, k) for k in condition.get(part, [])) for part in ("any", "all", "none"))
+
+    def anchors(self):
+        """(field, keyword) pairs, one of which must be present for the rule to match."""
+        for field, (any_of, all_of, _) in self.conditions.items():
+            # One required keyword is enough to find the rule
+            if all_of:
+                return [(field, next(iter(all_of)))]
+            if any_of:
+                return [(field, k) for k in any_of]
+        return []
+
+    def matches(self, hits, blood_type):
+        if self.blood_types is not None and blood_type not in self.blood_types:
+            return False
+        for field, (any_of, all_of, none_of) in self.conditions.items():
+            found = hits.get(field, ())
+            if any_of and not any_of & found or all_of - found or none_of & found:
+                return False
+        return True
+
+
+class RuleEngine:
+    def __init__(self, specs, defaults=None):
+        self.defaults = defaults or {}
+        keywords, self._keyword_ids = [], {}
+
+        def keyword_index(field, keyword):
+            # Automaton patterns are shared between fields; hits are tracked per field
+            keyword = keyword.lower().strip()
+            if keyword not in self._keyword_ids:
+                self._keyword_ids[keyword] = len(keywords)
+                keywords.append(keyword)
+            return self._keyword_ids[keyword]
+
+        self.rules = sorted((Rule(spec, keyword_index) for spec in specs), key=lambda r: (r.priority, r.id))
+        self.automaton = Automaton(keywords)
+        self._by_anchor, self._unanchored = {}, []
+        for position, rule in enumerate(self.rules):
+            anchors = rule.anchors()
+            for anchor in anchors:
+                self._by_anchor.setdefault(anchor, []).append(position)
+            if not anchors:
+                self._unanchored.append(position)
+
+    def _match(self, hits, blood_type):
+        candidates = set(self._unanchored)
+        for field, found in hits.items():
+            for keyword in found:
+                candidates.update(self._by_anchor.get((field, keyword), ()))
+        return [self.rules[p] for p in sorted(candidates) if self.rules[p].matches(hits, blood_type)]
+
+    def evaluate(self, record):
+        """Matching rules, in priority order, for one history record (medical_history column names)."""
+        hits = {field: self.automaton.find(record.get(column) or "") for field, column in FIELDS.items()}
+        return self._match(hits, record.get("blood_type"))
+
+    def evaluate_text(self, text, kind):
+        """Rules of `kind` whose keywords occur in free text, e.g. a general health question."""
+        found = self.automaton.find(text)
+        hits = {field: found for field in FIELDS}
+        return [rule for rule in self._match(hits, None) if rule.kind == kind and rule.blood_types is None]
+
+    def evaluate_frame(self, df):
+        """One row per (patient_id, matching rule) for a frame of medical_history rows.
+
+        Each distinct field value is scanned once and each distinct combination
+        of values is evaluated once, so shared entries ("None", "Penicillin")
+        cost nothing extra however many patients have them.
+        """
+        fields = list(FIELDS.items())
+        codes, hits = [], []
+        for field, column in fields:
+            column_codes, uniques = pd.factorize(df[column].fillna(""))
+            codes.append(column_codes)
+            hits.append([self.automaton.find(value) for value in uniques])
+        blood_codes, blood_types = pd.factorize(df["blood_type"].fillna(""))
+        blood_types = blood_types.tolist()
+        matched, results = {}, []
+        for key in zip(blood_codes, *codes):
+            ids = matched.get(key)
+            if ids is None:
+                found = {field: hits[position][code] for position, ((field, _), code) in enumerate(zip(fields, key[1:]))}
+                ids = matched[key] = [rule.id for rule in self._match(found, blood_types[key[0]] or None)]
+            results.append(ids)
+        result = pd.DataFrame({"patient_id": df["patient_id"].to_numpy(), "rule_id": results}).explode("rule_id").dropna()
+        rules = pd.DataFrame([(r.id, r.kind, r.priority, r.title) for r in self.rules], columns=["rule_id", "kind", "priority", "title"])
+        return result.merge(rules, on="rule_id").sort_values(["patient_id", "priority"], ignore_index=True)
+
+    def render(self, rules, kind):
+        texts = [rule.text for rule in rules if rule.kind == kind]
+        return "<br>".join(texts) if texts else self.defaults.get(kind, "")
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    return RuleEngine(document["rules"], document.get("defaults"))
+
+
+def combine_history(rows):
+    """Merge a patient's medical_history rows (one per hospital) into one record."""
+    record = {"blood_type": next((row[1] for row in rows if row[1]), None)}
+    for position, column in enumerate(FIELDS.values(), start=2):
+        record[column] = "; ".join(row[position] for row in rows if row[position])
+    return record
+
+
+class RuleCache:
+    """Rule results per patient and per hospital, dropped whenever medical_history changes.
+
+    Triggers on medical_history bump data_versions (migration 11); every lookup
+    reads that one row and starts afresh if it moved.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def _cached(self, conn, key, compute):
+        version = conn.execute(MEDICAL_HISTORY_VERSION).fetchone()[0]
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            if self._version == version:
+                self._entries[key] = value
+        return value
+
+    def patient(self, conn, patient_id, hospital_id=None):
+        """Matching rules for a patient, across all hospitals unless one is given."""
+        def compute():
+            if hospital_id is None:
+                rows = conn.execute(PATIENT_RULE_HISTORY, (patient_id,)).fetchall()
+            else:
+                rows = conn.execute(PATIENT_HOSPITAL_RULE_HISTORY, (patient_id, hospital_id)).fetchall()
+            return self.engine.evaluate(combine_history(rows)) if rows else []
+        return self._cached(conn, ("patient", patient_id, hospital_id), compute)
+
+    def hospital(self, conn, hospital_id):
+        """evaluate_frame over every medical_history row the hospital holds."""
+        def compute():
+            return self.engine.evaluate_frame(pd.read_sql_query(HOSPITAL_RULE_HISTORY, conn, params=[hospital_id]))
+        return self._cached(conn, ("hospital", hospital_id), compute)
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    return {"RULES_PATIENT_HISTORY": PATIENT_RULE_HISTORY, "RULES_PATIENT_HOSPITAL_HISTORY": PATIENT_HOSPITAL_RULE_HISTORY, "RULES_HOSPITAL_HISTORY": HOSPITAL_RULE_HISTORY, "RULES_MEDICAL_HISTORY_VERSION": MEDICAL_HISTORY_VERSION}
@@ -0,0 +1,82 @@
+import difflib
+
+# Patient search for hospital staff, over the FTS5 indexes that triggers keep
+# current (migration 13).
+#
+# The trigram tokenizer matches any substring of MIN_TERM or more characters, so
+# "smi", "mith", "PAT_3f" or "555-01" find their patients while the word is still
+# being typed; the words of a query are ANDed. Matches are joined, through their
+# docid, to the hospital's patients (hospital_patients) and ranked by bm25 with
+# the name weighted far above contact details and history, so the `limit` kept
+# are the best matches, e.g. a patient named "Smith" ahead of a smith.com email.
+# Ranking reads every match of the query words once, so a short common prefix
+# costs a pass over all of its matches: about 0.1 s for three letters of a
+# common surname among 200,000 patients (benchmarks/bench_search.py).
+#
+# When nothing matches, misspellings are looked up in name_words_search, the
+# trigram index of distinct first and last names, which is small: its entries
+# sharing trigrams with the word (as typed, less one letter, or with two letters
+# swapped) are ranked, and those close to it by difflib's ratio are searched for
+# instead, e.g. "smtih" tries "smith".
+
+MIN_TERM = 3
+SEARCH_LIMIT = 20
+SPELLING_CANDIDATES = 50
+SPELLING_RATIO = 0.75
+MAX_SPELLINGS = 5
+
+# bm25 weights of the patient_search columns: patient_id, name, contact, history
+COLUMN_WEIGHTS = (10.0, 10.0, 1.0, 1.0)
+
+SEARCH_PATIENTS = f"SELECT d.patient_id, s.name FROM patient_search s CROSS JOIN patient_search_docs d ON d.docid = s.rowid CROSS JOIN hospital_patients h ON h.hospital_id = ? AND h.patient_id = d.patient_id WHERE patient_search MATCH ? ORDER BY bm25(patient_search, {', '.join(map(str, COLUMN_WEIGHTS))}) LIMIT ?"
+SIMILAR_NAME_WORDS = "SELECT word FROM name_words_search WHERE name_words_search MATCH ? ORDER BY rank LIMIT ?"
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def terms(text):
+    """Lower-cased words of a query that are long enough to search for."""
+    return [word for word in text.lower().split() if len(word) >= MIN_TERM]
+
+
+def trigram_query(word):
+    """Any trigram of the word, of the word with one letter dropped, or with two neighbours swapped."""
+    variants = {word} | {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1)}
+    if len(word) > MIN_TERM:
+        variants |= {word[:i] + word[i + 1:] for i in range(len(word))}
+    return " OR ".join(_quote(gram) for gram in sorted({v[i:i + 3] for v in variants for i in range(len(v) - 2)}))
+
+
+def spellings(conn, word):
+    """Known name words close to `word`, best first."""
+    candidates = [row[0] for row in conn.execute(SIMILAR_NAME_WORDS, (trigram_query(word), SPELLING_CANDIDATES))]
+    scored = sorted(((difflib.SequenceMatcher(None, word, candidate).ratio(), candidate) for candidate in candidates if candidate != word), reverse=True)
+    return [candidate for ratio, candidate in scored[:MAX_SPELLINGS] if ratio >= SPELLING_RATIO]
+
+
+def _relevance(words, name):
+    # Name matches first, those starting with the query words ahead of the rest;
+    # the sort is stable, so bm25 order decides among equals
+    name = name.lower()
+    return (-sum(word in name for word in words), -sum(any(part.startswith(word) for part in name.split()) for word in words))
+
+
+def search_patients(conn, hospital_id, text, limit=SEARCH_LIMIT):
+    """[(patient_id, name)] of the hospital's patients matching `text`; [] if no word is long enough."""
+    words = terms(text)
+    if not words:
+        return []
+    results = conn.execute(SEARCH_PATIENTS, (hospital_id, " AND ".join(_quote(word) for word in words), limit)).fetchall()
+    if not results:
+        alternatives = [[word] + spellings(conn, word) for word in words]
+        if any(len(options) > 1 for options in alternatives):
+            query = " AND ".join("(" + " OR ".join(_quote(option) for option in options) + ")" for options in alternatives)
+            results = conn.execute(SEARCH_PATIENTS, (hospital_id, query, limit)).fetchall()
+    return sorted(results, key=lambda row: _relevance(words, row[1]))
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    return {"SEARCH_PATIENTS": SEARCH_PATIENTS, "SEARCH_SIMILAR_NAME_WORDS": SIMILAR_NAME_WORDS}
@@ -0,0 +1,195 @@
+import argparse
+import random
+from datetime import date, datetime, time, timedelta
+
+import passwords
+import patient_import
+import queries
+import vitals_ingest
+from appointments import CANCELLED, COMPLETED, NO_SHOW, SCHEDULED
+
+# Deterministic synthetic data for benchmarks and load tests.
+#
+# generate() adds `hospitals` approved hospitals and `patients` patients spread
+# over them, each patient with `appointments` appointments, `vitals` vital-sign
+# readings and about `reports` uploaded reports of `report_kb` KB. The same seed
+# and `today` always produce the same rows and report files.
+#
+# Rows go in through the application's own write paths so that everything the
+# triggers and ingest path maintain is filled as in production: patients use
+# patient_import's statements (search index, hospital membership), vitals go
+# through vitals_ingest (vital_rollups), appointments fire the dashboard counter
+# triggers and reports are stored in the blob store. Bookings are not checked
+# against hospital capacity.
+#
+# Accounts: synth.hospital.<n> / HOSPITAL_PASSWORD and synth.patient.<n> /
+# patient_import.DEFAULT_PASSWORD, numbered from 0.
+
+HOSPITAL_PASSWORD = "hospital123"
+BATCH_PATIENTS = 2_000
+HISTORY_DAYS = 365
+BOOKING_DAYS = 60
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+               "Thomas", "Sarah", "Charles", "Karen", "Daniel", "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Sandra", "Steven", "Ashley", "Paul", "Emily", "Andrew", "Donna",
+               "Joshua", "Michelle", "Kevin", "Carol", "Brian", "Amanda", "Priya", "Wei", "Fatima", "Mohammed", "Olga", "Hiroshi", "Amara", "Diego", "Ingrid", "Kwame"]
+SURNAME_STARTS = ["Smith", "John", "Will", "Brown", "Jon", "Gar", "Mill", "Dav", "Rod", "Mart", "Hern", "Lop", "Gonz", "Wil", "And", "Thom", "Tay", "Moor", "Jack", "Lee",
+                  "Harr", "Clar", "Lew", "Walk", "Hall", "Allen", "Young", "King", "Wright", "Scott", "Green", "Bak", "Adams", "Nel", "Hill", "Camp", "Mitch", "Rob", "Cart", "Phill"]
+SURNAME_ENDINGS = ["", "son", "ington", "ford", "ez", "er", "ley", "man", "ton", "well", "wood", "berg", "ston", "ridge", "field"]
+GENDERS = ["Male", "Female", "Other"]
+ALLERGIES = ["Penicillin", "Pollen", "Peanuts", "Latex", "Shellfish", "Sulfa drugs"]
+CONDITIONS = ["Hypertension", "Diabetes", "Asthma", "Arthritis", "Migraine", "COPD", "Hypothyroidism"]
+REASONS = ["Check-up", "Follow-up", "Consultation", "Vaccination", "Blood test", "Physiotherapy"]
+INSERT_HOSPITAL_USER = "INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, 'hospital', ?, ?, ?, ?)"
+INSERT_HOSPITAL = "INSERT INTO hospitals (id, user_id, name, address, phone, email, status, capacity, slot_minutes, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'approved', ?, 15, ?, ?)"
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, reason, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def hospital_id(n):
+    return f"HOS_SYN{n:06d}"
+
+
+def patient_id(n):
+    return f"PAT_SYN{n:08d}"
+
+
+def hospital_username(n):
+    return f"synth.hospital.{n}"
+
+
+def patient_username(n):
+    return f"synth.patient.{n}"
+
+
+def patient_hospital(n, hospitals):
+    """Index of the hospital patient `n` is registered with."""
+    return n % hospitals
+
+
+def _count(rng, mean):
+    # Whole part always, the fraction with that probability: mean 0.3 gives 0 or 1
+    whole = int(mean)
+    return whole + (rng.random() < mean - whole)
+
+
+def _patient(rng, n):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(SURNAME_STARTS) + rng.choice(SURNAME_ENDINGS)
+    born = date(1930, 1, 1) + timedelta(days=rng.randrange(90 * 365))
+    return {
+        "first_name": first, "last_name": last, "date_of_birth": born.isoformat(), "gender": rng.choice(GENDERS),
+        "phone": f"555-{rng.randrange(10_000_000):07d}", "email": f"{first}.{last}.{n}@example.com".lower(), "address": f"{rng.randrange(1, 9999)} {rng.choice(SURNAME_STARTS)} Street",
+        "blood_type": rng.choice(patient_import.BLOOD_TYPES),
+        "allergies": ", ".join(rng.sample(ALLERGIES, rng.choice([0, 0, 1, 1, 2]))),
+        "chronic_conditions": ", ".join(rng.sample(CONDITIONS, rng.choice([0, 0, 1, 1, 2]))),
+    }
+
+
+def _appointments(rng, pid, hid, count, today, created):
+    rows = []
+    for _ in range(count):
+        day = today + timedelta(days=rng.randrange(-HISTORY_DAYS, BOOKING_DAYS))
+        begins = datetime.combine(day, time(9)) + timedelta(minutes=15 * rng.randrange(32))
+        if day < today:
+            status = rng.choices([COMPLETED, NO_SHOW, CANCELLED], weights=[80, 10, 10])[0]
+        else:
+            status = rng.choices([SCHEDULED, CANCELLED], weights=[90, 10])[0]
+        rows.append((pid, hid, begins.isoformat(), rng.choice([15, 30, 30, 45, 60]), status, rng.choice(REASONS), created, created))
+    return rows
+
+
+def _readings(rng, pid, hid, count, now):
+    readings = []
+    height = rng.uniform(58, 76)
+    weight = rng.uniform(100, 260)
+    for i in range(count):
+        recorded = now - timedelta(days=HISTORY_DAYS) + timedelta(seconds=HISTORY_DAYS * 86_400 * (i + rng.random()) / count)
+        readings.append({
+            "patient_id": pid, "hospital_id": hid, "recorded_date": recorded.isoformat(timespec="seconds"),
+            "temperature": round(rng.gauss(98.4, 0.7), 1), "systolic": round(rng.gauss(122, 14)), "diastolic": round(rng.gauss(79, 9)),
+            "pulse": round(rng.gauss(74, 10)), "respiratory_rate": round(rng.gauss(16, 2)), "oxygen_saturation": round(min(100.0, rng.gauss(97.5, 1.5)), 1),
+            "weight": round(weight + rng.gauss(0, 2), 1), "height": round(height, 1), "recorded_by": "synthetic",
+        })
+    return readings
+
+
+def generate(db, blob_store, hospitals=10, patients=1_000, appointments=5, vitals=20, reports=0.5, report_kb=64, seed=0, today=None, progress=None):
+    """Add a synthetic dataset; returns row counts per table.
+
+    `progress`, if given, is called with the number of patients written after each batch.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    # Timestamps are derived from `today`, so reruns on the same day are identical
+    now = datetime.combine(today, time(8))
+    created = now.isoformat()
+    counts = {"hospitals": hospitals, "patients": patients, "appointments": 0, "vital_signs": 0, "reports": 0, "report_bytes": 0}
+    # One shared hash per password for every account, as patient_import does
+    hospital_hash = passwords.shared_hash(HOSPITAL_PASSWORD)
+    patient_hash = passwords.shared_hash(patient_import.DEFAULT_PASSWORD)
+    with db.write() as conn:
+        for h in range(hospitals):
+            user_id = f"USR_HOS_SYN{h:06d}"
+            name = f"{rng.choice(SURNAME_STARTS)}{rng.choice(SURNAME_ENDINGS)} General Hospital {h}"
+            email = f"contact{h}@hospital.example.com"
+            conn.execute(INSERT_HOSPITAL_USER, (user_id, hospital_username(h), hospital_hash, name, email, created, created))
+            conn.execute(INSERT_HOSPITAL, (hospital_id(h), user_id, name, f"{rng.randrange(1, 999)} Health Avenue", f"555-{rng.randrange(10_000_000):07d}", email, rng.choice([1, 2, 4]), created, created))
+    for first in range(0, patients, BATCH_PATIENTS):
+        numbers = range(first, min(first + BATCH_PATIENTS, patients))
+        users, rows, contacts, histories, bookings, readings, files = [], [], [], [], [], [], []
+        for n in numbers:
+            record = _patient(rng, n)
+            pid, hid, user_id = patient_id(n), hospital_id(patient_hospital(n, hospitals)), f"USR_PAT_SYN{n:08d}"
+            users.append((user_id, patient_username(n), patient_hash, f"{record['first_name']} {record['last_name']}", record["email"], created, created))
+            rows.append((pid, user_id, record["first_name"], record["last_name"], record["date_of_birth"], record["gender"], created, created))
+            contacts.append((pid, record["phone"], record["email"], record["address"], created, created))
+            histories.append((pid, hid, record["blood_type"], record["allergies"] or None, record["chronic_conditions"] or None, created, created))
+            bookings += _appointments(rng, pid, hid, _count(rng, appointments), today, created)
+            readings += _readings(rng, pid, hid, _count(rng, vitals), now)
+            for r in range(_count(rng, reports)):
+                size = max(1, int(rng.expovariate(1 / (report_kb * 1024))))
+                digest, size = blob_store.put_chunks([rng.randbytes(size)])
+                files.append((pid, hid, f"report_{n}_{r}.pdf", digest, size, created, created, created))
+                counts["report_bytes"] += size
+        items, errors = vitals_ingest.validate_batch(readings, now)
+        with db.write() as conn:
+            conn.executemany(patient_import.INSERT_USER, users)
+            conn.executemany(patient_import.INSERT_CONTACT, contacts)
+            conn.executemany(patient_import.INSERT_HISTORY, histories)
+            # Patients after their contacts and histories, as in patient_import
+            conn.executemany(patient_import.INSERT_PATIENT, rows)
+            conn.executemany(INSERT_APPOINTMENT, bookings)
+            if items:
+                vitals_ingest.write_readings(conn, items)
+            conn.executemany(queries.INSERT_REPORT, files)
+        counts["appointments"] += len(bookings)
+        counts["vital_signs"] += len(items)
+        counts["reports"] += len(files)
+        if progress:
+            progress(numbers[-1] + 1)
+    return counts
+
+
+if __name__ == "__main__":
+    # python synthetic.py --db data/trackmyhealth.db --hospitals 10 --patients 1000
+    from blobstore import BlobStore, blob_dir_for
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Fill a database with deterministic synthetic data")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--hospitals", type=int, default=10)
+    parser.add_argument("--patients", type=int, default=1_000)
+    parser.add_argument("--appointments", type=float, default=5, help="per patient")
+    parser.add_argument("--vitals", type=float, default=20, help="readings per patient")
+    parser.add_argument("--reports", type=float, default=0.5, help="per patient")
+    parser.add_argument("--report-kb", type=float, default=64, help="mean report size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    counts = generate(db, BlobStore(blob_dir_for(args.db)), args.hospitals, args.patients, args.appointments, args.vitals, args.reports, args.report_kb, args.seed,
+                      progress=lambda done: print(f"{done:,} / {args.patients:,} patients", end="\r"))
+    db.close()
+    print()
+    print(", ".join(f"{count:,} {name.replace('_', ' ')}" for name, count in counts.items()))
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, as the benchmarks import them
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import ConnectionManager  # noqa: E402
+from migrations import apply_migrations  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A freshly migrated database in the test's temporary directory."""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    apply_migrations(manager)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def hospital_id(db):
+    """The approved hospital migration 1 seeds."""
+    with db.read() as conn:
+        return conn.execute("SELECT id FROM hospitals").fetchone()[0]
+
+
+@pytest.fixture
+def patient_id(db):
+    """The patient migration 1 seeds."""
+    with db.read() as conn:
+        return conn.execute("SELECT id FROM patients").fetchone()[0]
@@ -0,0 +1,161 @@
+import json
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import pytest
+
+import api
+
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status, updated_at) VALUES (?, ?, ?, 30, 'Scheduled', ?) RETURNING id"
+INSERT_HISTORY = "INSERT INTO medical_history (patient_id, hospital_id, blood_type, uploaded_at, updated_at) VALUES (?, ?, 'A+', ?, ?) RETURNING id"
+
+
+@pytest.fixture
+def tokens(db):
+    return {username: api.issue_token(db, username) for username in ("admin", "patient1", "hospital1")}
+
+
+def get(db, target, token=None, etag=None, method="GET"):
+    headers = {}
+    if token:
+        headers["authorization"] = f"Bearer {token}"
+    if etag:
+        headers["if-none-match"] = etag
+    status, reply_headers, body = api._respond(db, method, target, headers)
+    return status, dict(reply_headers), json.loads(body) if body else None
+
+
+def add_appointments(db, patient_id, hospital_id, count, start=datetime(2030, 1, 7, 9)):
+    with db.write() as conn:
+        return [conn.execute(INSERT_APPOINTMENT, (patient_id, hospital_id, (start + timedelta(hours=n)).isoformat(), datetime.now().isoformat())).fetchone()[0] for n in range(count)]
+
+
+def collect(db, target, token, limit):
+    ids, after = [], None
+    while True:
+        status, _, body = get(db, f"{target}?limit={limit}" + (f"&after={after}" if after else ""), token)
+        assert status == 200
+        assert len(body["items"]) <= limit
+        ids.extend(item["id"] for item in body["items"])
+        after = body["next"]
+        if after is None:
+            return ids
+
+
+def test_requests_need_a_valid_token(db, patient_id):
+    status, headers, body = get(db, f"/patients/{patient_id}")
+    assert status == 401
+    assert headers["WWW-Authenticate"] == "Bearer"
+    assert get(db, f"/patients/{patient_id}", "bogus")[0] == 401
+
+
+def test_revoked_tokens_stop_working(db, patient_id, tokens):
+    assert get(db, f"/patients/{patient_id}", tokens["patient1"])[0] == 200
+    api.revoke_tokens(db, "patient1")
+    assert get(db, f"/patients/{patient_id}", tokens["patient1"])[0] == 401
+
+
+def test_patient_reads_only_its_own_records(db, patient_id, tokens):
+    status, _, body = get(db, f"/patients/{patient_id}", tokens["patient1"])
+    assert status == 200
+    assert body["id"] == patient_id
+    assert get(db, "/patients/PAT_OTHER", tokens["patient1"])[0] == 404
+    assert get(db, "/patients/PAT_OTHER", tokens["admin"])[0] == 404
+
+
+def test_hospital_sees_only_its_own_rows(db, patient_id, hospital_id, tokens):
+    own = add_appointments(db, patient_id, hospital_id, 2)
+    add_appointments(db, patient_id, "HOS_OTHER", 2)
+    add_appointments(db, "PAT_OTHER", "HOS_OTHER", 1)
+    hospital_ids = collect(db, f"/patients/{patient_id}/appointments", tokens["hospital1"], 50)
+    assert set(own) <= set(hospital_ids)
+    with db.read() as conn:
+        assert hospital_ids == [row[0] for row in conn.execute("SELECT id FROM appointments WHERE patient_id = ? AND hospital_id = ? ORDER BY appointment_date DESC, id DESC", (patient_id, hospital_id))]
+    assert len(collect(db, f"/patients/{patient_id}/appointments", tokens["patient1"], 50)) == len(hospital_ids) + 2
+    assert get(db, "/patients/PAT_OTHER/appointments", tokens["hospital1"])[0] == 404
+
+
+def test_unapproved_hospitals_are_refused(db, patient_id, tokens):
+    with db.write() as conn:
+        conn.execute("UPDATE hospitals SET status = 'pending'")
+    assert get(db, f"/patients/{patient_id}", tokens["hospital1"])[0] == 401
+
+
+@pytest.mark.parametrize("limit", [1, 3, 10])
+def test_pages_are_newest_first_without_gaps(db, patient_id, hospital_id, tokens, limit):
+    add_appointments(db, patient_id, hospital_id, 9)
+    with db.read() as conn:
+        expected = [row[0] for row in conn.execute("SELECT id FROM appointments WHERE patient_id = ? ORDER BY appointment_date DESC, id DESC", (patient_id,))]
+    assert collect(db, f"/patients/{patient_id}/appointments", tokens["patient1"], limit) == expected
+
+
+def test_undated_rows_come_last(db, patient_id, hospital_id, tokens):
+    with db.write() as conn:
+        conn.execute("DELETE FROM medical_history")
+        dated = [conn.execute(INSERT_HISTORY, (patient_id, hospital_id, f"2030-01-0{n}", None)).fetchone()[0] for n in (1, 2, 3)]
+        undated = [conn.execute(INSERT_HISTORY, (patient_id, hospital_id, None, None)).fetchone()[0] for _ in range(3)]
+    expected = dated[::-1] + undated[::-1]
+    for limit in (1, 2, 4):
+        assert collect(db, f"/patients/{patient_id}/history", tokens["patient1"], limit) == expected
+
+
+def test_collection_etag_revalidates(db, patient_id, hospital_id, tokens):
+    target = f"/patients/{patient_id}/appointments"
+    status, headers, _ = get(db, target, tokens["patient1"])
+    etag = headers["ETag"]
+    assert status == 200
+    assert headers["Cache-Control"] == api.CACHE_CONTROL
+    status, headers, body = get(db, target, tokens["patient1"], etag)
+    assert (status, headers["ETag"], body) == (304, etag, None)
+    # Another page or another viewer is another representation
+    assert get(db, target + "?limit=1", tokens["patient1"], etag)[0] == 200
+    assert get(db, target, tokens["hospital1"], etag)[0] == 200
+    (appointment_id,) = add_appointments(db, patient_id, hospital_id, 1)
+    status, headers, _ = get(db, target, tokens["patient1"], etag)
+    assert status == 200 and headers["ETag"] != etag
+    etag = headers["ETag"]
+    with db.write() as conn:
+        conn.execute("UPDATE appointments SET status = 'Cancelled', updated_at = ? WHERE id = ?", ((datetime.now() + timedelta(seconds=1)).isoformat(), appointment_id))
+    assert get(db, target, tokens["patient1"], etag)[0] == 200
+
+
+def test_patient_etag_follows_updates(db, patient_id, tokens):
+    target = f"/patients/{patient_id}"
+    etag = get(db, target, tokens["patient1"])[1]["ETag"]
+    assert get(db, target, tokens["patient1"], etag)[0] == 304
+    with db.write() as conn:
+        conn.execute("UPDATE patients SET last_name = 'Renamed', updated_at = ? WHERE id = ?", (datetime.now().isoformat(), patient_id))
+    status, _, body = get(db, target, tokens["patient1"], etag)
+    assert (status, body["last_name"]) == (200, "Renamed")
+
+
+@pytest.mark.parametrize("target, status", [
+    ("/", 404),
+    ("/patients", 404),
+    ("/hospitals/x", 404),
+    ("/patients/{p}/prescriptions", 404),
+    ("/patients/{p}/vitals/extra", 404),
+    ("/patients/{p}/vitals?limit=x", 400),
+    ("/patients/{p}/vitals?after=!!!", 400),
+])
+def test_bad_requests(db, patient_id, tokens, target, status):
+    assert get(db, target.format(p=patient_id), tokens["admin"])[0] == status
+
+
+def test_only_get_and_head(db, patient_id, tokens):
+    status, headers, _ = get(db, f"/patients/{patient_id}", tokens["admin"], method="POST")
+    assert (status, headers["Allow"]) == (405, "GET, HEAD")
+    assert get(db, f"/patients/{patient_id}", tokens["admin"], method="HEAD")[0] == 200
+
+
+def test_ids_are_percent_decoded(db, tokens):
+    with db.write() as conn:
+        conn.execute("INSERT INTO patients (id, first_name, last_name) VALUES ('PAT/ODD ID', 'Odd', 'Id')")
+    status, _, body = get(db, "/patients/" + quote("PAT/ODD ID", safe=""), tokens["admin"])
+    assert (status, body["first_name"]) == (200, "Odd")
+
+
+def test_unexpected_errors_answer_500(db, patient_id, tokens, monkeypatch):
+    monkeypatch.setattr(api, "_scope", lambda *args: 1 / 0)
+    status, _, body = get(db, f"/patients/{patient_id}", tokens["admin"])
+    assert (status, body) == (500, {"error": "internal error: ZeroDivisionError"})
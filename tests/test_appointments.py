@@ -0,0 +1,72 @@
+from datetime import date, datetime
+
+import pytest
+
+import appointments
+from appointments import CANCELLED, CHECKED_IN, COMPLETED, NO_SHOW, SCHEDULED
+
+INSERT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status) VALUES (?, ?, ?, 30, ?) RETURNING id"
+
+
+def add(db, patient_id, hospital_id, status, when=datetime(2030, 1, 7, 10)):
+    with db.write() as conn:
+        return conn.execute(INSERT, (patient_id, hospital_id, when.isoformat(), status)).fetchone()[0]
+
+
+def status_of(db, appointment_id):
+    with db.read() as conn:
+        return conn.execute("SELECT status FROM appointments WHERE id = ?", (appointment_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize("action, source, target", [
+    ("Check In", SCHEDULED, CHECKED_IN),
+    ("Complete", CHECKED_IN, COMPLETED),
+    ("Cancel", SCHEDULED, CANCELLED),
+    ("Cancel", CHECKED_IN, CANCELLED),
+    ("Mark No-show", SCHEDULED, NO_SHOW),
+])
+def test_allowed_transition(db, patient_id, hospital_id, action, source, target):
+    appointment_id = add(db, patient_id, hospital_id, source)
+    with db.write() as conn:
+        assert appointments.transition(conn, hospital_id, [appointment_id], action) == ([appointment_id], [])
+    assert status_of(db, appointment_id) == target
+
+
+@pytest.mark.parametrize("action, source", [
+    ("Complete", SCHEDULED),
+    ("Check In", CHECKED_IN),
+    ("Check In", COMPLETED),
+    ("Cancel", COMPLETED),
+    ("Cancel", NO_SHOW),
+    ("Mark No-show", CHECKED_IN),
+    ("Mark No-show", CANCELLED),
+])
+def test_disallowed_transition_is_skipped(db, patient_id, hospital_id, action, source):
+    appointment_id = add(db, patient_id, hospital_id, source)
+    with db.write() as conn:
+        assert appointments.transition(conn, hospital_id, [appointment_id], action) == ([], [appointment_id])
+    assert status_of(db, appointment_id) == source
+
+
+def test_transition_skips_other_hospitals(db, patient_id, hospital_id):
+    appointment_id = add(db, patient_id, hospital_id, SCHEDULED)
+    with db.write() as conn:
+        assert appointments.transition(conn, "HOS_OTHER", [appointment_id], "Cancel") == ([], [appointment_id])
+    assert status_of(db, appointment_id) == SCHEDULED
+
+
+def test_transition_applies_to_the_eligible_subset(db, patient_id, hospital_id):
+    scheduled = add(db, patient_id, hospital_id, SCHEDULED)
+    completed = add(db, patient_id, hospital_id, COMPLETED)
+    with db.write() as conn:
+        assert appointments.transition(conn, hospital_id, [scheduled, completed], "Cancel") == ([scheduled], [completed])
+
+
+def test_close_out_day(db, patient_id, hospital_id):
+    scheduled = add(db, patient_id, hospital_id, SCHEDULED)
+    checked_in = add(db, patient_id, hospital_id, CHECKED_IN)
+    cancelled = add(db, patient_id, hospital_id, CANCELLED)
+    next_day = add(db, patient_id, hospital_id, SCHEDULED, datetime(2030, 1, 8, 10))
+    with db.write() as conn:
+        assert appointments.close_out_day(conn, hospital_id, date(2030, 1, 7)) == 2
+    assert [status_of(db, i) for i in (scheduled, checked_in, cancelled, next_day)] == [NO_SHOW, COMPLETED, CANCELLED, SCHEDULED]
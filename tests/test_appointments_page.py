@@ -0,0 +1,85 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import data_access
+from data_access import appointment_filters
+
+START = datetime(2030, 1, 7, 9)
+INSERT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status) VALUES (?, ?, ?, 30, ?)"
+
+
+@pytest.fixture
+def booked(db, hospital_id, patient_id):
+    """53 appointments over three days, several sharing a start time, plus one at another hospital."""
+    with db.write() as conn:
+        conn.execute("INSERT INTO patients (id, first_name, last_name) VALUES ('PAT_OTHER', 'Other', 'Patient')")
+        for n in range(53):
+            when = START + timedelta(days=n % 3, minutes=15 * (n // 6))
+            patient = patient_id if n % 2 else "PAT_OTHER"
+            conn.execute(INSERT, (patient, hospital_id, when.isoformat(), "Cancelled" if n % 5 == 0 else "Scheduled"))
+        conn.execute(INSERT, (patient_id, "HOS_OTHER", START.isoformat(), "Scheduled"))
+    return db
+
+
+def expected_ids(db, filters):
+    sql = f"SELECT a.id FROM appointments a WHERE {' AND '.join(filters[0])} ORDER BY a.appointment_date, a.id"
+    with db.read() as conn:
+        return [row[0] for row in conn.execute(sql, filters[1])]
+
+
+def all_pages(db, filters, limit):
+    ids, pages, after = [], 0, None
+    with db.read() as conn:
+        while True:
+            page, after = data_access.appointments_page(conn, filters, after, limit)
+            ids.extend(page["ID"].tolist())
+            pages += 1
+            assert len(page) <= limit
+            if after is None:
+                return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 7, 25, 54, 100])
+def test_pages_cover_every_appointment_once_in_order(booked, hospital_id, limit):
+    filters = appointment_filters(hospital_id)
+    expected = expected_ids(booked, filters)
+    ids, pages = all_pages(booked, filters, limit)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // limit))
+    with booked.read() as conn:
+        assert data_access.count_appointments(conn, filters) == len(expected)
+
+
+@pytest.mark.parametrize("filters", [
+    lambda h, p: appointment_filters(h, date(2030, 1, 8), date(2030, 1, 9)),
+    lambda h, p: appointment_filters(h, status="Cancelled"),
+    lambda h, p: appointment_filters(h, date(2030, 1, 7), date(2030, 1, 10), "Scheduled", p),
+])
+def test_filtered_pages(booked, hospital_id, patient_id, filters):
+    filters = filters(hospital_id, patient_id)
+    expected = expected_ids(booked, filters)
+    assert expected
+    assert all_pages(booked, filters, 4)[0] == expected
+
+
+def test_page_columns(booked, hospital_id):
+    with booked.read() as conn:
+        page, after = data_access.appointments_page(conn, appointment_filters(hospital_id, date(2030, 1, 7)), limit=2)
+    assert list(page.columns) == ["ID", "Patient", "Date", "Time", "Duration (min)", "Status", "Reason"]
+    assert page["Patient"].iloc[0] == "Other Patient"
+    assert (page["Date"].iloc[0], page["Time"].iloc[0]) == (date(2030, 1, 7), "09:00")
+    assert after == ("2030-01-07T09:00:00", int(page["ID"].iloc[-1]))
+
+
+def test_new_earlier_rows_do_not_shift_later_pages(booked, hospital_id, patient_id):
+    filters = appointment_filters(hospital_id)
+    with booked.read() as conn:
+        first, after = data_access.appointments_page(conn, filters, limit=10)
+    with booked.write() as conn:
+        conn.execute(INSERT, (patient_id, hospital_id, (START - timedelta(days=1)).isoformat(), "Scheduled"))
+    with booked.read() as conn:
+        second, _ = data_access.appointments_page(conn, filters, after, limit=10)
+    expected = expected_ids(booked, filters)
+    position = expected.index(first["ID"].iloc[-1])
+    assert second["ID"].tolist() == expected[position + 1:position + 11]
@@ -0,0 +1,138 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import data_access
+import vitals
+from archive import Archive
+
+BEFORE = datetime(2021, 1, 1)
+OLD = datetime(2020, 10, 5, 9)
+INSERT_APPOINTMENT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status) VALUES (?, ?, ?, 30, ?)"
+INSERT_VITALS = "INSERT INTO vital_signs (patient_id, hospital_id, recorded_date, pulse, blood_pressure) VALUES (?, ?, ?, ?, ?)"
+STATUSES = ["Completed", "Cancelled", "No-show", "Completed"]
+
+
+@pytest.fixture
+def populated(db, patient_id, hospital_id):
+    """Old and recent appointments and readings over three archived months (2020-10 to 2020-12)."""
+    with db.write() as conn:
+        for n in range(20):
+            when = (OLD + timedelta(days=4 * n)).isoformat()
+            conn.execute(INSERT_APPOINTMENT, (patient_id, hospital_id, when, STATUSES[n % 4]))
+            conn.execute(INSERT_VITALS, (patient_id, hospital_id, when, 60 + n, f"{110 + n}/{70 + n % 5}"))
+            conn.execute(INSERT_VITALS, ("PAT_OTHER", "HOS_OTHER", when, 80 - n, None))
+        # Still scheduled: stays live however old
+        conn.execute(INSERT_APPOINTMENT, (patient_id, hospital_id, OLD.isoformat(), "Scheduled"))
+        conn.execute(INSERT_APPOINTMENT, (patient_id, hospital_id, "2030-01-07T10:00:00", "Completed"))
+        conn.execute(INSERT_VITALS, (patient_id, hospital_id, "2030-01-07T10:00:00", 70, "120/80"))
+    return db
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return Archive(str(tmp_path / "archive"))
+
+
+def counters(db):
+    with db.read() as conn:
+        return (conn.execute("SELECT * FROM appointment_counts ORDER BY 1, 2, 3").fetchall(),
+                conn.execute("SELECT * FROM hospital_day_counts ORDER BY 1, 2, 3").fetchall())
+
+
+def views(db, archive, patient_id):
+    with db.read() as conn:
+        history = data_access.appointment_history(conn, archive, patient_id, limit=100)
+        series = {patient: vitals.load_series(conn, patient, ["pulse", "systolic", "diastolic"], archive=archive) for patient in (patient_id, "PAT_OTHER")}
+    return history, series
+
+
+def live_count(db, table):
+    with db.read() as conn:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_move_leaves_counters_and_history_unchanged(populated, archive, patient_id):
+    counts = counters(populated)
+    history, series = views(populated, archive, patient_id)
+    appointments, readings = live_count(populated, "appointments"), live_count(populated, "vital_signs")
+    moved = archive.move(populated, BEFORE, batch=5)
+    assert moved == {"vital_signs": 39, "appointments": 20}
+    assert live_count(populated, "appointments") == appointments - 20
+    assert live_count(populated, "vital_signs") == readings - 39
+    assert counters(populated) == counts
+    history_after, series_after = views(populated, archive, patient_id)
+    pd.testing.assert_frame_equal(history_after, history)
+    for patient, (resolution, df) in series.items():
+        assert series_after[patient][0] == resolution
+        pd.testing.assert_frame_equal(series_after[patient][1].astype("float64"), df.astype("float64"), check_freq=False)
+
+
+def test_history_names_hospitals_in_one_lookup(populated, archive, patient_id, hospital_id):
+    with populated.write() as conn:
+        conn.execute(INSERT_APPOINTMENT, (patient_id, "HOS_GONE", "2030-02-01T10:00:00", "Completed"))
+        name = conn.execute("SELECT name FROM hospitals WHERE id = ?", (hospital_id,)).fetchone()[0]
+    archive.move(populated, BEFORE, batch=5)
+    statements = []
+    with populated.read() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            history = data_access.appointment_history(conn, archive, patient_id, limit=100)
+        finally:
+            conn.set_trace_callback(None)
+    # Live and archived rows alike; an unknown hospital keeps its ID
+    assert history["Hospital"].value_counts().to_dict() == {name: 23, "HOS_GONE": 1}
+    assert sum("FROM hospitals" in sql for sql in statements) == 1
+
+
+def test_move_keeps_unsettled_appointments_and_latest_readings(populated, archive, patient_id):
+    archive.move(populated, BEFORE, batch=5)
+    with populated.read() as conn:
+        assert conn.execute("SELECT status FROM appointments WHERE appointment_date < ?", (BEFORE.isoformat(),)).fetchall() == [("Scheduled",)]
+        # PAT_OTHER's readings are all old, the latest stays for the dashboards
+        assert conn.execute("SELECT patient_id, pulse FROM vital_signs WHERE recorded_date < ?", (BEFORE.isoformat(),)).fetchall() == [("PAT_OTHER", 61)]
+
+
+def test_move_compacts_each_month_into_one_part(populated, archive):
+    archive.move(populated, BEFORE, batch=5)
+    with populated.read() as conn:
+        parts = conn.execute("SELECT table_name, month, rows FROM archive_parts ORDER BY 1, 2").fetchall()
+    assert parts == [("appointments", "2020-10", 7), ("appointments", "2020-11", 8), ("appointments", "2020-12", 5),
+                     ("vital_signs", "2020-10", 14), ("vital_signs", "2020-11", 16), ("vital_signs", "2020-12", 9)]
+
+
+def test_moved_rows_reach_the_change_feed_as_archived(populated, archive):
+    with populated.read() as conn:
+        seq = conn.execute("SELECT max(seq) FROM change_log").fetchone()[0]
+    archive.move(populated, BEFORE, batch=5)
+    with populated.read() as conn:
+        operations = conn.execute("SELECT table_name, operation, count(*) FROM change_log WHERE seq > ? GROUP BY 1, 2 ORDER BY 1", (seq,)).fetchall()
+    assert operations == [("appointments", "archive", 20), ("vital_signs", "archive", 39)]
+
+
+def test_archived_rows_are_filtered_like_live_ones(populated, archive, patient_id, hospital_id):
+    archive.move(populated, BEFORE, batch=5)
+    with populated.read() as conn:
+        assert archive.has_rows(conn, "vital_signs", hospital_id="HOS_OTHER")
+        assert not archive.has_rows(conn, "appointments", hospital_id="HOS_OTHER")
+        assert not archive.has_rows(conn, "appointments", hospital_id=hospital_id, start=datetime(2021, 1, 1))
+        november = archive.table(conn, "appointments", ["id", "appointment_date"], patient_id, hospital_id, datetime(2020, 11, 1), datetime(2020, 12, 1))
+        assert november.num_rows == 8
+        assert all("2020-11" <= day < "2020-12" for day in november.column("appointment_date").to_pylist())
+        assert archive.table(conn, "appointments", start=datetime(2025, 1, 1)) is None
+
+
+def test_remove_orphans(populated, archive):
+    archive.move(populated, BEFORE, batch=5)
+    stray = archive.path("vital_signs/2020-10/part-000000000001-1.parquet")
+    open(stray, "wb").close()
+    # The parts compaction replaced, plus the stray file
+    assert archive.remove_orphans(populated) > 1
+    assert not os.path.exists(stray)
+    with populated.read() as conn:
+        known = sorted(archive.path(part) for (part,) in conn.execute("SELECT path FROM archive_parts"))
+    on_disk = sorted(os.path.join(directory, name) for directory, _, names in os.walk(archive.root) for name in names)
+    assert on_disk == known
+    assert archive.remove_orphans(populated) == 0
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+import availability
+from appointments import CANCELLED
+from availability import Schedule, SlotUnavailable
+
+MONDAY = datetime(2030, 1, 7)
+SATURDAY = datetime(2030, 1, 12)
+OTHER_PATIENT = "PAT_OTHER"
+
+
+def book(db, hospital_id, patient_id, begins, duration=30):
+    with db.write() as conn:
+        return availability.book(conn, hospital_id, patient_id, begins, duration, "checkup")
+
+
+def test_book_inserts_a_scheduled_appointment(db, hospital_id, patient_id):
+    appointment_id = book(db, hospital_id, patient_id, MONDAY.replace(hour=10))
+    with db.read() as conn:
+        row = conn.execute("SELECT patient_id, hospital_id, appointment_date, duration, status FROM appointments WHERE id = ?", (appointment_id,)).fetchone()
+    assert row == (patient_id, hospital_id, "2030-01-07T10:00:00", 30, "Scheduled")
+
+
+@pytest.mark.parametrize("begins, duration", [
+    (MONDAY.replace(hour=8, minute=45), 30),      # opens at 09:00
+    (MONDAY.replace(hour=16, minute=45), 30),     # runs past 17:00
+    (SATURDAY.replace(hour=12, minute=45), 30),   # Saturdays close at 13:00
+    (datetime(2030, 1, 13, 10), 30),              # closed on Sundays
+])
+def test_closed_times_are_refused(db, hospital_id, patient_id, begins, duration):
+    with pytest.raises(SlotUnavailable, match="closed"):
+        book(db, hospital_id, patient_id, begins, duration)
+
+
+@pytest.mark.parametrize("duration", [0, -15, availability.MAX_DURATION_MINUTES + 1])
+def test_duration_limits(db, hospital_id, patient_id, duration):
+    with pytest.raises(SlotUnavailable, match="between 1 and"):
+        book(db, hospital_id, patient_id, MONDAY.replace(hour=10), duration)
+
+
+def test_full_slot_is_refused(db, hospital_id, patient_id):
+    book(db, hospital_id, patient_id, MONDAY.replace(hour=10), 30)
+    # Overlaps the last cell of the first booking
+    with pytest.raises(SlotUnavailable, match="fully booked"):
+        book(db, hospital_id, OTHER_PATIENT, MONDAY.replace(hour=10, minute=15), 30)
+    # Starts as the first one ends
+    book(db, hospital_id, OTHER_PATIENT, MONDAY.replace(hour=10, minute=30), 30)
+
+
+def test_capacity_allows_parallel_bookings(db, hospital_id, patient_id):
+    with db.write() as conn:
+        availability.save_schedule(conn, hospital_id, 2, 15, availability.DEFAULT_HOURS)
+    book(db, hospital_id, patient_id, MONDAY.replace(hour=10))
+    book(db, hospital_id, OTHER_PATIENT, MONDAY.replace(hour=10))
+    with pytest.raises(SlotUnavailable, match="fully booked"):
+        book(db, hospital_id, "PAT_THIRD", MONDAY.replace(hour=10))
+
+
+def test_patient_clash_is_refused(db, hospital_id, patient_id):
+    with db.write() as conn:
+        availability.save_schedule(conn, hospital_id, 5, 15, availability.DEFAULT_HOURS)
+    book(db, hospital_id, patient_id, MONDAY.replace(hour=10), 60)
+    with pytest.raises(SlotUnavailable, match="already have"):
+        book(db, hospital_id, patient_id, MONDAY.replace(hour=10, minute=45), 30)
+
+
+def test_cancelled_bookings_free_their_slot(db, hospital_id, patient_id):
+    appointment_id = book(db, hospital_id, patient_id, MONDAY.replace(hour=10))
+    with db.write() as conn:
+        conn.execute("UPDATE appointments SET status = ? WHERE id = ?", (CANCELLED, appointment_id))
+    book(db, hospital_id, OTHER_PATIENT, MONDAY.replace(hour=10))
+
+
+def test_saved_hours_replace_the_defaults(db, hospital_id, patient_id):
+    with db.write() as conn:
+        availability.save_schedule(conn, hospital_id, 1, 30, {6: ("10:00", "12:00")})
+    with pytest.raises(SlotUnavailable, match="closed"):
+        book(db, hospital_id, patient_id, MONDAY.replace(hour=10))
+    book(db, hospital_id, patient_id, datetime(2030, 1, 13, 10))
+
+
+def test_free_slots_skip_booked_and_closed_times(db, hospital_id, patient_id):
+    book(db, hospital_id, patient_id, MONDAY.replace(hour=9, minute=15), 30)
+    with db.read() as conn:
+        slots = availability.free_slots(conn, hospital_id, 30, MONDAY.replace(hour=8), count=4)
+        # Saturday's last 30-minute slot, then nothing until Monday
+        weekend = availability.free_slots(conn, hospital_id, 30, SATURDAY.replace(hour=12, minute=30), count=2)
+    assert slots == [MONDAY.replace(hour=9, minute=45), MONDAY.replace(hour=10), MONDAY.replace(hour=10, minute=15), MONDAY.replace(hour=10, minute=30)]
+    assert weekend == [SATURDAY.replace(hour=12, minute=30), datetime(2030, 1, 14, 9)]
+
+
+def test_free_slots_are_bookable(db, hospital_id, patient_id):
+    with db.read() as conn:
+        slots = availability.free_slots(conn, hospital_id, 45, MONDAY, count=3, schedule=Schedule(slot_minutes=30))
+    assert slots == [MONDAY.replace(hour=9), MONDAY.replace(hour=9, minute=30), MONDAY.replace(hour=10)]
+    book(db, hospital_id, patient_id, slots[0], 45)
@@ -0,0 +1,156 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+import api
+import changefeed
+from changefeed import CursorExpired
+
+INSERT = "INSERT INTO appointments (patient_id, hospital_id, appointment_date, duration, status) VALUES (?, ?, '2030-01-07T10:00:00', 30, 'Scheduled') RETURNING id"
+
+
+def add(db, patient_id, hospital_id):
+    with db.write() as conn:
+        return conn.execute(INSERT, (patient_id, hospital_id)).fetchone()[0]
+
+
+def set_status(db, appointment_id, status):
+    with db.write() as conn:
+        conn.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, appointment_id))
+
+
+def fetch(db, after, limit=changefeed.DEFAULT_LIMIT):
+    with db.read() as conn:
+        return changefeed.fetch_changes(conn, after, limit)
+
+
+def summary(changes):
+    return [(c["table"], c["key"], c["operation"], c["row"] and c["row"]["status"]) for c in changes]
+
+
+@pytest.fixture
+def cursor(db):
+    with db.read() as conn:
+        return changefeed.latest_cursor(conn)
+
+
+def test_changes_after_cursor_carry_current_rows(db, patient_id, hospital_id, cursor):
+    first = add(db, patient_id, hospital_id)
+    second = add(db, patient_id, hospital_id)
+    set_status(db, first, "Cancelled")
+    with db.write() as conn:
+        conn.execute("DELETE FROM appointments WHERE id = ?", (second,))
+    changes, after = fetch(db, cursor)
+    assert summary(changes) == [
+        ("appointments", first, "insert", "Cancelled"),
+        ("appointments", second, "insert", None),
+        ("appointments", first, "update", "Cancelled"),
+        ("appointments", second, "delete", None),
+    ]
+    assert [c["seq"] for c in changes] == sorted(c["seq"] for c in changes)
+    assert after == changes[-1]["seq"]
+    assert fetch(db, after) == ([], after)
+
+
+def test_cursor_pages_through_the_log(db, patient_id, hospital_id, cursor):
+    ids = [add(db, patient_id, hospital_id) for _ in range(5)]
+    seen, after = [], cursor
+    while True:
+        changes, after = fetch(db, after, limit=2)
+        if not changes:
+            break
+        assert len(changes) <= 2
+        seen.extend(c["key"] for c in changes)
+    assert seen == ids
+
+
+def test_credentials_and_logins_stay_out_of_the_feed(db, cursor):
+    with db.write() as conn:
+        conn.execute("UPDATE users SET last_login = ?, password_hash = 'x' WHERE username = 'patient1'", (datetime.now().isoformat(),))
+    assert fetch(db, cursor)[0] == []
+    with db.write() as conn:
+        conn.execute("UPDATE users SET email = 'p1@example.com' WHERE username = 'patient1'")
+    (change,), _ = fetch(db, cursor)
+    assert change["operation"] == "update"
+    assert change["row"]["email"] == "p1@example.com"
+    assert "password_hash" not in change["row"]
+
+
+def test_compact_drops_superseded_entries(db, patient_id, hospital_id, cursor):
+    first = add(db, patient_id, hospital_id)
+    second = add(db, patient_id, hospital_id)
+    set_status(db, first, "Checked-in")
+    set_status(db, first, "Completed")
+    assert changefeed.compact(db) == (2, 0)
+    changes, _ = fetch(db, cursor)
+    assert summary(changes) == [("appointments", second, "insert", "Scheduled"), ("appointments", first, "update", "Completed")]
+    # Already compacted entries are not looked at again
+    set_status(db, second, "Cancelled")
+    assert changefeed.compact(db, batch=1) == (1, 0)
+
+
+def test_expired_cursor_raises(db, patient_id, hospital_id, cursor):
+    add(db, patient_id, hospital_id)
+    _, pruned = changefeed.compact(db, now=datetime.now() + changefeed.RETENTION + timedelta(days=1), batch=1)
+    assert pruned > 0
+    with pytest.raises(CursorExpired):
+        fetch(db, cursor)
+    with db.read() as conn:
+        latest = changefeed.latest_cursor(conn)
+    assert fetch(db, latest) == ([], latest)
+    later = add(db, patient_id, hospital_id)
+    assert [c["key"] for c in fetch(db, latest)[0]] == [later]
+
+
+def test_recent_entries_survive_pruning(db, patient_id, hospital_id, cursor):
+    appointment_id = add(db, patient_id, hospital_id)
+    assert changefeed.compact(db) == (0, 0)
+    assert [c["key"] for c in fetch(db, cursor)[0]] == [appointment_id]
+
+
+@pytest.fixture
+def server(db):
+    httpd = changefeed.make_server(db, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(url, token=None):
+    request = Request(url, headers={"Authorization": f"Bearer {token}"} if token else {})
+    try:
+        with urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_feed_needs_an_admin_token(db, server):
+    assert get(f"{server}/changes")[0] == 401
+    assert get(f"{server}/changes", "not-a-token")[0] == 401
+    assert get(f"{server}/changes", api.issue_token(db, "patient1"))[0] == 403
+    token = api.issue_token(db, "admin")
+    status, body = get(f"{server}/changes/latest", token)
+    assert status == 200
+    status, body = get(f"{server}/changes?after={body['cursor']}", token)
+    assert (status, body["changes"], body["more"]) == (200, [], False)
+    assert get(f"{server}/changes?after=x", token)[0] == 400
+
+
+def test_http_feed_reports_expired_cursors(db, server, cursor, patient_id, hospital_id):
+    add(db, patient_id, hospital_id)
+    token = api.issue_token(db, "admin")
+    changefeed.compact(db, now=datetime.now() + changefeed.RETENTION + timedelta(days=1))
+    assert get(f"{server}/changes?after={cursor}", token)[0] == 410
+
+
+def test_unauthenticated_feed_only_on_loopback(db):
+    with pytest.raises(ValueError):
+        changefeed.make_server(db, "0.0.0.0", 0, require_token=False)
+    changefeed.make_server(db, "127.0.0.1", 0, require_token=False).server_close()
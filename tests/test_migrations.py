@@ -0,0 +1,78 @@
+import pytest
+
+import migrations
+from db import ConnectionManager
+from migrations import Backfill, apply_migrations
+
+INSERT_VITALS = "INSERT INTO vital_signs (patient_id, hospital_id, recorded_date, pulse, blood_pressure) VALUES ('PAT_M', 'HOS_M', ?, ?, '120/80')"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "migrate.db"))
+    yield manager
+    manager.close()
+
+
+def versions(db):
+    with db.read() as conn:
+        return [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+
+
+def test_fresh_database_reaches_the_latest_version(manager):
+    latest = migrations.MIGRATIONS[-1][0]
+    assert apply_migrations(manager) == list(range(1, latest + 1))
+    assert apply_migrations(manager) == []
+    assert versions(manager) == list(range(1, latest + 1))
+
+
+def test_vital_rollups_backfill_in_batches(manager, monkeypatch):
+    steps = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps[:6])
+    apply_migrations(manager)
+    with manager.write() as conn:
+        for n in range(25):
+            conn.execute(INSERT_VITALS, (f"2030-01-07T{n % 24:02d}:30:00", 60 + n))
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+    monkeypatch.setattr(steps[6][2], "batch", 4)
+    batches = []
+    fill = steps[6][2].fill
+    monkeypatch.setattr(steps[6][2], "fill", lambda conn, after, through: batches.append((after, through)) or fill(conn, after, through))
+    apply_migrations(manager)
+    with manager.read() as conn:
+        assert conn.execute("SELECT sum(n), sum(total) FROM vital_rollups WHERE metric = 'pulse' AND resolution = 'day'").fetchone() == (25, sum(range(60, 85)))
+        assert conn.execute("SELECT count(*) FROM migration_progress").fetchone()[0] == 0
+    assert len(batches) == 7
+
+
+def test_interrupted_backfill_resumes(manager, monkeypatch):
+    apply_migrations(manager)
+    with manager.write() as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, done INTEGER NOT NULL DEFAULT 0)")
+        conn.executemany("INSERT INTO items (id) VALUES (?)", [(n,) for n in range(1, 21)])
+    calls = []
+
+    def fill(conn, after, through):
+        calls.append((after, through))
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        conn.execute("UPDATE items SET done = done + 1 WHERE id > ? AND id <= ?", (after, through))
+
+    def prepare(conn):
+        conn.execute("INSERT INTO items (id) VALUES (21)")
+
+    latest = migrations.MIGRATIONS[-1][0]
+    step = Backfill("items", prepare, fill, batch=6)
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(latest + 1, "test backfill", step)])
+    with pytest.raises(RuntimeError):
+        apply_migrations(manager)
+    assert latest + 1 not in versions(manager)
+    with manager.read() as conn:
+        assert conn.execute("SELECT done_through, last_rowid FROM migration_progress").fetchone() == (12, 21)
+    # Rows added after prepare() are left alone
+    with manager.write() as conn:
+        conn.execute("INSERT INTO items (id) VALUES (22)")
+    assert apply_migrations(manager) == [latest + 1]
+    assert calls == [(0, 6), (6, 12), (12, 18), (12, 18), (18, 21)]
+    with manager.read() as conn:
+        assert conn.execute("SELECT id, done FROM items WHERE done != 1").fetchall() == [(22, 0)]
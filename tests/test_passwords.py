@@ -0,0 +1,37 @@
+import hashlib
+
+import passwords
+
+# The cheapest cost scrypt accepts, so the tests do not spend a second per hash
+CHEAP = (2 ** 4, 1, 1)
+
+
+def test_scrypt_hash_round_trip():
+    stored = passwords.hash_password("secret", CHEAP)
+    assert passwords.check_password("secret", stored)
+    assert not passwords.check_password("Secret", stored)
+    assert stored != passwords.hash_password("secret", CHEAP)  # salted
+
+
+def test_legacy_sha256_hashes_still_check():
+    stored = hashlib.sha256(b"admin123").hexdigest()
+    assert passwords.is_legacy(stored)
+    assert passwords.check_password("admin123", stored)
+    assert not passwords.check_password("admin124", stored)
+    assert passwords.needs_rehash(stored)
+
+
+def test_shared_hashes_check_and_are_rehashed():
+    stored = passwords.shared_hash("patient123", CHEAP)
+    assert stored.startswith(passwords.SHARED_PREFIX)
+    assert not passwords.is_legacy(stored)
+    assert passwords.check_password("patient123", stored)
+    assert not passwords.check_password("patient124", stored)
+    # Even at the current cost: every account sharing it needs its own
+    assert passwords.needs_rehash(stored, CHEAP)
+
+
+def test_weaker_costs_are_rehashed():
+    stored = passwords.hash_password("secret", CHEAP)
+    assert not passwords.needs_rehash(stored, CHEAP)
+    assert passwords.needs_rehash(stored, (2 ** 5, 1, 1))
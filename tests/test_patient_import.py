@@ -0,0 +1,91 @@
+import io
+import json
+
+import pytest
+
+import patient_import
+from db import WriteQueue
+from patient_import import UnreadableFile
+
+CSV = "First Name,Last Name,Date of Birth,Gender,Email,Blood Type\nAda,Lovelace,1915-12-10,F,ada@example.com,o-\nNo,Surname,,,,\n,Missing,,,,\nAlan,Turing,1912-06-23,male,,\n"
+
+
+def fhir(given, family, **extra):
+    return {"resourceType": "Patient", "name": [{"use": "official", "given": [given], "family": family}], **extra}
+
+
+def imported_names(db, hospital_id):
+    with db.read() as conn:
+        return sorted(row[0] for row in conn.execute(
+            "SELECT p.first_name FROM patients p JOIN medical_history h ON h.patient_id = p.id WHERE h.hospital_id = ?", (hospital_id,)))
+
+
+def run(db, name, content, **kwargs):
+    data = content.encode("latin-1") if isinstance(content, str) else content
+    return patient_import.import_patients(db, "HOS_IMPORT", patient_import.read_file(name, io.BytesIO(data)), **kwargs)
+
+
+def test_csv_import_reports_bad_rows(db):
+    imported, errors = run(db, "patients.csv", CSV, batch_size=2)
+    assert imported == 3
+    assert errors == [(4, "first_name and last_name are required")]
+    assert imported_names(db, "HOS_IMPORT") == ["Ada", "Alan", "No"]
+    with db.read() as conn:
+        assert conn.execute("SELECT blood_type FROM medical_history WHERE hospital_id = 'HOS_IMPORT' AND blood_type IS NOT NULL").fetchall() == [("O-",)]
+
+
+def test_imported_accounts_share_one_hash_rehashed_at_login(db):
+    run(db, "patients.csv", CSV)
+    with db.read() as conn:
+        hashes = {row[0] for row in conn.execute("SELECT u.password_hash FROM users u JOIN patients p ON p.user_id = u.id WHERE p.first_name IN ('Ada', 'Alan', 'No')")}
+    (stored,) = hashes
+    assert stored.startswith(patient_import.passwords.SHARED_PREFIX)
+    assert patient_import.passwords.needs_rehash(stored)
+
+
+def test_fhir_bundle_and_ndjson(db):
+    bundle = {"resourceType": "Bundle", "entry": [{"resource": fhir("Grace", "Hopper", birthDate="1906-12-09")},
+                                                  {"resource": {"resourceType": "Observation"}},
+                                                  {"resource": fhir("Bad", "Date", birthDate="yesterday")}]}
+    imported, errors = run(db, "bundle.json", json.dumps(bundle))
+    assert (imported, [number for number, _ in errors]) == (1, [3])
+    ndjson = "\n" + json.dumps(fhir("Katherine", "Johnson")) + "\n\n[1]\n{broken\n" + json.dumps({"resourceType": "Patient", "name": "x"}) + "\n"
+    imported, errors = run(db, "patients.ndjson", ndjson)
+    assert imported == 1
+    assert [number for number, _ in errors] == [4, 5, 6]
+    assert imported_names(db, "HOS_IMPORT") == ["Grace", "Katherine"]
+
+
+@pytest.mark.parametrize("name, content", [
+    ("bad.json", "{not json"),
+    ("array.json", "[1, 2]"),
+    ("resource.json", json.dumps(fhir("Only", "One"), indent=1)),
+])
+def test_unreadable_fhir_documents(db, name, content):
+    with pytest.raises(ValueError):
+        run(db, name, content)
+    assert imported_names(db, "HOS_IMPORT") == []
+
+
+def test_bad_encoding_keeps_the_rows_before_it(db):
+    content = b"first_name,last_name\n" + b"".join(f"Row{n},Person\n".encode() for n in range(5)) + "Jos\xe9,Bad\n".encode("latin-1")
+    with pytest.raises(UnreadableFile) as raised:
+        run(db, "patients.csv", content, batch_size=2)
+    # The decoder reads ahead, so the failure may come before the last good rows
+    assert raised.value.imported == len(imported_names(db, "HOS_IMPORT"))
+    assert raised.value.errors == []
+
+
+def test_unsupported_file_type():
+    with pytest.raises(ValueError, match="Unsupported"):
+        patient_import.read_file("patients.xlsx", io.BytesIO(b""))
+
+
+def test_import_through_the_write_queue(db):
+    queue = WriteQueue(db)
+    try:
+        imported, errors = run(db, "patients.csv", CSV, batch_size=2, write=lambda fn, *args: queue.submit(fn, *args).result())
+    finally:
+        queue.close()
+    assert (imported, len(errors)) == (3, 1)
+    assert imported_names(db, "HOS_IMPORT") == ["Ada", "Alan", "No"]
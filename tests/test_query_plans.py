@@ -0,0 +1,45 @@
+import importlib
+import os
+
+import pytest
+
+import queries
+from conftest import ROOT
+from db import ConnectionManager
+from migrations import apply_migrations
+
+PRODUCTION_QUERIES = queries.production_queries()
+
+
+@pytest.fixture(scope="module")
+def plan_conn(tmp_path_factory):
+    # Seeded and analyzed once: the planner needs production-like statistics
+    db = ConnectionManager(str(tmp_path_factory.mktemp("plans") / "plans.db"))
+    apply_migrations(db)
+    with db.write() as conn:
+        queries.seed_plan_database(conn)
+    with db.read() as conn:
+        yield conn
+    db.close()
+
+
+@pytest.mark.parametrize("name", sorted(PRODUCTION_QUERIES))
+def test_no_table_scan(plan_conn, name):
+    plan = queries.query_plan(plan_conn, PRODUCTION_QUERIES[name])
+    assert not any(queries.is_table_scan(step) for step in plan), f"{name}: {' | '.join(plan)}"
+
+
+def test_every_plan_queries_is_checked():
+    # A module's plan_queries() only guards its statements once production_queries() includes them
+    modules = [name[:-3] for name in os.listdir(ROOT) if name.endswith(".py") and "def plan_queries(" in open(os.path.join(ROOT, name)).read()]
+    assert modules
+    for module in modules:
+        missing = set(importlib.import_module(module).plan_queries().items()) - set(PRODUCTION_QUERIES.items())
+        assert not missing, f"{module}.plan_queries() statements missing from production_queries(): {sorted(name for name, _ in missing)}"
+
+
+def test_is_table_scan():
+    assert queries.is_table_scan("SCAN appointments")
+    assert not queries.is_table_scan("SEARCH appointments USING INDEX idx_appointments_patient (patient_id=?)")
+    assert not queries.is_table_scan("SCAN (subquery-1)")
+    assert not queries.is_table_scan("SCAN CONSTANT ROW")
@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+
+import rules
+from rules import Automaton, RuleCache, RuleEngine
+
+SPECS = [
+    {"id": "ace", "kind": "treatment", "priority": 10, "text": "ACE",
+     "when": {"conditions": {"any": ["hypertension", "high blood pressure"]}, "allergies": {"none": ["lisinopril"]}}},
+    {"id": "arb", "kind": "treatment", "priority": 10, "text": "ARB",
+     "when": {"conditions": {"any": ["hypertension", "high blood pressure"]}, "allergies": {"any": ["lisinopril"]}}},
+    {"id": "both", "kind": "treatment", "priority": 5, "text": "BOTH",
+     "when": {"conditions": {"all": ["asthma", "diabetes"]}}},
+    {"id": "o-neg", "kind": "tip", "priority": 30, "text": "DONOR", "when": {"blood_type": ["O-"]}},
+    {"id": "always", "kind": "tip", "priority": 40, "text": "ALWAYS"},
+    {"id": "hypertension-tip", "kind": "tip", "priority": 20, "text": "SALT",
+     "when": {"conditions": {"any": ["Hypertension"]}}},
+]
+
+
+@pytest.fixture
+def engine():
+    return RuleEngine(SPECS, {"treatment": "none found"})
+
+
+def ids(matched):
+    return [rule.id for rule in matched]
+
+
+def test_automaton_matches_whole_words_case_insensitively():
+    automaton = Automaton(["asthma", "he", "she", "hers"])
+    assert automaton.find("Ushers") == set()
+    assert automaton.find("she, HERS; he") == {1, 2, 3}
+    assert automaton.find("asthmatic") == set()
+    assert automaton.find("ASTHMA") == {0}
+
+
+@pytest.mark.parametrize("record, expected", [
+    ({"chronic_conditions": "Hypertension"}, ["ace", "hypertension-tip", "always"]),
+    ({"chronic_conditions": "high blood pressure", "allergies": "Lisinopril"}, ["arb", "always"]),
+    ({"chronic_conditions": "asthma"}, ["always"]),
+    ({"chronic_conditions": "Diabetes; asthma"}, ["both", "always"]),
+    ({"blood_type": "O-"}, ["o-neg", "always"]),
+    ({"blood_type": "O+"}, ["always"]),
+    # Keywords count only in their own field
+    ({"family_history": "hypertension"}, ["always"]),
+    ({}, ["always"]),
+])
+def test_evaluate(engine, record, expected):
+    assert ids(engine.evaluate(record)) == expected
+
+
+def test_evaluate_text_ignores_fields_and_blood_types(engine):
+    assert ids(engine.evaluate_text("What helps with hypertension?", "tip")) == ["hypertension-tip", "always"]
+    assert ids(engine.evaluate_text("What helps with hypertension?", "treatment")) == ["ace"]
+
+
+def test_render(engine):
+    assert engine.render(engine.evaluate({"chronic_conditions": "hypertension"}), "treatment") == "ACE"
+    assert engine.render(engine.evaluate({"chronic_conditions": "hypertension"}), "tip") == "SALT<br>ALWAYS"
+    assert engine.render([], "treatment") == "none found"
+    assert engine.render([], "tip") == ""
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"id": "x", "kind": "advice", "text": ""}, "unknown kind"),
+    ({"id": "x", "kind": "tip", "text": "", "when": {"medications": {"any": ["aspirin"]}}}, "unknown field"),
+])
+def test_invalid_rules_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message):
+        RuleEngine([spec])
+
+
+def test_evaluate_frame_agrees_with_evaluate(engine):
+    records = [
+        {"patient_id": "P1", "blood_type": "O-", "allergies": "Lisinopril", "chronic_conditions": "hypertension", "surgeries": None, "family_history": None},
+        {"patient_id": "P2", "blood_type": None, "allergies": None, "chronic_conditions": "asthma, diabetes", "surgeries": None, "family_history": None},
+        {"patient_id": "P3", "blood_type": "O-", "allergies": "Lisinopril", "chronic_conditions": "hypertension", "surgeries": None, "family_history": None},
+    ]
+    frame = engine.evaluate_frame(pd.DataFrame(records))
+    for record in records:
+        expected = ids(engine.evaluate(record))
+        assert frame[frame["patient_id"] == record["patient_id"]]["rule_id"].tolist() == expected
+
+
+def test_shipped_rules_load():
+    engine = rules.load_rules()
+    assert "hypertension-ace-inhibitor" in ids(engine.evaluate({"chronic_conditions": "Hypertension"}))
+    assert engine.render([], "treatment")
+
+
+def test_combine_history():
+    record = rules.combine_history([("P1", None, "Pollen", "", None, "Diabetes"), ("P1", "A+", "Penicillin", "Asthma", None, None)])
+    assert record == {"blood_type": "A+", "allergies": "Pollen; Penicillin", "chronic_conditions": "Asthma", "surgeries": "", "family_history": "Diabetes"}
+
+
+def test_rule_cache_reloads_after_history_changes(db, hospital_id, patient_id, engine):
+    cache = RuleCache(engine)
+    with db.write() as conn:
+        conn.execute("DELETE FROM medical_history WHERE patient_id = ?", (patient_id,))
+        conn.execute("INSERT INTO medical_history (patient_id, hospital_id, chronic_conditions) VALUES (?, ?, 'asthma')", (patient_id, hospital_id))
+    with db.read() as conn:
+        assert ids(cache.patient(conn, patient_id)) == ["always"]
+    with db.write() as conn:
+        conn.execute("UPDATE medical_history SET chronic_conditions = 'hypertension' WHERE patient_id = ?", (patient_id,))
+    with db.read() as conn:
+        assert ids(cache.patient(conn, patient_id)) == ["ace", "hypertension-tip", "always"]
+        assert ids(cache.patient(conn, patient_id, "HOS_OTHER")) == []
+        assert cache.hospital(conn, hospital_id)["rule_id"].tolist() == ["ace", "hypertension-tip", "always"]
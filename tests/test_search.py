@@ -0,0 +1,44 @@
+import pytest
+
+import patient_import
+import search
+
+
+def record(first, last, email="", allergies=""):
+    return dict(dict.fromkeys(patient_import.FIELDS, ""), first_name=first, last_name=last, email=email, allergies=allergies)
+
+
+@pytest.fixture
+def hospital(db):
+    with db.write() as conn:
+        patient_import.insert_patients(conn, "HOS_SEARCH", [record(f"Ann{n}", "Jones", email=f"ann{n}@smithco.example") for n in range(30)])
+        patient_import.insert_patients(conn, "HOS_SEARCH", [record("Bob", "Smith"), record("Cara", "Smithson"), record("Dan", "Lee", allergies="nickel")])
+        patient_import.insert_patients(conn, "HOS_ELSEWHERE", [record("Eve", "Smith")])
+    return db
+
+
+def names(db, text, limit=search.SEARCH_LIMIT):
+    with db.read() as conn:
+        return [name for _, name in search.search_patients(conn, "HOS_SEARCH", text, limit)]
+
+
+def test_name_matches_rank_above_contact_matches(hospital):
+    assert names(hospital, "smith", limit=3)[:2] == ["Bob Smith", "Cara Smithson"]
+
+
+def test_words_are_anded_and_scoped_to_the_hospital(hospital):
+    assert names(hospital, "bob smi") == ["Bob Smith"]
+    assert names(hospital, "eve") == []
+
+
+def test_other_fields_match_too(hospital):
+    assert names(hospital, "nickel") == ["Dan Lee"]
+    assert len(names(hospital, "smithco", limit=50)) == 30
+
+
+def test_short_words_are_ignored(hospital):
+    assert names(hospital, "bo") == []
+
+
+def test_misspellings_fall_back_to_known_names(hospital):
+    assert names(hospital, "smtih")[:2] == ["Bob Smith", "Cara Smithson"]
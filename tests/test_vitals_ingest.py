@@ -0,0 +1,168 @@
+import http.client
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import api
+import vitals_ingest
+from vitals_ingest import Backpressure, VitalsWriter
+
+# Rejects one pulse value at the database, as a constraint failure would
+REJECT_PULSE = "CREATE TRIGGER reject_pulse BEFORE INSERT ON vital_signs WHEN NEW.pulse = 99 BEGIN SELECT RAISE(ABORT, 'pulse rejected'); END"
+
+
+def readings(count, pulse=70):
+    return [{"patient_id": "PAT_DEVICE", "hospital_id": "HOS_DEVICE", "recorded_date": f"2030-01-07T09:{n:02d}:00", "pulse": pulse, "blood_pressure": "120/80"} for n in range(count)]
+
+
+def stored(db):
+    with db.read() as conn:
+        return conn.execute("SELECT count(*) FROM vital_signs WHERE patient_id = 'PAT_DEVICE'").fetchone()[0]
+
+
+@pytest.fixture
+def writer(db):
+    writer = VitalsWriter(db)
+    yield writer
+    writer.close()
+
+
+@pytest.mark.parametrize("reading, message", [
+    ({"pulse": 70}, "patient_id is required"),
+    ({"patient_id": "P"}, "no measurements"),
+    ({"patient_id": "P", "pulse": "fast"}, "must be a number"),
+    ({"patient_id": "P", "pulse": 400}, "outside"),
+    ({"patient_id": "P", "systolic": 120}, "together"),
+    ({"patient_id": "P", "blood_pressure": "120"}, "look like"),
+    ({"patient_id": "P", "pulse": 70, "recorded_date": "today"}, "ISO 8601"),
+])
+def test_invalid_readings_are_rejected(reading, message):
+    items, errors = vitals_ingest.validate_batch([reading])
+    assert items == []
+    assert message in errors[0][1]
+
+
+def test_bmi_is_computed_not_taken():
+    (row, metrics), = vitals_ingest.validate_batch([{"patient_id": "P", "weight": 150, "height": 65, "bmi": 99}])[0]
+    assert row[10] == metrics[-1] == 25.0
+
+
+def test_writer_commits_accepted_readings_and_rollups(db, writer):
+    assert writer.submit(readings(30) + [{"patient_id": "P"}]) == (30, [(30, "reading has no measurements")])
+    assert writer.flush(10)
+    assert stored(db) == 30
+    with db.read() as conn:
+        assert conn.execute("SELECT n, total FROM vital_rollups WHERE patient_id = 'PAT_DEVICE' AND resolution = 'day' AND metric = 'pulse'").fetchone() == (30, 2100)
+    snapshot = writer.snapshot()
+    assert (snapshot["written"], snapshot["rejected"], snapshot["failed"], snapshot["pending"]) == (30, 1, 0, 0)
+
+
+def test_a_failing_reading_costs_only_itself(db, writer):
+    with db.write() as conn:
+        conn.execute(REJECT_PULSE)
+    writer.submit(readings(10) + readings(1, pulse=99) + readings(10))
+    assert writer.flush(10)
+    assert stored(db) == 20
+    snapshot = writer.snapshot()
+    assert (snapshot["written"], snapshot["failed"]) == (20, 1)
+    assert "pulse rejected" in snapshot["last_error"]
+    # The thread lives on
+    writer.submit(readings(5))
+    assert writer.flush(10)
+    assert stored(db) == 25
+
+
+class LockedAtFirst:
+    """A ConnectionManager whose first `times` writes find the database locked."""
+
+    def __init__(self, db, times):
+        self.db, self.times = db, times
+
+    @contextmanager
+    def write(self):
+        if self.times:
+            self.times -= 1
+            raise sqlite3.OperationalError("database is locked")
+        with self.db.write() as conn:
+            yield conn
+
+
+def test_writer_waits_out_a_locked_database(db, monkeypatch):
+    monkeypatch.setattr(vitals_ingest, "LOCK_BACKOFF", 0.001)
+    writer = VitalsWriter(LockedAtFirst(db, 3))
+    try:
+        writer.submit(readings(5))
+        assert writer.flush(10)
+    finally:
+        writer.close()
+    assert stored(db) == 5
+    assert writer.snapshot()["lock_retries"] == 3
+
+
+def test_closed_writer_refuses_readings(writer):
+    writer.close()
+    with pytest.raises(Backpressure):
+        writer.submit(readings(1))
+
+
+@pytest.fixture
+def server(writer):
+    httpd = vitals_ingest.make_server(writer, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(port, body, token=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request("POST", "/vitals", body=json.dumps(body), headers={"Authorization": f"Bearer {token}"} if token else {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_posting_needs_an_admin_or_hospital_token(db, server, hospital_id):
+    assert post(server, readings(1))[0] == 401
+    assert post(server, readings(1), "not-a-token")[0] == 401
+    assert post(server, readings(1), api.issue_token(db, "patient1"))[0] == 403
+    assert post(server, readings(2), api.issue_token(db, "admin")) == (202, {"accepted": 2, "errors": []})
+    hospital = api.issue_token(db, "hospital1")
+    # Only readings of the token's own hospital
+    assert post(server, readings(1), hospital)[0] == 403
+    own = [dict(reading, hospital_id=hospital_id) for reading in readings(3)]
+    assert post(server, own, hospital)[0] == 202
+
+
+def post_headers(port, headers):
+    """Send only a POST's headers; the server has to answer without waiting for a body."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.putrequest("POST", "/vitals", skip_accept_encoding=True)
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders()
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader("Connection")
+    finally:
+        connection.close()
+
+
+def test_oversized_bodies_are_refused_unread(db, server):
+    authorization = {"Authorization": f"Bearer {api.issue_token(db, 'admin')}"}
+    assert post_headers(server, dict(authorization, **{"Content-Length": str(vitals_ingest.MAX_BODY_BYTES + 1)})) == (413, "close")
+    assert post_headers(server, dict(authorization, **{"Content-Length": "-1"})) == (400, "close")
+    assert post_headers(server, authorization) == (411, "close")
+
+
+def test_unauthenticated_ingest_only_on_loopback(writer):
+    with pytest.raises(ValueError):
+        vitals_ingest.make_server(writer, "0.0.0.0", 0, require_token=False)
+    vitals_ingest.make_server(writer, "127.0.0.1", 0, require_token=False).server_close()
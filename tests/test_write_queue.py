@@ -0,0 +1,64 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db import WriteQueue, WriteTimeout
+
+
+@pytest.fixture
+def queue(db):
+    queue = WriteQueue(db)
+    yield queue
+    queue.close()
+
+
+def insert(conn, name):
+    return conn.execute("INSERT INTO name_words (word) VALUES (?) RETURNING id", (name,)).fetchone()[0]
+
+
+def words(db):
+    with db.read() as conn:
+        return {row[0] for row in conn.execute("SELECT word FROM name_words WHERE word LIKE 'queued%'")}
+
+
+def test_jobs_commit_and_fail_alone(db, queue):
+    futures = [queue.submit(insert, f"queued{n}") for n in range(5)] + [queue.submit(insert, "queued0")]
+    assert all(isinstance(f.result(), int) for f in futures[:5])
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[-1].result()
+    assert words(db) == {f"queued{n}" for n in range(5)}
+    snapshot = queue.snapshot()
+    assert (snapshot["committed"], snapshot["failed"], snapshot["pending"]) == (5, 1, 0)
+
+
+def blocked(queue):
+    # Occupies the writer until the returned event is set
+    started, release = threading.Event(), threading.Event()
+    queue.submit(lambda conn: started.set() or release.wait(10))
+    assert started.wait(10)
+    return release
+
+
+def test_a_job_not_started_in_time_is_withdrawn(db, queue):
+    release = blocked(queue)
+    with pytest.raises(WriteTimeout):
+        queue.call(insert, "queued-late", timeout=0.05)
+    release.set()
+    assert queue.call(insert, "queued-next") > 0
+    assert words(db) == {"queued-next"}
+    assert queue.snapshot()["cancelled"] == 1
+
+
+def test_a_started_job_is_waited_for(db, queue):
+    def slow(conn):
+        time.sleep(0.6)
+        return insert(conn, "queued-slow")
+
+    assert queue.call(slow, timeout=0.25) > 0
+    assert words(db) == {"queued-slow"}
+
+
+def test_write_timeout_is_reported_as_a_database_error():
+    assert issubclass(WriteTimeout, sqlite3.Error)
@@ -0,0 +1,3 @@
+# The pages of Healthrecords.py, one module per role. Healthrecords.py imports a
+# module the first time one of its pages is shown, so a process that has only
+# served the login page has not loaded pandas or the modules behind the pages.
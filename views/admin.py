@@ -0,0 +1,145 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+import analytics
+import profiling
+import queries
+from resources import METRICS_FILE, WRITE_TIMEOUT, get_analytics, get_hasher, get_profiler, get_read_models, get_write_queue, run_write
+from views import theme
+from views.common import general_health_queries
+
+# Admin Dashboard
+def admin_dashboard():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Welcome, Admin!</h1><p>Manage hospital registrations and system settings.</p></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a professional admin managing healthcare records for this section?")
+    system_analytics()
+    general_health_queries()
+
+# Cross-hospital reports, computed from the analytics snapshot rather than the live database
+ANALYTICS_DAYS = 30
+TOP_HOSPITALS = 10
+
+def system_analytics():
+    st.subheader("System Analytics")
+    snapshot = get_analytics()
+    if snapshot.manifest["exported_at"] is None:
+        st.info("The first analytics snapshot is being built. Check back in a moment.")
+        return
+    tables = snapshot.tables
+    today = datetime.combine(date.today(), datetime.min.time())
+    start = today - timedelta(days=ANALYTICS_DAYS)
+    cols = st.columns(4)
+    cols[0].metric("Appointments", f"{tables['appointments'].num_rows:,}")
+    cols[1].metric("Hospitals", f"{tables['hospitals'].num_rows:,}")
+    cols[2].metric("Patients with History", f"{len(tables['medical_history']['patient_id'].unique()):,}")
+    cols[3].metric("Snapshot", f"{datetime.fromisoformat(snapshot.manifest['exported_at']):%H:%M}")
+    st.caption(f"Exported from the database every {snapshot.interval // 60} minutes; only rows changed since the previous export are copied.")
+    st.markdown(f"**Appointments per Day** (last {ANALYTICS_DAYS} days and next 7)")
+    per_day = snapshot.query(analytics.appointments_per_day, start, today + timedelta(days=8))
+    if per_day.empty:
+        st.info("No appointments in this period.")
+    else:
+        # The busiest hospitals individually, the rest together
+        top = per_day.groupby("name")["appointments"].sum().nlargest(TOP_HOSPITALS).index
+        per_day["Hospital"] = per_day["name"].where(per_day["name"].isin(top), "Other hospitals")
+        st.bar_chart(per_day.pivot_table(index="day", columns="Hospital", values="appointments", aggfunc="sum", fill_value=0))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f"**No-show Rate by Hospital** (%, last {ANALYTICS_DAYS} days)")
+        rates = snapshot.query(analytics.no_show_rates, start, today)
+        if rates.empty:
+            st.info("No completed or missed appointments in this period.")
+        else:
+            st.bar_chart(rates.nlargest(TOP_HOSPITALS, "no_show_rate").set_index("name")["no_show_rate"].mul(100).rename("No-show rate (%)"), horizontal=True)
+    with col2:
+        st.markdown("**Chronic Condition Prevalence** (% of patients with a history)")
+        prevalence = snapshot.query(analytics.condition_prevalence)
+        if prevalence.empty:
+            st.info("No chronic conditions recorded.")
+        else:
+            st.bar_chart(prevalence.set_index("condition")["share"].mul(100).rename("Patients (%)"), horizontal=True)
+    if st.button("Refresh Snapshot"):
+        snapshot.export()
+        st.rerun()
+
+# Page and SQL Performance (Admin)
+def admin_performance():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Performance</h1><p>Render times and SQL statements per page since the server started.</p></div>', unsafe_allow_html=True)
+    profiler = get_profiler()
+    summary = profiler.summary()
+    st.caption(f"Percentiles over the last {summary['window']} renders of each page. Written to {METRICS_FILE} every {profiler.write_interval} seconds.")
+    st.subheader("Write Queue")
+    writes = get_write_queue().snapshot()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queued Now", writes["pending"])
+    col2.metric("Commits", f"{writes['commits']:,}", f"{writes['jobs_per_commit']:.1f} writes each" if writes["jobs_per_commit"] else None, delta_color="off")
+    col3.metric("Commit p50 / p95", f"{writes['commit_p50_ms']:.1f} / {writes['commit_p95_ms']:.1f} ms" if writes["commit_p50_ms"] is not None else "–")
+    col4.metric("Write Wait p50 / p95", f"{writes['wait_p50_ms']:.1f} / {writes['wait_p95_ms']:.1f} ms" if writes["wait_p50_ms"] is not None else "–")
+    if writes["failed"]:
+        st.caption(f"{writes['failed']:,} writes failed; last error: {writes['last_error']}")
+    if writes["cancelled"]:
+        st.caption(f"{writes['cancelled']:,} writes withdrawn unsaved after waiting {WRITE_TIMEOUT} s for the queue")
+    n, r, p = get_hasher().cost
+    st.caption(f"Passwords: scrypt N=2^{n.bit_length() - 1}, r={r}, p={p}, calibrated at startup")
+    if not summary["pages"]:
+        st.info("No pages rendered yet.")
+        return
+    st.subheader("Pages")
+    st.dataframe(pd.DataFrame(summary["pages"]).rename(columns={
+        "page": "Page", "renders": "Renders", "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "p99_ms": "p99 (ms)",
+        "p50_queries": "p50 Queries", "p95_queries": "p95 Queries", "max_queries": "Max Queries", "mean_rows": "Mean Rows", "n_plus_one_renders": "N+1 Renders",
+    }), hide_index=True)
+    st.subheader("Possible N+1 Queries")
+    if summary["n_plus_one"]:
+        st.markdown(f"<div class='warning-box'>Statements run {profiling.N_PLUS_ONE_MIN} or more times in a single render.</div>", unsafe_allow_html=True)
+        st.dataframe(pd.DataFrame(summary["n_plus_one"]).rename(columns={"page": "Page", "statement": "Statement", "renders": "Renders", "max_executions": "Most Executions"}), hide_index=True)
+    else:
+        st.markdown("<div class='success-box'>None detected.</div>", unsafe_allow_html=True)
+    st.subheader("Statements by Total Time")
+    statements = pd.DataFrame(summary["statements"])
+    if not statements.empty:
+        statements["pages"] = statements["pages"].str.join(", ")
+        st.dataframe(statements.rename(columns={"statement": "Statement", "executions": "Executions", "total_ms": "Total (ms)", "mean_ms": "Mean (ms)", "rows": "Rows", "pages": "Pages"}), hide_index=True)
+    st.subheader("Slowest Renders")
+    for render in summary["slowest_renders"]:
+        with st.expander(f"{render['page']}: {render['wall_ms']} ms, {render['queries']} queries, {render['rows']} rows ({render['at']})"):
+            for statement in render["statements"]:
+                st.markdown(f"**{statement['ms']} ms** over {statement['executions']} execution(s)")
+                st.code(statement["statement"], language="sql")
+    if st.button("Reset Statistics"):
+        profiler.reset()
+        st.rerun()
+
+# Hospital Approvals (Admin)
+def hospital_approvals():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Hospital Registration Approvals</h1></div>', unsafe_allow_html=True)
+    try:
+        pending_hospitals = get_read_models().get(("pending_hospitals",), lambda conn: conn.execute(queries.PENDING_HOSPITALS).fetchall())
+        if pending_hospitals:
+            for hospital in pending_hospitals:
+                hospital_id, user_id, name, address, phone, email, status = hospital
+                st.markdown(f"<div class='card'>", unsafe_allow_html=True)
+                st.markdown(f"**Hospital:** {name}<br>**Address:** {address}<br>**Phone:** {phone}<br>**Email:** {email}<br>**Status:** {status}", unsafe_allow_html=True)
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button(f"Approve {name}", key=f"approve_{hospital_id}"):
+                        run_write(lambda conn: conn.execute(queries.SET_HOSPITAL_STATUS, ("approved", datetime.now().isoformat(), hospital_id)))
+                        st.success(f"{name} approved successfully")
+                        st.rerun()
+                with col2:
+                    if st.button(f"Reject {name}", key=f"reject_{hospital_id}"):
+                        def reject(conn):
+                            conn.execute(queries.SET_HOSPITAL_STATUS, ("rejected", datetime.now().isoformat(), hospital_id))
+                            conn.execute(queries.DELETE_USER, (user_id,))
+                        run_write(reject)
+                        st.success(f"{name} rejected and removed")
+                        st.rerun()
+                st.markdown("</div>", unsafe_allow_html=True)
+        else:
+            st.info("No pending hospital registrations.")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
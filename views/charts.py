@@ -0,0 +1,25 @@
+import streamlit as st
+
+import vitals
+from resources import get_archive, get_read_models
+
+# Vital sign trend charts, downsampled server-side to a bounded number of points
+VITAL_CHART_LABELS = {"temperature": "Temperature (°F)", "pulse": "Pulse (bpm)", "oxygen_saturation": "O2 Sat (%)", "weight": "Weight (lbs)", "bmi": "BMI"}
+
+VITAL_CHART_METRICS = (["temperature", "pulse", "oxygen_saturation"], ["weight", "bmi"])
+
+def vital_sign_trends(patient_id, hospital_id=None):
+    if not get_read_models().get(("has_vitals", patient_id, hospital_id), lambda conn: vitals.has_vitals(conn, patient_id, hospital_id)):
+        return
+    st.subheader("Vital Signs Trends")
+    chart_range = st.selectbox("Range", list(vitals.CHART_RANGES), index=1, key="vitals_range")
+    def load(conn):
+        start = vitals.range_start(chart_range)
+        return [vitals.load_series(conn, patient_id, metrics, hospital_id=hospital_id, start=start, archive=get_archive()) for metrics in VITAL_CHART_METRICS]
+    for resolution, df in get_read_models().get(("vital_series", patient_id, hospital_id, chart_range), load):
+        if df.empty:
+            st.info("No vital signs recorded in this range.")
+            return
+        st.line_chart(df.rename(columns=VITAL_CHART_LABELS))
+    if resolution != "raw":
+        st.caption(f"Showing {'hourly' if resolution == 'hour' else 'daily'} averages.")
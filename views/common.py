@@ -0,0 +1,71 @@
+import streamlit as st
+
+import data_access
+import queries
+import vitals
+from resources import get_archive, get_db, get_read_models, get_rule_cache
+from views import theme
+
+# Profile ids are resolved at login; sessions that predate this look them up once
+def _profile_id(key, query):
+    user = st.session_state.user
+    if key not in user:
+        with get_db().read() as conn:
+            row = conn.execute(query, (user['user_id'],)).fetchone()
+        user[key] = row[0] if row else None
+    return user[key]
+
+def current_patient_id():
+    return _profile_id('patient_id', queries.PATIENT_ID_BY_USER)
+
+def current_hospital_id():
+    return _profile_id('hospital_id', queries.HOSPITAL_ID_BY_USER)
+
+# General Health Queries Section
+def general_health_queries():
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader("General Health Queries")
+    query = st.text_area("Ask a health-related question:")
+    if st.button("Submit Query"):
+        if query:
+            matched = get_rule_cache().engine.evaluate_text(query, "tip")
+            response = get_rule_cache().engine.render(matched, "tip") if matched else "Please provide more details for a tailored response."
+            st.markdown(f"<div class='info-box'>**AI Response:** {response}</div>", unsafe_allow_html=True)
+        else:
+            st.warning("Please enter a query.")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# Appointment history of the medical history pages, archived visits included
+def appointment_history(patient_id, hospital_id=None):
+    st.subheader("Appointment History")
+    history_range = st.selectbox("Range", list(vitals.CHART_RANGES), index=2, key="history_range")
+    def load(conn):
+        return data_access.appointment_history(conn, get_archive(), patient_id, hospital_id, vitals.range_start(history_range))
+    df = get_read_models().get(("appointment_history", patient_id, hospital_id, history_range), load)
+    if df.empty:
+        st.info("No appointments in this range.")
+    else:
+        st.dataframe(df, hide_index=True)
+
+# Navigation
+def navigation(menu):
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown(f'<div class="header-container"><img src="{theme.LOGO}" class="header-logo" /><h1 class="header-title">Track My Health</h1></div>', unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"<div style='text-align: right; padding: 10px;'><b>{st.session_state.user['name']}</b> ({st.session_state.role.capitalize()}) | <a href='#' onclick='window.location.reload()'>Logout</a></div>", unsafe_allow_html=True)
+    return st.sidebar.selectbox("Menu", menu)
+
+# About Page
+def about_page():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>About Track My Health</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a healthcare team for the About page?")
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.markdown("""
+    **Track My Health** is a premium centralized electronic health record system designed to simplify healthcare management. We empower patients and hospitals with secure, intelligent tools for better care.
+
+    - **Mission**: To revolutionize healthcare with technology.
+    - **Contact**: support@trackmyhealth.com
+    """, unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+    general_health_queries()
@@ -0,0 +1,269 @@
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+import appointments
+import availability
+import data_access
+import metrics
+import patient_import
+import queries
+import search
+from resources import get_archive, get_blob_store, get_db, get_read_models, get_rule_cache, hash_password, run_write
+from views import theme
+from views.charts import vital_sign_trends
+from views.common import appointment_history, current_hospital_id, general_health_queries
+
+# Hospital Dashboard
+def hospital_dashboard():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Welcome, {st.session_state.user["name"]}!</h1><p>Manage your patients and appointments.</p></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a professional doctor in a hospital setting for this section?")
+    try:
+        hospital_id = current_hospital_id()
+        if not hospital_id:
+            st.error("Hospital ID not found.")
+            return
+        def load(conn):
+            # Treatment rules for every patient of the hospital, evaluated in one batch
+            suggestions = get_rule_cache().hospital(conn, hospital_id)
+            suggestions = suggestions[suggestions["kind"] == "treatment"]
+            return metrics.hospital_metrics(conn, hospital_id), suggestions.groupby("title", sort=False)["patient_id"].nunique().rename("Patients").reset_index().rename(columns={"title": "Suggestion"})
+        figures, suggestions = get_read_models().get(("hospital_dashboard", hospital_id), load)
+        cols = st.columns(4)
+        for col, (label, key) in zip(cols, [("Pending Appointments", "scheduled"), ("Patients Today", "today"), ("Completed This Week", "completed_week"), ("No-shows This Week", "no_shows_week")]):
+            with col:
+                st.markdown(f"<div class='metric-card'><div class='metric-label'>{label}</div><div class='metric-value'>{figures[key]}</div></div>", unsafe_allow_html=True)
+        st.markdown("<div class='card'>Manage appointments or update patient records.</div>", unsafe_allow_html=True)
+        if not suggestions.empty:
+            st.subheader("Care Suggestions")
+            st.dataframe(suggestions, hide_index=True)
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
+
+# Appointment actions run as button callbacks, before the page re-renders, so the
+# list always reflects the change. Each is a single write transaction.
+def apply_appointment_action(hospital_id, action):
+    selected = st.session_state.get("appt_selected", [])
+    if not selected:
+        st.session_state.appt_message = "Select at least one appointment."
+        return
+    try:
+        changed, skipped = run_write(appointments.transition, hospital_id, selected, action)
+        message = f"{action}: {len(changed)} appointment(s) updated."
+        if skipped:
+            message += f" Skipped {', '.join(map(str, skipped))} (status does not allow this action)."
+        st.session_state.appt_message = message
+        st.session_state.appt_selected = []
+    except sqlite3.Error as e:
+        st.session_state.appt_message = f"Database error: {e}"
+
+def close_out_appointments(hospital_id, day):
+    try:
+        closed = run_write(appointments.close_out_day, hospital_id, day)
+        st.session_state.appt_message = f"Closed out {closed} appointment(s) for {day}."
+    except sqlite3.Error as e:
+        st.session_state.appt_message = f"Database error: {e}"
+
+# Appointments (Hospital)
+def hospital_appointments():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Manage Appointments</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a hospital staff managing appointments for this section?")
+    try:
+        hospital_id = current_hospital_id()
+        if not hospital_id:
+            st.error("Hospital ID not found.")
+            return
+        # Server-side filters; the list is paged by (appointment_date, id) keyset cursors
+        cols = st.columns(4)
+        with cols[0]: date_from = st.date_input("From", value=datetime.now().date() - timedelta(days=7), key="appt_from")
+        with cols[1]: date_to = st.date_input("To", value=datetime.now().date() + timedelta(days=30), key="appt_to")
+        with cols[2]: status = st.selectbox("Status", ["All"] + appointments.STATUSES, key="appt_status")
+        with cols[3]: patient_filter = st.text_input("Patient ID", key="appt_patient")
+        filters = data_access.appointment_filters(hospital_id, date_from, date_to + timedelta(days=1), None if status == "All" else status, patient_filter.strip() or None)
+        if st.session_state.get("appt_filters") != filters:
+            st.session_state.appt_filters = filters
+            st.session_state.appt_cursors = [None]
+        cursors = st.session_state.appt_cursors
+        def load_page(conn):
+            # Whether this hospital has archived appointments in the range, not just any hospital
+            archived = get_archive().has_rows(conn, "appointments", hospital_id=hospital_id, start=date_from, end=date_to + timedelta(days=1))
+            return (*data_access.appointments_page(conn, filters, after=cursors[-1]), data_access.count_appointments(conn, filters), archived)
+        df, next_cursor, total, archived = get_read_models().get(("appointments_page", tuple(map(tuple, filters)), cursors[-1]), load_page)
+        if archived:
+            # Settled appointments this far back were moved to the archive (archive.py)
+            st.caption("Some settled appointments in this range are archived; they are listed in each patient's medical history.")
+        if not df.empty:
+            first = (len(cursors) - 1) * data_access.PAGE_SIZE + 1
+            st.caption(f"Showing {first}-{first + len(df) - 1} of {total}")
+            st.dataframe(df, hide_index=True)
+            col1, col2 = st.columns(2)
+            with col1: st.button("Previous Page", disabled=len(cursors) == 1, on_click=cursors.pop)
+            with col2: st.button("Next Page", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
+            # Status changes only happen on an explicit action; viewing the page never writes
+            labels = dict(zip(df["ID"].tolist(), (df["ID"].astype(str) + " - " + df["Patient"] + " (" + df["Date"].astype(str) + ", " + df["Status"] + ")").tolist()))
+            # Selections only apply to the page on screen
+            st.session_state.appt_selected = [i for i in st.session_state.get("appt_selected", []) if i in labels]
+            st.multiselect("Select Appointments", list(labels), format_func=labels.get, key="appt_selected")
+            cols = st.columns(len(appointments.ACTIONS))
+            for col, action in zip(cols, appointments.ACTIONS):
+                with col: st.button(action, key=f"appt_action_{action}", on_click=apply_appointment_action, args=(hospital_id, action))
+        else:
+            st.info("No appointments match these filters.")
+        with st.expander("End-of-day Closeout"):
+            closeout_day = st.date_input("Day", value=datetime.now().date(), key="appt_closeout_day")
+            st.button("Close Out Day", on_click=close_out_appointments, args=(hospital_id, closeout_day))
+        if "appt_message" in st.session_state:
+            st.success(st.session_state.pop("appt_message"))
+        with st.expander("Opening Hours & Capacity"):
+            schedule = get_read_models().get(("schedule", hospital_id), lambda conn: availability.load_schedule(conn, hospital_id))
+            with st.form("hospital_hours_form"):
+                cols = st.columns(2)
+                with cols[0]: capacity = st.number_input("Parallel Appointments", min_value=1, max_value=100, value=schedule.capacity)
+                with cols[1]: slot_minutes = st.selectbox("Slot Length (minutes)", [5, 10, 15, 20, 30, 60], index=[5, 10, 15, 20, 30, 60].index(schedule.slot_minutes) if schedule.slot_minutes in [5, 10, 15, 20, 30, 60] else 2)
+                hours = {}
+                for day, name in enumerate(availability.WEEKDAYS):
+                    current = schedule.hours.get(day)
+                    cols = st.columns([2, 1, 2, 2])
+                    with cols[0]: st.markdown(name)
+                    with cols[1]: is_open = st.checkbox("Open", value=current is not None, key=f"hours_open_{day}")
+                    with cols[2]: opens = st.time_input("Opens", value=(datetime.min + timedelta(minutes=current[0] if current else 540)).time(), key=f"hours_opens_{day}", label_visibility="collapsed")
+                    with cols[3]: closes = st.time_input("Closes", value=(datetime.min + timedelta(minutes=current[1] if current else 1020)).time(), key=f"hours_closes_{day}", label_visibility="collapsed")
+                    if is_open:
+                        hours[day] = (opens.strftime("%H:%M"), closes.strftime("%H:%M"))
+                if st.form_submit_button("Save Schedule"):
+                    if any(opens >= closes for opens, closes in hours.values()):
+                        st.warning("Closing time must be after opening time")
+                    else:
+                        run_write(availability.save_schedule, hospital_id, capacity, slot_minutes, hours)
+                        st.success("Schedule saved")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
+
+# Medical History (Hospital)
+def hospital_medical_history():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Patient Medical History</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a doctor reviewing a patient's medical history for this section?")
+    try:
+        hospital_id = current_hospital_id()
+        if not hospital_id:
+            st.error("Hospital ID not found.")
+            return
+        text = st.text_input("Search Patients", placeholder="Name, patient ID, phone, email or condition", key="patient_search")
+        searching = bool(search.terms(text))
+        patients = get_read_models().get(("patient_search", hospital_id, text), lambda conn: search.search_patients(conn, hospital_id, text)) if searching else []
+        if patients:
+            patient_id = st.selectbox("Select Patient", [p[0] for p in patients], format_func=dict(patients).get)
+            def load(conn):
+                history = conn.execute(queries.PATIENT_HOSPITAL_HISTORY, (patient_id, hospital_id)).fetchone()
+                suggestion = get_rule_cache().engine.render(get_rule_cache().patient(conn, patient_id, hospital_id), "treatment")
+                return history, data_access.patient_reports(conn, patient_id, hospital_id), suggestion
+            history, reports, suggestion = get_read_models().get(("patient_record", patient_id, hospital_id), load)
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            # Medical History
+            if history:
+                st.subheader("Medical History")
+                blood_type, allergies, conditions, surgeries, family_history = history
+                st.markdown(f"**Blood Type:** {blood_type}<br>**Allergies:** {allergies}<br>**Chronic Conditions:** {conditions}<br>**Surgeries:** {surgeries if surgeries else 'None'}<br>**Family History:** {family_history if family_history else 'None'}", unsafe_allow_html=True)
+            # Vital Signs
+            vital_sign_trends(patient_id, hospital_id)
+            appointment_history(patient_id, hospital_id)
+            # Reports
+            if not reports.empty:
+                st.subheader("Uploaded Reports")
+                st.dataframe(reports[["File Name", "Upload Date", "Size (bytes)"]], hide_index=True)
+                # Only the selected report is read from the blob store
+                report = reports.loc[st.selectbox("Select Report", reports.index, format_func=lambda i: f"{reports.at[i, 'File Name']} ({reports.at[i, 'Upload Date']})")]
+                if report["content_hash"] and get_blob_store().exists(report["content_hash"]):
+                    with get_blob_store().open(report["content_hash"]) as report_file:
+                        st.download_button("Download Report", report_file, file_name=report["File Name"], key=f"download_{report['id']}")
+            uploaded_report = st.file_uploader("Upload Report", key=f"upload_{patient_id}")
+            if uploaded_report is not None and st.button("Save Report"):
+                digest, size = get_blob_store().put_stream(uploaded_report)
+                current_time = datetime.now().isoformat()
+                run_write(lambda conn: conn.execute(queries.INSERT_REPORT, (patient_id, hospital_id, uploaded_report.name, digest, size, current_time, current_time, current_time)))
+                st.success(f"Report {uploaded_report.name} uploaded")
+            # AI Treatment Suggestions
+            st.subheader("AI Treatment Suggestions")
+            st.markdown("<div class='info-box'>", unsafe_allow_html=True)
+            st.markdown(suggestion, unsafe_allow_html=True)
+            st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown("</div>", unsafe_allow_html=True)
+        elif searching:
+            st.info("No matching patients.")
+        else:
+            st.info(f"Type at least {search.MIN_TERM} characters of a name, ID, phone number or condition.")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
+
+# Upload Patient Details (Hospital)
+def hospital_patient_management():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Patient Management</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a hospital staff adding patient details for this section?")
+    try:
+        hospital_id = current_hospital_id()
+        if not hospital_id:
+            st.error("Hospital ID not found.")
+            return
+        with st.form("add_patient_form"):
+            cols = st.columns(2)
+            with cols[0]: first_name = st.text_input("First Name*")
+            with cols[1]: last_name = st.text_input("Last Name*")
+            cols = st.columns(2)
+            with cols[0]: gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+            with cols[1]: dob = st.date_input("Date of Birth", min_value=datetime(1900, 1, 1), max_value=datetime.now())
+            phone = st.text_input("Phone Number")
+            email = st.text_input("Email")
+            address = st.text_area("Address")
+            cols = st.columns(3)
+            with cols[0]: blood_type = st.selectbox("Blood Type", ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"])
+            with cols[1]: allergies = st.text_input("Allergies")
+            with cols[2]: conditions = st.text_input("Chronic Conditions")
+            submitted = st.form_submit_button("Add Patient")
+            if submitted:
+                if first_name and last_name:
+                    patient_id = f"PAT_{str(uuid.uuid4())[:8]}"
+                    user_id = f"USR_PAT_{str(uuid.uuid4())[:8]}"
+                    password_hash = hash_password(patient_import.DEFAULT_PASSWORD)
+                    current_time = datetime.now().isoformat()
+                    def add_patient(conn):
+                        conn.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (user_id, f"{first_name.lower()}.{last_name.lower()}", password_hash, "patient", f"{first_name} {last_name}", email, current_time, current_time))
+                        conn.execute('INSERT INTO patients (id, user_id, first_name, last_name, date_of_birth, gender, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_id, user_id, first_name, last_name, dob.isoformat(), gender, current_time, current_time))
+                        conn.execute('INSERT INTO contact_info (patient_id, phone, email, address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)', (patient_id, phone, email, address, current_time, current_time))
+                        conn.execute('INSERT INTO medical_history (patient_id, hospital_id, blood_type, allergies, chronic_conditions, uploaded_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)', (patient_id, hospital_id, blood_type, allergies, conditions, current_time, current_time))
+                    run_write(add_patient)
+                    st.success(f"Patient {first_name} {last_name} added with ID: {patient_id}")
+                else:
+                    st.warning("First and last names are required")
+        with st.expander("Bulk Import"):
+            st.caption("CSV with a header row (" + ", ".join(patient_import.FIELDS) + "), or a FHIR Patient Bundle / NDJSON file.")
+            upload = st.file_uploader("Patient File", type=["csv", "json", "ndjson"], key="patient_import_file")
+            if upload is not None and st.button("Import Patients"):
+                bar = st.progress(0.0, text="Importing...")
+                # Batches wait their turn however long it takes: a batch given up on would
+                # leave the earlier ones committed with no count shown to retry from
+                try:
+                    imported, errors = patient_import.import_patients(get_db(), hospital_id, patient_import.read_file(upload.name, upload), write=lambda fn, *args: run_write(fn, *args, timeout=None),
+                                                                      progress=lambda n: bar.progress(min(1.0, upload.tell() / max(upload.size, 1)), text=f"{n:,} rows processed"))
+                except patient_import.UnreadableFile as e:
+                    imported, errors = e.imported, e.errors
+                    st.error(f"Could not read {upload.name}: {e}")
+                except ValueError as e:  # unsupported file type
+                    imported, errors = 0, []
+                    st.error(f"Could not read {upload.name}: {e}")
+                bar.empty()
+                if imported:
+                    st.success(f"Imported {imported:,} patients.")
+                if errors:
+                    st.warning(f"{len(errors):,} rows were rejected.")
+                    report = pd.DataFrame(errors, columns=["Row", "Error"])
+                    st.dataframe(report.head(1000), hide_index=True)
+                    st.download_button("Download Rejected Rows", report.to_csv(index=False), file_name="import_errors.csv", mime="text/csv")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
@@ -0,0 +1,127 @@
+import sqlite3
+import uuid
+from datetime import datetime
+
+import streamlit as st
+
+import passwords
+import queries
+from resources import get_db, get_hasher, hash_password, run_write
+from views import theme
+
+def authenticate(username, password):
+    try:
+        with get_db().read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(queries.USER_BY_USERNAME, (username,))
+            user = cursor.fetchone()
+        # Unknown usernames are checked against a dummy hash, so they take as long
+        matches, rehashed = get_hasher().verify(password, user[1] if user else None)
+        if not matches:
+            return None
+        if rehashed:
+            # Legacy SHA-256 (or a cheaper scrypt cost): store the current hash
+            run_write(lambda conn: conn.execute(queries.UPDATE_PASSWORD_HASH, (rehashed, user[0], user[1])))
+        return {'user_id': user[0], 'role': user[2], 'name': user[3], 'patient_id': user[4], 'hospital_id': user[5]}
+    except sqlite3.Error as e:
+        st.error(f"Database error during authentication: {e}")
+        return None
+
+def update_last_login(user_id):
+    try:
+        current_time = datetime.now().isoformat()
+        run_write(lambda conn: conn.execute(queries.UPDATE_LAST_LOGIN, (current_time, user_id)))
+    except sqlite3.Error as e:
+        st.error(f"Database error during last login update: {e}")
+
+# Login Page
+def login_page():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Track My Health</h1><p>Your trusted partner in centralized health records.</p></div>', unsafe_allow_html=True)
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.subheader("Login")
+        role = st.selectbox("Login as", ["Patient", "Hospital", "Admin"])
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        if st.button("Login"):
+            if username and password:
+                try:
+                    user = authenticate(username, password)
+                except passwords.Busy:
+                    st.error("Too many sign-ins right now. Please try again in a moment.")
+                    st.stop()
+                if user:
+                    st.session_state.user = user
+                    st.session_state.role = user['role']
+                    st.session_state.authenticated = True
+                    update_last_login(user['user_id'])
+                    st.rerun()
+                else:
+                    st.error("Invalid username or password. Please try again.")
+            else:
+                st.warning("Please enter both username and password.")
+        st.markdown("<div class='info-box'>Demo Credentials:<br>Patient: patient1 / patient123<br>Hospital: hospital1 / hospital123<br>Admin: admin / admin123</div>", unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+    with col2:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.subheader("New User? Register Here")
+        reg_role = st.selectbox("Register as", ["Patient", "Hospital"])
+        if reg_role == "Patient":
+            with st.form("patient_register_form"):
+                cols = st.columns(2)
+                with cols[0]: first_name = st.text_input("First Name*")
+                with cols[1]: last_name = st.text_input("Last Name*")
+                cols = st.columns(2)
+                with cols[0]: gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+                with cols[1]: dob = st.date_input("Date of Birth", min_value=datetime(1900, 1, 1), max_value=datetime.now())
+                email = st.text_input("Email*")
+                phone = st.text_input("Phone Number*")
+                submitted = st.form_submit_button("Register")
+                if submitted:
+                    if first_name and last_name and email and phone:
+                        username = f"{first_name.lower()}.{last_name.lower()}"
+                        password = "patient123"
+                        user_id = f"USR_PAT_{str(uuid.uuid4())[:8]}"
+                        patient_id = f"PAT_{str(uuid.uuid4())[:8]}"
+                        password_hash = hash_password(password)
+                        current_time = datetime.now().isoformat()
+                        try:
+                            def register(conn):
+                                cursor = conn.cursor()
+                                cursor.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (user_id, username, password_hash, "patient", f"{first_name} {last_name}", email, current_time, current_time))
+                                cursor.execute('INSERT INTO patients (id, user_id, first_name, last_name, date_of_birth, gender, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (patient_id, user_id, first_name, last_name, dob.isoformat(), gender, current_time, current_time))
+                                cursor.execute('INSERT INTO contact_info (patient_id, phone, email, address, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)', (patient_id, phone, email, "", current_time, current_time))
+                            run_write(register)
+                            st.success(f"Registration successful! Username: {username}, Password: {password}")
+                        except sqlite3.Error as e:
+                            st.error(f"Error: {e}")
+                    else:
+                        st.warning("Please fill all required fields")
+        else:
+            with st.form("hospital_register_form"):
+                hospital_name = st.text_input("Hospital Name*")
+                address = st.text_area("Address*")
+                phone = st.text_input("Phone Number*")
+                email = st.text_input("Email*")
+                submitted = st.form_submit_button("Submit for Approval")
+                if submitted:
+                    if hospital_name and address and phone and email:
+                        username = hospital_name.lower().replace(" ", "")
+                        password = "hospital123"
+                        user_id = f"USR_HOS_{str(uuid.uuid4())[:8]}"
+                        hospital_id = f"HOS_{str(uuid.uuid4())[:8]}"
+                        password_hash = hash_password(password)
+                        current_time = datetime.now().isoformat()
+                        try:
+                            def register(conn):
+                                cursor = conn.cursor()
+                                cursor.execute('INSERT INTO users (id, username, password_hash, role, name, email, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (user_id, username, password_hash, "hospital", hospital_name, email, current_time, current_time))
+                                cursor.execute('INSERT INTO hospitals (id, user_id, name, address, phone, email, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (hospital_id, user_id, hospital_name, address, phone, email, "pending", current_time, current_time))
+                            run_write(register)
+                            st.success("Registration submitted for admin approval.")
+                        except sqlite3.Error as e:
+                            st.error(f"Error: {e}")
+                    else:
+                        st.warning("Please fill all required fields")
+        st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,133 @@
+import sqlite3
+from datetime import datetime
+
+import streamlit as st
+
+import availability
+import data_access
+import metrics
+import queries
+from resources import get_read_models, get_rule_cache, run_write
+from views import theme
+from views.charts import vital_sign_trends
+from views.common import appointment_history, current_patient_id, general_health_queries
+
+# Patient Dashboard
+def patient_dashboard():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Welcome, {st.session_state.user["name"]}!</h1><p>Manage your health records with ease.</p></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a happy patient managing their health records for this section?")
+    try:
+        patient_id = current_patient_id()
+        if not patient_id:
+            st.error("Patient ID not found.")
+            return
+        def load(conn):
+            return metrics.patient_metrics(conn, patient_id), get_rule_cache().engine.render(get_rule_cache().patient(conn, patient_id), "tip")
+        figures, tips = get_read_models().get(("patient_dashboard", patient_id), load)
+        health_score = "–" if figures["health_score"] is None else figures["health_score"]
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"<div class='metric-card'><div class='metric-label'>Upcoming Appointments</div><div class='metric-value'>{figures['scheduled']}</div></div>", unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"<div class='metric-card'><div class='metric-label'>Health Score</div><div class='metric-value'>{health_score}</div></div>", unsafe_allow_html=True)
+        st.markdown("<div class='card'>Next Steps: Book an appointment or view your medical history.</div>", unsafe_allow_html=True)
+        # AI Health Tips
+        st.markdown("<div class='info-box'>", unsafe_allow_html=True)
+        st.subheader("AI Health Tips")
+        st.markdown(tips, unsafe_allow_html=True)
+        st.markdown("</div>", unsafe_allow_html=True)
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
+
+# Booking runs as a button callback, so the slot list rendered afterwards no
+# longer offers the time just taken
+def book_appointment(patient_id, hospital_id, hospital_name, duration):
+    slot, reason = st.session_state.get("booking_slot"), st.session_state.get("booking_reason", "").strip()
+    if not reason:
+        st.session_state.booking_message = ("warning", "Please provide a reason for the visit")
+        return
+    try:
+        run_write(availability.book, hospital_id, patient_id, slot, duration, reason)
+        st.session_state.booking_message = ("success", f"Appointment booked with {hospital_name} on {slot:%Y-%m-%d} at {slot:%H:%M}")
+        st.session_state.booking_reason = ""
+    except availability.SlotUnavailable as e:
+        st.session_state.booking_message = ("error", f"{e} Please pick another time.")
+    except sqlite3.Error as e:
+        st.session_state.booking_message = ("error", f"Database error: {e}")
+
+# Appointments (Patient)
+def patient_appointments():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Book an Appointment</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a patient booking an appointment at a hospital for this section?")
+    try:
+        patient_id = current_patient_id()
+        if not patient_id:
+            st.error("Patient ID not found.")
+            return
+        hospitals = get_read_models().get(("approved_hospitals",), lambda conn: conn.execute(queries.APPROVED_HOSPITALS).fetchall())
+        # Warnings here skip only the booking form: the patient's own upcoming
+        # appointments below are shown either way
+        if not hospitals:
+            st.warning("No approved hospitals available to book an appointment.")
+        else:
+            hospital = st.selectbox("Select Hospital", [f"{h[1]} ({h[2]})" for h in hospitals], format_func=lambda x: x.split(" (")[0])
+            hospital_id = next(h[0] for h in hospitals if f"{h[1]} ({h[2]})" == hospital)
+            col1, col2 = st.columns(2)
+            with col1:
+                from_date = st.date_input("Earliest Date", min_value=datetime.now().date())
+            with col2:
+                duration = st.slider("Duration (minutes)", 15, 120, 30, 15)
+            # Only times the hospital is open and has room for are offered; a cached
+            # search can contain times that have passed since, which are dropped here
+            now = datetime.now()
+            after = max(now, datetime.combine(from_date, datetime.min.time()))
+            slots = get_read_models().get(("free_slots", hospital_id, from_date, duration), lambda conn: availability.free_slots(conn, hospital_id, duration, after))
+            slots = [slot for slot in slots if slot >= now]
+            if not slots:
+                st.warning("No free slots at this hospital in the coming weeks.")
+            else:
+                st.selectbox("Available Times", slots, format_func=lambda t: t.strftime("%a %d %b %Y, %H:%M"), key="booking_slot")
+                st.text_input("Reason for Visit", key="booking_reason")
+                st.button("Book Appointment", on_click=book_appointment, args=(patient_id, hospital_id, hospital.split(" (")[0], duration))
+        if "booking_message" in st.session_state:
+            level, message = st.session_state.pop("booking_message")
+            getattr(st, level)(message)
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    
+    # Upcoming Appointments
+    st.markdown("<h3>Upcoming Appointments</h3>", unsafe_allow_html=True)
+    try:
+        df = get_read_models().get(("upcoming_appointments", patient_id), lambda conn: data_access.upcoming_appointments(conn, patient_id))
+        if not df.empty:
+            st.dataframe(df, hide_index=True)
+        else:
+            st.info("No upcoming appointments.")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
+
+# Medical History (Patient)
+def patient_medical_history():
+    st.markdown(f'<div class="hero-section"><img src="{theme.LOGO}" class="header-logo" /><h1>Your Medical History</h1></div>', unsafe_allow_html=True)
+    st.markdown("Would you like to generate an image of a patient reviewing their medical history for this section?")
+    try:
+        patient_id = current_patient_id()
+        if not patient_id:
+            st.error("Patient ID not found.")
+            return
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        history = get_read_models().get(("patient_history", patient_id), lambda conn: conn.execute(queries.PATIENT_HISTORY, (patient_id,)).fetchone())
+        if history:
+            st.subheader("Medical History")
+            blood_type, allergies, conditions, surgeries, family_history = history
+            st.markdown(f"**Blood Type:** {blood_type}<br>**Allergies:** {allergies}<br>**Chronic Conditions:** {conditions}<br>**Surgeries:** {surgeries if surgeries else 'None'}<br>**Family History:** {family_history if family_history else 'None'}", unsafe_allow_html=True)
+        else:
+            st.info("No medical history available.")
+        vital_sign_trends(patient_id)
+        appointment_history(patient_id)
+        st.markdown("</div>", unsafe_allow_html=True)
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
+    general_health_queries()
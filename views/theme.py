@@ -0,0 +1,58 @@
+import base64
+
+# Static assets, built once per process when the module is first imported; every
+# rerun only re-sends them.
+
+# Custom CSS with Apollo Hospitals-Inspired Styling
+CSS = """
+    <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@600&family=Lato:wght@400;500&display=swap" rel="stylesheet">
+    <style>
+    .main { background-color: #FFFFFF; color: #28A745; }
+    h1, h2, h3 { font-family: 'Poppins', sans-serif; color: #28A745; letter-spacing: 1px; }
+    p, label, div.stTextInput > div > div > input, div.stSelectbox > div > div > select { font-family: 'Lato', sans-serif; }
+    .hero-section { background: linear-gradient(135deg, #28A745 0%, #FF69B4 100%); padding: 40px; border-radius: 15px; color: white; text-align: center; margin-bottom: 20px; animation: fadeIn 1s ease-in; }
+    @keyframes fadeIn { 0% { opacity: 0; } 100% { opacity: 1; } }
+    .card { border-radius: 15px; padding: 20px; background-color: #F8F9FA; box-shadow: 0 6px 12px rgba(40, 167, 69, 0.1); margin-bottom: 20px; transition: transform 0.3s ease; animation: fadeIn 1.5s ease-in; }
+    .card:hover { transform: translateY(-5px); }
+    .patient-card { background-color: #FFFFFF; border-left: 5px solid #28A745; padding: 15px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0, 0, 0, 0.05); margin-bottom: 15px; }
+    .success-box { background-color: #D4EDDA; color: #155724; padding: 15px; border-radius: 8px; border-left: 5px solid #28A745; }
+    .warning-box { background-color: #FFF3CD; color: #856404; padding: 15px; border-radius: 8px; border-left: 5px solid #FFC107; }
+    .info-box { background-color: #FFE6F0; color: #FF69B4; padding: 15px; border-radius: 8px; border-left: 5px solid #FF69B4; animation: fadeIn 2s ease-in; }
+    .stButton > button { background: linear-gradient(90deg, #28A745 0%, #FF69B4 100%); color: white; border-radius: 8px; padding: 12px 24px; font-weight: 500; border: none; transition: all 0.3s ease; font-family: 'Lato', sans-serif; }
+    .stButton > button:hover { background: linear-gradient(90deg, #218838 0%, #FF1493 100%); box-shadow: 0 5px 15px rgba(40, 167, 69, 0.3); }
+    .delete-btn { background: #DC3545 !important; }
+    .delete-btn:hover { background: #C82333 !important; }
+    .css-1d391kg { background: linear-gradient(135deg, #28A745 0%, #FF69B4 100%); }
+    .css-1d391kg .sidebar-content { background: transparent; }
+    div.stButton > button:first-child { background: linear-gradient(90deg, #28A745 0%, #FF69B4 100%); color: white; border-radius: 8px; padding: 12px 24px; font-weight: 500; border: none; transition: all 0.3s ease; }
+    div.stButton > button:hover { background: linear-gradient(90deg, #218838 0%, #FF1493 100%); box-shadow: 0 5px 15px rgba(40, 167, 69, 0.3); }
+    .st-emotion-cache-16idsys p { font-size: 16px; font-family: 'Lato', sans-serif; }
+    .st-emotion-cache-1y4p8pa { padding: 15px; border-radius: 0 0 15px 15px; border: 1px solid #E0E0E0; border-top: none; }
+    .st-emotion-cache-1y4p8pa > div:first-child { border-radius: 15px 15px 0 0; overflow: hidden; }
+    .dataframe { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+    .dataframe th { background: linear-gradient(90deg, #28A745 0%, #FF69B4 100%); color: white; padding: 12px; text-align: left; font-family: 'Lato', sans-serif; }
+    .dataframe td { padding: 12px; border-bottom: 1px solid #E0E0E0; font-family: 'Lato', sans-serif; }
+    .dataframe tr:nth-child(even) { background-color: #F8F9FA; }
+    .dataframe tr:hover { background-color: #E9ECEF; }
+    .header-container { display: flex; align-items: center; padding: 1.5rem; background-color: #FFFFFF; border-radius: 15px; margin-bottom: 20px; box-shadow: 0 6px 12px rgba(40, 167, 69, 0.1); }
+    .header-logo { width: 60px; margin-right: 15px; }
+    .header-title { font-size: 2.5rem; font-weight: 700; color: #28A745; margin: 0; }
+    .metric-card { background-color: #FFFFFF; padding: 20px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0, 0, 0, 0.05); text-align: center; animation: fadeIn 1.5s ease-in; }
+    .metric-value { font-size: 2rem; font-weight: 700; color: #28A745; margin: 10px 0; }
+    .metric-label { font-size: 1rem; color: #6C757D; font-family: 'Lato', sans-serif; }
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+    </style>
+    """
+
+LOGO_SVG = '''
+    <svg width="60" height="60" viewBox="0 0 60 60" xmlns="http://www.w3.org/2000/svg">
+        <circle cx="30" cy="30" r="30" fill="#28A745"/>
+        <path d="M15 30 Q30 10 45 30 Q30 50 15 30 Z" fill="#FF69B4" stroke="#FFFFFF" stroke-width="2"/>
+        <path d="M25 20 V40 M35 20 V40" stroke="#FFFFFF" stroke-width="2"/>
+        <path d="M20 30 H40" stroke="#FFFFFF" stroke-width="2" stroke-dasharray="5"/>
+    </svg>
+    '''
+
+# Logo as a data URI, for <img> tags in page headers
+LOGO = "data:image/svg+xml;base64," + base64.b64encode(LOGO_SVG.encode()).decode()
@@ -0,0 +1,221 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# Vital-sign time series for the trend charts.
+#
+# Raw vital_signs rows are used while the requested range is small; longer ranges
+# read the hourly or daily rollups (migration 7) maintained by vitals_ingest.
+# Whatever the source, each chart is downsampled with LTTB so the browser
+# receives at most MAX_CHART_POINTS points regardless of history length.
+#
+# Old raw rows are moved to the archive's Parquet parts (archive.py); given the
+# archive, a range reaching back to them counts and reads them together with the
+# live rows. The rollups keep every reading, archived or not.
+
+MAX_CHART_POINTS = 500
+# A resolution is used while it yields up to this many times MAX_CHART_POINTS
+# rows; LTTB then thins them, keeping peaks a coarser rollup would average away.
+OVERSAMPLE = 4
+RAW_COLUMNS = {
+    "temperature": "temperature",
+    "systolic": "CASE WHEN instr(blood_pressure, '/') > 1 THEN CAST(substr(blood_pressure, 1, instr(blood_pressure, '/') - 1) AS REAL) END",
+    "diastolic": "CASE WHEN instr(blood_pressure, '/') > 1 THEN CAST(substr(blood_pressure, instr(blood_pressure, '/') + 1) AS REAL) END",
+    "pulse": "pulse",
+    "respiratory_rate": "respiratory_rate",
+    "oxygen_saturation": "oxygen_saturation",
+    "weight": "weight",
+    "bmi": "bmi",
+}
+BUCKET_FORMATS = {"hour": "%Y-%m-%dT%H:00:00", "day": "%Y-%m-%d"}
+
+
+def _scope(patient_id, hospital_id):
+    if hospital_id is None:
+        return "patient_id = ?", [patient_id]
+    return "patient_id = ? AND hospital_id = ?", [patient_id, hospital_id]
+
+
+def _raw_range(start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("recorded_date >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        clauses.append("recorded_date <= ?")
+        params.append(end.isoformat())
+    return clauses, params
+
+
+def _bucket_range(resolution, start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("bucket >= ?")
+        params.append(start.strftime(BUCKET_FORMATS[resolution]))
+    if end is not None:
+        clauses.append("bucket <= ?")
+        params.append(end.strftime(BUCKET_FORMATS[resolution]))
+    return clauses, params
+
+
+def raw_count_query(patient_id, hospital_id, start, end, limit):
+    scope, params = _scope(patient_id, hospital_id)
+    clauses, range_params = _raw_range(start, end)
+    return f"SELECT COUNT(*) FROM (SELECT 1 FROM vital_signs WHERE {' AND '.join([scope] + clauses)} LIMIT ?)", params + range_params + [limit]
+
+
+def bucket_count_query(patient_id, hospital_id, start, end, resolution, limit):
+    scope, params = _scope(patient_id, hospital_id)
+    clauses, range_params = _bucket_range(resolution, start, end)
+    return f"SELECT COUNT(*) FROM (SELECT DISTINCT bucket FROM vital_rollups WHERE {' AND '.join([scope, 'resolution = ?'] + clauses)} LIMIT ?)", params + [resolution] + range_params + [limit]
+
+
+def raw_series_query(patient_id, hospital_id, start, end, metrics):
+    scope, params = _scope(patient_id, hospital_id)
+    clauses, range_params = _raw_range(start, end)
+    columns = ", ".join(f"{RAW_COLUMNS[m]} AS {m}" for m in metrics)
+    return f"SELECT recorded_date, {columns} FROM vital_signs WHERE {' AND '.join([scope] + clauses)} ORDER BY recorded_date", params + range_params
+
+
+def rollup_series_query(patient_id, hospital_id, start, end, metrics, resolution):
+    scope, params = _scope(patient_id, hospital_id)
+    clauses, range_params = _bucket_range(resolution, start, end)
+    placeholders = ", ".join("?" for _ in metrics)
+    # Rows from several hospitals in the same bucket are combined into one mean
+    sql = f"SELECT bucket, metric, SUM(total) / SUM(n) AS value FROM vital_rollups WHERE {' AND '.join([scope, 'resolution = ?', f'metric IN ({placeholders})'] + clauses)} GROUP BY bucket, metric ORDER BY bucket"
+    return sql, params + [resolution] + list(metrics) + range_params
+
+
+def plan_queries():
+    """Representative statements for the query-plan check in queries.py."""
+    start, end = datetime(2000, 1, 1), datetime(2000, 2, 1)
+    statements = {}
+    for scope, hospital_id in (("PATIENT", None), ("PATIENT_HOSPITAL", "H")):
+        statements[f"VITALS_RAW_COUNT_{scope}"] = raw_count_query("P", hospital_id, start, end, 1)[0]
+        statements[f"VITALS_BUCKET_COUNT_{scope}"] = bucket_count_query("P", hospital_id, start, end, "hour", 1)[0]
+        statements[f"VITALS_RAW_SERIES_{scope}"] = raw_series_query("P", hospital_id, start, end, ["pulse"])[0]
+        statements[f"VITALS_ROLLUP_SERIES_{scope}"] = rollup_series_query("P", hospital_id, start, end, ["pulse"], "day")[0]
+    return statements
+
+
+def choose_resolution(conn, patient_id, hospital_id=None, start=None, end=None, max_points=MAX_CHART_POINTS, archived=0):
+    """Finest of raw/hour/day with at most OVERSAMPLE * max_points rows; counting stops at the limit.
+
+    `archived` raw rows of the range, already read from the archive, count as well.
+    """
+    limit = OVERSAMPLE * max_points
+    raw = conn.execute(*raw_count_query(patient_id, hospital_id, start, end, limit + 1)).fetchone()[0] + archived
+    if raw <= limit:
+        return "raw"
+    hourly = conn.execute(*bucket_count_query(patient_id, hospital_id, start, end, "hour", limit + 1)).fetchone()[0]
+    return "hour" if hourly <= limit else "day"
+
+
+def _load_raw(conn, patient_id, hospital_id, start, end, metrics):
+    sql, params = raw_series_query(patient_id, hospital_id, start, end, metrics)
+    df = pd.read_sql_query(sql, conn, params=params)
+    df["recorded_date"] = pd.to_datetime(df["recorded_date"], format="ISO8601")
+    return df.set_index("recorded_date")
+
+
+def _load_archived(conn, archive, patient_id, hospital_id, start, end, metrics):
+    # The columns of raw_series_query, derived from the archived rows as its SQL does
+    sources = sorted({"blood_pressure" if metric in ("systolic", "diastolic") else metric for metric in metrics})
+    archived = archive.table(conn, "vital_signs", ["recorded_date"] + sources, patient_id, hospital_id, start, end)
+    if archived is None or archived.num_rows == 0:
+        return None
+    if "blood_pressure" in sources:
+        # All-null input partitions into a single column
+        parts = archived.column("blood_pressure").to_pandas().str.partition("/").reindex(columns=range(3))
+        measured = (parts[1] == "/") & (parts[0] != "")
+    columns = {}
+    for metric in metrics:
+        if metric in ("systolic", "diastolic"):
+            columns[metric] = pd.to_numeric(parts[0 if metric == "systolic" else 2].where(measured), errors="coerce").to_numpy()
+        else:
+            columns[metric] = archived.column(metric).to_numpy().astype("float64")  # nulls are NaN
+    index = pd.DatetimeIndex(pd.to_datetime(archived.column("recorded_date").to_numpy(zero_copy_only=False), format="ISO8601"), name="recorded_date")
+    return pd.DataFrame(columns, index=index)
+
+
+def _load_rollup(conn, patient_id, hospital_id, start, end, metrics, resolution):
+    sql, params = rollup_series_query(patient_id, hospital_id, start, end, metrics, resolution)
+    long = pd.read_sql_query(sql, conn, params=params)
+    wide = long.pivot(index="bucket", columns="metric", values="value").reindex(columns=list(metrics))
+    wide.index = pd.to_datetime(wide.index, format="ISO8601")
+    wide.index.name = "recorded_date"
+    return wide
+
+
+def has_vitals(conn, patient_id, hospital_id=None):
+    scope, params = _scope(patient_id, hospital_id)
+    return conn.execute(f"SELECT 1 FROM vital_rollups WHERE {scope} LIMIT 1", params).fetchone() is not None
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: positions of `threshold` points preserving the series' shape."""
+    n = len(x)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        stop = int((i + 1) * bucket_size) + 1
+        next_start = stop
+        next_stop = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def downsample(df, max_points=MAX_CHART_POINTS):
+    """Keep at most max_points rows: the union of each column's LTTB selection."""
+    if len(df) <= max_points:
+        return df
+    per_metric = max(3, max_points // max(1, len(df.columns)))
+    x = df.index.asi8.astype("float64")
+    keep = set()
+    for column in df.columns:
+        values = df[column]
+        mask = values.notna().to_numpy()
+        if mask.sum() == 0:
+            continue
+        positions = mask.nonzero()[0]
+        picked = lttb_indices(x[mask], values.to_numpy(dtype="float64")[mask], per_metric)
+        keep.update(positions[picked].tolist())
+    return df.iloc[sorted(keep)[:max_points]]
+
+
+def load_series(conn, patient_id, metrics, hospital_id=None, start=None, end=None, max_points=MAX_CHART_POINTS, archive=None):
+    """Return (resolution, DataFrame indexed by time with one column per metric)."""
+    archived = None
+    if archive is not None and choose_resolution(conn, patient_id, hospital_id, start, end, max_points) == "raw":
+        # Read once, only while the live rows alone would still be drawn raw
+        archived = _load_archived(conn, archive, patient_id, hospital_id, start, end, metrics)
+    resolution = choose_resolution(conn, patient_id, hospital_id, start, end, max_points, 0 if archived is None else len(archived))
+    if resolution == "raw":
+        df = _load_raw(conn, patient_id, hospital_id, start, end, metrics)
+        if archived is not None:
+            df = pd.concat([archived, df]).sort_index(kind="stable")
+    else:
+        df = _load_rollup(conn, patient_id, hospital_id, start, end, metrics, resolution)
+    return resolution, downsample(df, max_points)
+
+
+# Chart range choices offered by the medical history pages: label -> days back (None = all)
+CHART_RANGES = {"Last 7 days": 7, "Last 30 days": 30, "Last year": 365, "All time": None}
+
+
+def range_start(label, now=None):
+    days = CHART_RANGES[label]
+    if days is None:
+        return None
+    return (now or datetime.now()) - timedelta(days=days)
@@ -0,0 +1,431 @@
+import argparse
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import vitals
+from api import ApiError, authenticate
+from changefeed import is_loopback
+from db import LOCK_RETRIES
+
+# Vital-sign ingestion for bedside devices.
+#
+# Readings are validated and normalized on arrival (BMI is always computed here,
+# never taken from the device), then handed to a VitalsWriter: a bounded
+# write-behind buffer drained by one thread that commits whatever has queued up
+# since its last commit as one transaction (group commit). When the buffer is
+# full, submitters wait briefly and then get Backpressure, which the HTTP
+# endpoint turns into 503 + Retry-After.
+#
+# This is the only write path for vital_signs. It also maintains vital_rollups,
+# aggregating each batch in Python before upserting (see migration 9).
+#
+# Accepted readings have already been acknowledged (202), so the writer does not
+# drop a batch: while another writer holds the lock it retries with backoff (the
+# buffer filling up meanwhile is what pushes back on devices), and if a reading
+# fails otherwise the batch is redone one reading at a time, so only the readings
+# that fail are lost, counted in stats["failed"].
+#
+# Requests need a bearer token, checked as api.py checks them: an admin's, or an
+# approved hospital's, which may post only readings of that hospital. Only a
+# server bound to loopback may be started without (--no-auth). Bodies are read
+# whole, so any over MAX_BODY_BYTES are refused with 413 before being read.
+
+METRICS = list(vitals.RAW_COLUMNS)
+INSERT_VITALS = "INSERT INTO vital_signs (patient_id, hospital_id, recorded_date, temperature, blood_pressure, pulse, respiratory_rate, oxygen_saturation, weight, height, bmi, recorded_by, notes, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+UPSERT_ROLLUP = """
+    INSERT INTO vital_rollups (patient_id, resolution, bucket, hospital_id, metric, n, total, min_value, max_value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (patient_id, resolution, bucket, hospital_id, metric) DO UPDATE SET
+        n = n + excluded.n, total = total + excluded.total,
+        min_value = min(min_value, excluded.min_value), max_value = max(max_value, excluded.max_value)
+"""
+# Plausible ranges; readings outside them are rejected rather than charted
+RANGES = {
+    "temperature": (80.0, 115.0),  # °F
+    "systolic": (50, 300),
+    "diastolic": (20, 200),
+    "pulse": (20, 300),
+    "respiratory_rate": (4, 80),
+    "oxygen_saturation": (50.0, 100.0),
+    "weight": (1.0, 1500.0),  # lbs
+    "height": (10.0, 110.0),  # inches
+}
+INTEGER_FIELDS = ("systolic", "diastolic", "pulse", "respiratory_rate")
+
+MAX_PENDING = 50_000
+MAX_BATCH = 10_000
+SUBMIT_TIMEOUT = 1.0
+RETRY_AFTER_SECONDS = 1
+# A full MAX_BATCH of readings is well under 4 MiB of JSON
+MAX_BODY_BYTES = 4 * 1024 * 1024
+# Backoff between attempts while the write lock is taken: doubling, up to the cap
+LOCK_BACKOFF = 0.05
+MAX_LOCK_BACKOFF = 2.0
+
+
+class Backpressure(Exception):
+    """The write-behind buffer stayed full for the whole submit timeout."""
+
+
+def _number(reading, field):
+    value = reading.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        value = round(float(value)) if field in INTEGER_FIELDS else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number") from None
+    low, high = RANGES[field]
+    if not low <= value <= high:
+        raise ValueError(f"{field} {value} is outside {low}-{high}")
+    return value
+
+
+def _timestamp(value, now):
+    if not value:
+        return now
+    try:
+        when = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"recorded_date {value!r} is not an ISO 8601 timestamp") from None
+    # Stored as local naive time like every other timestamp in the database
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when
+
+
+def normalize(reading, now=None):
+    """Validate one reading; returns (vital_signs row, metric values in METRICS order)."""
+    now = now or datetime.now()
+    if not isinstance(reading, dict):
+        raise ValueError("reading must be an object")
+    patient_id = reading.get("patient_id")
+    if not patient_id:
+        raise ValueError("patient_id is required")
+    values = {field: _number(reading, field) for field in RANGES if field not in ("systolic", "diastolic")}
+    systolic, diastolic = _number(reading, "systolic"), _number(reading, "diastolic")
+    blood_pressure = reading.get("blood_pressure")
+    if blood_pressure:
+        try:
+            systolic, diastolic = str(blood_pressure).split("/")
+        except ValueError:
+            raise ValueError("blood_pressure must look like 120/80") from None
+        systolic = _number({"systolic": systolic}, "systolic")
+        diastolic = _number({"diastolic": diastolic}, "diastolic")
+    if (systolic is None) != (diastolic is None):
+        raise ValueError("systolic and diastolic must be given together")
+    blood_pressure = f"{systolic}/{diastolic}" if systolic is not None else None
+    bmi = None
+    if values["weight"] is not None and values["height"] is not None:
+        bmi = round(703 * values["weight"] / values["height"] ** 2, 1)
+    if all(v is None for v in values.values()) and systolic is None:
+        raise ValueError("reading has no measurements")
+    recorded = _timestamp(reading.get("recorded_date"), now).isoformat(timespec="seconds")
+    created = now.isoformat()
+    row = (patient_id, reading.get("hospital_id"), recorded, values["temperature"], blood_pressure, values["pulse"], values["respiratory_rate"],
+           values["oxygen_saturation"], values["weight"], values["height"], bmi, reading.get("recorded_by"), reading.get("notes"), created, created)
+    metrics = (values["temperature"], systolic, diastolic, values["pulse"], values["respiratory_rate"], values["oxygen_saturation"], values["weight"], bmi)
+    return row, metrics
+
+
+def validate_batch(readings, now=None):
+    """Split readings into normalized items and [(index, error)]."""
+    now = now or datetime.now()
+    items, errors = [], []
+    for index, reading in enumerate(readings):
+        try:
+            items.append(normalize(reading, now))
+        except ValueError as e:
+            errors.append((index, str(e)))
+    return items, errors
+
+
+def rollup_rows(items):
+    """Hourly and daily aggregates for a batch, one row per vital_rollups key."""
+    totals = {}
+    for row, metrics in items:
+        patient_id, hospital_id, recorded = row[0], row[1] or "", row[2]
+        # recorded_date is normalized to YYYY-MM-DDTHH:MM:SS, so buckets are prefixes
+        for resolution, bucket in (("hour", recorded[:13] + ":00:00"), ("day", recorded[:10])):
+            for metric, value in zip(METRICS, metrics):
+                if value is None:
+                    continue
+                key = (patient_id, resolution, bucket, hospital_id, metric)
+                agg = totals.get(key)
+                if agg is None:
+                    totals[key] = [1, value, value, value]
+                else:
+                    agg[0] += 1
+                    agg[1] += value
+                    if value < agg[2]:
+                        agg[2] = value
+                    if value > agg[3]:
+                        agg[3] = value
+    return [key + tuple(agg) for key, agg in totals.items()]
+
+
+def write_readings(conn, items):
+    """Insert normalized items and fold them into vital_rollups; call inside a write transaction."""
+    conn.executemany(INSERT_VITALS, [row for row, _ in items])
+    conn.executemany(UPSERT_ROLLUP, rollup_rows(items))
+
+
+def ingest(db, readings):
+    """Synchronous path: validate and commit one batch; returns (stored count, [(index, error)])."""
+    items, errors = validate_batch(readings)
+    if items:
+        with db.write() as conn:
+            write_readings(conn, items)
+    return len(items), errors
+
+
+def _locked(error):
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+
+class VitalsWriter:
+    """Bounded write-behind buffer with a single group-committing writer thread."""
+
+    def __init__(self, db, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        self.db = db
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._in_flight = 0
+        self.stats = {"accepted": 0, "written": 0, "commits": 0, "rejected": 0, "backpressure": 0, "failed": 0, "lock_retries": 0, "last_error": None}
+        self._thread = threading.Thread(target=self._run, name="vitals-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, readings, timeout=SUBMIT_TIMEOUT):
+        """Validate and enqueue a batch; returns (accepted count, [(index, error)]).
+
+        The batch is queued whole or not at all: if there is no room for it within
+        `timeout` seconds, Backpressure is raised and nothing is queued.
+        """
+        items, errors = validate_batch(readings)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.stats["rejected"] += len(errors)
+            # A batch larger than the buffer is let in once the buffer is empty
+            while self._pending and len(self._pending) + len(items) > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if self._closed or remaining <= 0:
+                    self.stats["backpressure"] += 1
+                    raise Backpressure(f"{len(self._pending)} readings waiting to be written")
+                self._cond.wait(remaining)
+            if self._closed:
+                raise Backpressure("writer is closed")
+            self._pending.extend(items)
+            self.stats["accepted"] += len(items)
+            self._cond.notify_all()
+        return len(items), errors
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Everything queued during the previous commit goes into this one
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                self._in_flight = len(batch)
+                self._cond.notify_all()
+            try:
+                written, failed, error = self._write(batch)
+            except Exception as e:  # keep writing the next batches
+                written, failed, error = 0, len(batch), e
+            with self._cond:
+                self._in_flight = 0
+                self.stats["written"] += written
+                self.stats["commits"] += 1 if written else 0
+                self.stats["failed"] += failed
+                if error is not None:
+                    self.stats["last_error"] = f"{type(error).__name__}: {error}"
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        # Returns (written, failed, last error)
+        try:
+            self._transaction(lambda conn: write_readings(conn, batch))
+            return len(batch), 0, None
+        except Exception as e:
+            if _locked(e):  # closed, and still locked out
+                return 0, len(batch), e
+
+        # Some reading failed: redo the batch one reading at a time, each in a
+        # savepoint, so only the readings that fail are left out
+        def by_reading(conn):
+            errors = []
+            for item in batch:
+                conn.execute("SAVEPOINT reading")
+                try:
+                    write_readings(conn, [item])
+                except Exception as e:
+                    conn.execute("ROLLBACK TO reading")
+                    errors.append(e)
+                conn.execute("RELEASE reading")
+            return errors
+
+        errors = self._transaction(by_reading)
+        return len(batch) - len(errors), len(errors), errors[-1] if errors else None
+
+    def _transaction(self, fn):
+        # fn(conn) in a write transaction, waiting for another writer's lock to be
+        # released; once closed, only LOCK_RETRIES more times
+        for attempt in itertools.count():
+            try:
+                with self.db.write() as conn:
+                    return fn(conn)
+            except sqlite3.OperationalError as e:
+                if not _locked(e) or (self._closed and attempt >= LOCK_RETRIES):
+                    raise
+            with self._cond:
+                self.stats["lock_retries"] += 1
+            time.sleep(min(MAX_LOCK_BACKOFF, LOCK_BACKOFF * 2 ** attempt))
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending) + self._in_flight)
+
+    def flush(self, timeout=None):
+        """Wait until everything accepted so far has been committed (or failed)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """POST /vitals with a JSON list of readings (or {"readings": [...]}); GET /vitals/stats."""
+
+    protocol_version = "HTTP/1.1"
+    writer = None  # set by make_server
+    require_token = True
+
+    def _reply(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _refuse(self, status, body, headers=()):
+        # Replies sent before the request body is read: what is left of it on the
+        # connection is not a request, so the connection is closed
+        self.close_connection = True
+        self._reply(status, body, [*headers, ("Connection", "close")])
+
+    def _principal(self):
+        """(role, hospital id) of the request's token, ("admin", None) without tokens; None once refused."""
+        if not self.require_token:
+            return "admin", None
+        try:
+            with self.writer.db.read() as conn:
+                role, _, hospital_id = authenticate(conn, self.headers)
+        except ApiError as e:
+            return self._refuse(e.status, {"error": str(e)}, e.headers)
+        except sqlite3.Error as e:
+            return self._refuse(500, {"error": str(e)})
+        if role not in ("admin", "hospital"):
+            return self._refuse(403, {"error": "posting vitals needs an admin or hospital token"})
+        return role, hospital_id
+
+    def do_GET(self):
+        if self._principal() is None:
+            return
+        if self.path != "/vitals/stats":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, self.writer.snapshot())
+
+    def do_POST(self):
+        principal = self._principal()
+        if principal is None:
+            return
+        if self.path != "/vitals":
+            return self._refuse(404, {"error": "not found"})
+        length = self.headers.get("Content-Length")
+        if length is None:
+            return self._refuse(411, {"error": "Content-Length is required"})
+        if not length.isdigit():
+            return self._refuse(400, {"error": "Content-Length must be a byte count"})
+        if int(length) > MAX_BODY_BYTES:
+            return self._refuse(413, {"error": f"body is larger than {MAX_BODY_BYTES} bytes; send fewer readings per request"})
+        try:
+            body = json.loads(self.rfile.read(int(length)))
+        except ValueError:
+            return self._reply(400, {"error": "body must be JSON"})
+        readings = body.get("readings") if isinstance(body, dict) else body
+        if not isinstance(readings, list):
+            return self._reply(400, {"error": "expected a list of readings"})
+        hospital_id = principal[1]
+        if hospital_id is not None and any(isinstance(reading, dict) and reading.get("hospital_id") != hospital_id for reading in readings):
+            return self._reply(403, {"error": f"a hospital token may post only readings with hospital_id {hospital_id}"})
+        try:
+            accepted, errors = self.writer.submit(readings)
+        except Backpressure as e:
+            return self._reply(503, {"error": str(e)}, [("Retry-After", str(RETRY_AFTER_SECONDS))])
+        self._reply(202, {"accepted": accepted, "errors": [{"index": i, "error": message} for i, message in errors]})
+
+    def log_message(self, format, *args):
+        # Devices post every few seconds; per-request access logs would swamp the console
+        pass
+
+
+def make_server(writer, host="127.0.0.1", port=8765, require_token=True):
+    if not require_token and not is_loopback(host):
+        raise ValueError(f"refusing to accept vitals on {host} without tokens")
+    handler = type("BoundIngestHandler", (IngestHandler,), {"writer": writer, "require_token": require_token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    # python vitals_ingest.py [--db data/trackmyhealth.db] [--port 8765]
+    # Devices post with a hospital's token: python api.py --issue-token <hospital user>
+    from db import ConnectionManager
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Local vital-sign ingestion endpoint")
+    parser.add_argument("--db", default="data/trackmyhealth.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-auth", action="store_true", help="accept readings without bearer tokens (loopback hosts only)")
+    args = parser.parse_args()
+    db = ConnectionManager(args.db)
+    apply_migrations(db)
+    writer = VitalsWriter(db)
+    try:
+        server = make_server(writer, args.host, args.port, require_token=not args.no_auth)
+    except ValueError as e:
+        writer.close()
+        db.close()
+        raise SystemExit(str(e))
+    print(f"Accepting vitals on http://{args.host}:{args.port}/vitals")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        writer.close()
+        db.close()